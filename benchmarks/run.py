@@ -0,0 +1,453 @@
+# Interactive Feedback MCP benchmarks
+# Developed by Fábio Ferreira (https://x.com/fabiomlferreira)
+# Inspired by/related to dotcursorrules.com (https://dotcursorrules.com/)
+#
+# Headless benchmarks of the paths every call goes through, for comparing
+# commits: `uv run benchmarks/run.py` runs them all with Qt's offscreen
+# platform and writes the results to benchmarks/results/<commit>.json;
+# `--compare <file>` prints the change against an earlier result.
+#
+#   startup         feedback_ui.py --profile-startup in a new process: the
+#                   median time of each startup phase and to the first paint
+#                   of the window, which has to stay within
+#                   STARTUP_PAINT_LIMIT_MS (the run exits with status 1
+#                   otherwise)
+#   launch          launch_feedback_ui() until the result is back, with a new
+#                   UI process per call (cold) and with --persistent-ui (warm).
+#                   The answer is scripted: the request is timed out as soon
+#                   as its window is shown, which makes the UI send back what
+#                   has been typed, like a submit.
+#   console         lines/s rendered in the console through append_log, fed
+#                   from a thread like the output reader, and the longest gap
+#                   in event processing meanwhile
+#   million_lines   a command printing a million lines in a feedback panel:
+#                   time until its output and exit are rendered, and the peak
+#                   RSS of the process
+#   teardown        time from Stop (terminate_tree) and from kill_process_tree
+#                   until a command's process tree is gone
+#   diff            a request with a 50k line diff: time to load it and show
+#                   the window, until the diff view holds all of it and until
+#                   it is highlighted, and the longest gap in event processing
+#
+# Each benchmark runs in a process of its own, so their memory use and Qt
+# state don't mix, and settings go to a temporary directory.
+import os
+import sys
+import json
+import time
+import asyncio
+import re
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from typing import Any, Callable
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+
+STARTUP_ITERATIONS = 10
+# Most milliseconds the median time to the first paint may take. About 130 ms
+# with the offscreen platform here, most of it importing PySide6; work added
+# to the startup path belongs after the first paint (see StartupProfile in
+# feedback_ui.py)
+STARTUP_PAINT_LIMIT_MS = 200
+# A phase line of --profile-startup: "imports      117.9 ms"
+STARTUP_PHASE = re.compile(r"^(\w[\w ]*?)\s+([\d.]+) ms$")
+LAUNCH_ITERATIONS = 10
+CONSOLE_LINES = 500_000
+# Lines per append_log call, about what one 64 KiB read of short lines holds
+CONSOLE_CHUNK_LINES = 5000
+MILLION_LINES = 1_000_000
+TEARDOWN_PROCESSES = 20
+TEARDOWN_ITERATIONS = 5
+DIFF_LINES = 50_000
+# Most seconds a benchmark may take
+BENCHMARK_TIMEOUT = 300
+
+def median(values: list[float]) -> float:
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+def summarize(seconds: list[float]) -> dict[str, float]:
+    # Milliseconds
+    return {
+        "median_ms": round(median(seconds) * 1000, 2),
+        "min_ms": round(min(seconds) * 1000, 2),
+        "max_ms": round(max(seconds) * 1000, 2),
+    }
+
+def wait_for(condition: Callable[[], bool], timeout: float):
+    # Runs the Qt event loop until condition() holds
+    from PySide6.QtWidgets import QApplication
+
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("benchmark did not finish")
+        QApplication.processEvents()
+        time.sleep(0.001)
+
+class PeakRSS:
+    # Samples the resident memory of this process every `interval` seconds
+    def __init__(self, interval: float = 0.02):
+        import psutil
+
+        self.process = psutil.Process()
+        self.interval = interval
+        self.peak = self.process.memory_info().rss
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __enter__(self) -> "PeakRSS":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+def bench_startup() -> dict[str, Any]:
+    phases: dict[str, list[float]] = {}
+    for _ in range(STARTUP_ITERATIONS):
+        process = subprocess.run(
+            [sys.executable, os.path.join(REPO_DIR, "feedback_ui.py"), "--profile-startup", "--project-directory", REPO_DIR],
+            capture_output=True,
+            text=True,
+            timeout=BENCHMARK_TIMEOUT,
+            check=True,
+        )
+        for line in process.stderr.splitlines():
+            match = STARTUP_PHASE.match(line)
+            if match:
+                phases.setdefault(match[1], []).append(float(match[2]))
+    results = {f"{phase.replace(' ', '_')}_ms": round(median(values), 2) for phase, values in phases.items() if phase != "total"}
+    results["to_first_paint_ms"] = round(median(phases["total"]), 2)
+    return results
+
+def bench_launch() -> dict[str, Any]:
+    import server
+
+    async def launch(persistent: bool) -> list[float]:
+        host = server.UIHostClient(persistent=persistent)
+        server.frontend = host
+
+        def on_event(message: dict):
+            if message["event"] == "window_shown":
+                host.ui._send({"type": "timeout", "id": message["id"]})
+
+        seconds = []
+        try:
+            for _ in range(LAUNCH_ITERATIONS):
+                started = time.perf_counter()
+                result = await server.launch_feedback_ui(REPO_DIR, "Benchmark", on_event)
+                seconds.append(time.perf_counter() - started)
+                assert result["timed_out"], result
+        finally:
+            if host.ui is not None:
+                host.ui.stop()
+                await host.ui.process.wait()
+        return seconds
+
+    return {
+        "cold": summarize(asyncio.run(launch(persistent=False))),
+        "warm": summarize(asyncio.run(launch(persistent=True))),
+    }
+
+def create_panel():
+    import feedback_ui
+
+    feedback_ui.create_app()
+    ui = feedback_ui.FeedbackUI()
+    panel = ui.add_panel()
+    ui.show()
+    panel.load_request(REPO_DIR, "Benchmark")
+    panel._ensure_command_section()
+    return ui, panel
+
+def bench_console() -> dict[str, Any]:
+    from PySide6.QtCore import QTimer
+
+    ui, panel = create_panel()
+    chunks = [
+        "".join(f"{number} benchmark output line\n" for number in range(start, start + CONSOLE_CHUNK_LINES))
+        for start in range(0, CONSOLE_LINES, CONSOLE_CHUNK_LINES)
+    ]
+
+    # The longest time between two ticks of a timer that wants to run every 1 ms
+    gaps = {"last": time.perf_counter(), "max": 0.0}
+
+    def tick():
+        now = time.perf_counter()
+        gaps["max"] = max(gaps["max"], now - gaps["last"])
+        gaps["last"] = now
+
+    timer = QTimer()
+    timer.setInterval(1)
+    timer.timeout.connect(tick)
+
+    def feed():
+        for chunk in chunks:
+            panel.command_session.append_log(chunk)
+
+    started = time.perf_counter()
+    timer.start()
+    feeder = threading.Thread(target=feed)
+    feeder.start()
+    wait_for(lambda: not feeder.is_alive() and not panel.flush_scheduled, BENCHMARK_TIMEOUT)
+    elapsed = time.perf_counter() - started
+    timer.stop()
+    panel.finish()
+    return {
+        "lines": CONSOLE_LINES,
+        "lines_per_second": round(CONSOLE_LINES / elapsed),
+        "max_event_gap_ms": round(gaps["max"] * 1000, 2),
+    }
+
+def bench_million_lines() -> dict[str, Any]:
+    import psutil
+
+    ui, panel = create_panel()
+    baseline = psutil.Process().memory_info().rss
+    exit_codes = []
+    panel.command_exited.connect(exit_codes.append)
+    panel.command_entry.setText(f"seq 1 {MILLION_LINES}")
+    with PeakRSS() as rss:
+        started = time.perf_counter()
+        panel._run_command()
+        wait_for(lambda: exit_codes, BENCHMARK_TIMEOUT)
+        elapsed = time.perf_counter() - started
+    assert exit_codes == [0], exit_codes
+    assert panel.command_session.log_store.total_lines >= MILLION_LINES, panel.command_session.log_store.total_lines
+    panel.finish()
+    return {
+        "lines": MILLION_LINES,
+        "seconds": round(elapsed, 3),
+        "lines_per_second": round(MILLION_LINES / elapsed),
+        "baseline_rss_mb": round(baseline / 2**20, 1),
+        "peak_rss_mb": round(rss.peak / 2**20, 1),
+    }
+
+def bench_teardown() -> dict[str, Any]:
+    import psutil
+    from command_runner import CommandRunner
+    from server import kill_process_tree
+
+    command = f"for i in $(seq {TEARDOWN_PROCESSES}); do sleep 600 & done; wait"
+
+    def wait_for_tree(pid: int) -> list[psutil.Process]:
+        deadline = time.perf_counter() + 10
+        while time.perf_counter() < deadline:
+            children = psutil.Process(pid).children(recursive=True)
+            if len(children) >= TEARDOWN_PROCESSES:
+                return children
+            time.sleep(0.01)
+        raise TimeoutError("command did not start its processes")
+
+    def wait_until_dead(processes: list[psutil.Process]):
+        # Zombies count as dead: orphans are reaped by init, whenever it gets to it
+        def running(proc: psutil.Process) -> bool:
+            try:
+                return proc.status() != psutil.STATUS_ZOMBIE
+            except psutil.Error:
+                return False
+
+        deadline = time.perf_counter() + BENCHMARK_TIMEOUT
+        while any(running(proc) for proc in processes):
+            if time.perf_counter() > deadline:
+                raise TimeoutError("process tree did not go away")
+            time.sleep(0.001)
+
+    stop_seconds = []
+    for _ in range(TEARDOWN_ITERATIONS):
+        exited = threading.Event()
+        runner = CommandRunner(command, REPO_DIR, on_output=lambda chunks: None, on_exit=lambda exit_code, usage: exited.set())
+        runner.start()
+        children = wait_for_tree(runner.process.pid)
+        started = time.perf_counter()
+        runner.stop()
+        exited.wait(BENCHMARK_TIMEOUT)
+        wait_until_dead(children)
+        stop_seconds.append(time.perf_counter() - started)
+
+    kill_seconds = []
+    for _ in range(TEARDOWN_ITERATIONS):
+        process = subprocess.Popen(["/bin/sh", "-c", command])
+        processes = wait_for_tree(process.pid) + [psutil.Process(process.pid)]
+        started = time.perf_counter()
+        kill_process_tree(process.pid)
+        process.wait()
+        wait_until_dead(processes)
+        kill_seconds.append(time.perf_counter() - started)
+
+    return {
+        "processes": TEARDOWN_PROCESSES + 1,
+        "terminate_tree": summarize(stop_seconds),
+        "kill_process_tree": summarize(kill_seconds),
+    }
+
+def synthetic_diff(lines: int) -> str:
+    # Files of hunks that rename a call on every other line, like a refactoring
+    diff = []
+    file = 0
+    while len(diff) < lines:
+        diff += [
+            f"diff --git a/module{file}.py b/module{file}.py",
+            "index 0123456..789abcd 100644",
+            f"--- a/module{file}.py",
+            f"+++ b/module{file}.py",
+        ]
+        for hunk in range(20):
+            diff.append(f"@@ -{hunk * 10 + 1},6 +{hunk * 10 + 1},6 @@ def function_{hunk}():")
+            for number in range(3):
+                diff.append(f"     value_{number} = compute({number})")
+                diff.append(f"-    result_{number} = old_name(value_{number}, {hunk})")
+                diff.append(f"+    result_{number} = new_name(value_{number}, {hunk}, strict=True)")
+        file += 1
+    return "\n".join(diff[:lines]) + "\n"
+
+def bench_diff() -> dict[str, Any]:
+    from PySide6.QtCore import QTimer
+    import feedback_ui
+
+    feedback_ui.create_app()
+    ui = feedback_ui.FeedbackUI()
+    panel = ui.add_panel()
+    diff = synthetic_diff(DIFF_LINES)
+
+    gaps = {"last": time.perf_counter(), "max": 0.0}
+
+    def tick():
+        now = time.perf_counter()
+        gaps["max"] = max(gaps["max"], now - gaps["last"])
+        gaps["last"] = now
+
+    timer = QTimer()
+    timer.setInterval(1)
+    timer.timeout.connect(tick)
+
+    started = time.perf_counter()
+    panel.load_request(REPO_DIR, "Benchmark", diff=diff)
+    ui.show()
+    shown = time.perf_counter() - started
+    timer.start()
+    wait_for(lambda: panel.diff_view is not None and panel.diff_view.text and panel.diff_view.position == len(panel.diff_view.text), BENCHMARK_TIMEOUT)
+    loaded = time.perf_counter() - started
+    wait_for(lambda: panel.diff_view.styles[-1] is not None, BENCHMARK_TIMEOUT)
+    highlighted = time.perf_counter() - started
+    timer.stop()
+    assert panel.diff_view.document().blockCount() == DIFF_LINES, panel.diff_view.document().blockCount()
+    panel.finish()
+    return {
+        "lines": DIFF_LINES,
+        "show_ms": round(shown * 1000, 2),
+        "loaded_ms": round(loaded * 1000, 2),
+        "highlighted_ms": round(highlighted * 1000, 2),
+        "max_event_gap_ms": round(gaps["max"] * 1000, 2),
+    }
+
+BENCHMARKS: dict[str, Callable[[], dict[str, Any]]] = {
+    "startup": bench_startup,
+    "launch": bench_launch,
+    "console": bench_console,
+    "million_lines": bench_million_lines,
+    "teardown": bench_teardown,
+    "diff": bench_diff,
+}
+
+def run_benchmark(name: str, config_dir: str) -> dict[str, Any]:
+    env = {**os.environ, "QT_QPA_PLATFORM": "offscreen", "XDG_CONFIG_HOME": config_dir}
+    process = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", name],
+        env=env,
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+        timeout=BENCHMARK_TIMEOUT,
+    )
+    if process.returncode != 0:
+        return {"error": process.stderr.strip().splitlines()[-1] if process.stderr.strip() else f"exit code {process.returncode}"}
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def flatten(results: dict[str, Any], prefix: str = "") -> dict[str, float]:
+    metrics = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            metrics.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            metrics[prefix + key] = value
+    return metrics
+
+def print_comparison(old: dict[str, Any], new: dict[str, Any]):
+    old_metrics = flatten(old["benchmarks"])
+    new_metrics = flatten(new["benchmarks"])
+    print(f"{old['commit']} -> {new['commit']}")
+    for name, value in new_metrics.items():
+        before = old_metrics.get(name)
+        change = f"{(value - before) / before * 100:+.1f}%" if before else ""
+        print(f"  {name:<40} {before if before is not None else '-':>12} {value:>12} {change:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Interactive Feedback MCP benchmarks")
+    parser.add_argument("names", nargs="*", metavar="name", help=f"Benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--output", help="Where to write the results (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results to compare with")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    if args.child:
+        sys.path.insert(0, REPO_DIR)
+        print(json.dumps(BENCHMARKS[args.child]()))
+        # Qt and reader threads are not torn down in order
+        sys.stdout.flush()
+        os._exit(0)
+
+    results = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "benchmarks": {},
+    }
+    with tempfile.TemporaryDirectory() as config_dir:
+        for name in args.names or BENCHMARKS:
+            print(f"{name}...", file=sys.stderr, flush=True)
+            results["benchmarks"][name] = run_benchmark(name, config_dir)
+            print(json.dumps(results["benchmarks"][name], indent=2), file=sys.stderr)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), results)
+
+    to_first_paint = results["benchmarks"].get("startup", {}).get("to_first_paint_ms")
+    if to_first_paint is not None and to_first_paint > STARTUP_PAINT_LIMIT_MS:
+        print(f"Startup regressed: {to_first_paint} ms to the first paint, over the {STARTUP_PAINT_LIMIT_MS} ms limit", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
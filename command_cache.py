@@ -0,0 +1,238 @@
+# Interactive Feedback MCP command result cache
+# Developed by Fábio Ferreira (https://x.com/fabiomlferreira)
+# Inspired by/related to dotcursorrules.com (https://dotcursorrules.com/)
+#
+# Opt-in per project ("cache_results"): a command that runs automatically is
+# not run again when the project has not changed since a previous run of the
+# same command; the output and exit code of that run are replayed instead.
+#
+# The state of a project is a fingerprint of either its git repository (HEAD,
+# plus the status and the size/mtime of every changed or untracked file, so
+# .gitignore applies) or, outside git, the path, size and mtime of every file
+# not under IGNORED_DIRS. Only runs that leave the fingerprint unchanged are
+# stored, so commands that modify the project are never replayed.
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+import subprocess
+from typing import Optional, TypedDict
+
+from command_runner import CommandUsage
+from project_settings import SETTINGS_BUSY_TIMEOUT, get_project_settings_group, get_settings_path
+
+# Directories skipped by the fingerprint of projects that are not git repositories
+IGNORED_DIRS = {
+    ".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv",
+    ".tox", ".nox", ".mypy_cache", ".pytest_cache", ".ruff_cache", "build", "dist", "target",
+}
+# Projects with more files than this are not fingerprinted (and never cached)
+FINGERPRINT_MAX_FILES = 200_000
+GIT_TIMEOUT = 10
+
+# Results kept over all projects; only the last one per project and command is kept
+CACHE_MAX_ENTRIES = 100
+# Stored in PRAGMA user_version; results stored with another layout are dropped
+CACHE_SCHEMA_VERSION = 3
+
+class CachedResult(TypedDict):
+    logs: str
+    # Lines the log store of the run dropped after logs, and the lines that
+    # came after them (see LogStore.split)
+    dropped_lines: int
+    tail_logs: str
+    exit_code: int
+    usage: CommandUsage
+    # time.time() of the run
+    created: float
+
+def _git_fingerprint(project_directory: str) -> Optional[str]:
+    def git(*args: str) -> bytes:
+        return subprocess.run(
+            ["git", "--no-optional-locks", *args],
+            cwd=project_directory,
+            capture_output=True,
+            check=True,
+            timeout=GIT_TIMEOUT,
+        ).stdout
+
+    try:
+        toplevel = git("rev-parse", "--show-toplevel").decode("utf-8", errors="surrogateescape").strip()
+        status = git("status", "--porcelain=v1", "-z", "--untracked-files=all")
+    except (OSError, subprocess.SubprocessError):
+        return None
+    try:
+        head = git("rev-parse", "--verify", "-q", "HEAD")
+    except subprocess.CalledProcessError:
+        # No commits yet
+        head = b""
+
+    digest = hashlib.sha1(head)
+    digest.update(status)
+    # A file that is edited again keeps its status line; its size or mtime changes
+    entries = status.split(b"\0")
+    index = 0
+    while index < len(entries):
+        entry = entries[index]
+        index += 1
+        if len(entry) < 4:
+            continue
+        if entry[:1] in b"RC":
+            # Renames and copies are followed by the original path
+            index += 1
+        path = os.path.join(toplevel, os.fsdecode(entry[3:]))
+        try:
+            stat = os.stat(path)
+            digest.update(f"{stat.st_size}:{stat.st_mtime_ns}\0".encode("ascii"))
+        except OSError:
+            digest.update(b"-\0")
+    return "git:" + digest.hexdigest()
+
+def _files_fingerprint(project_directory: str) -> Optional[str]:
+    digest = hashlib.sha1()
+    count = 0
+    for root, dirs, files in os.walk(project_directory):
+        dirs[:] = sorted(name for name in dirs if name not in IGNORED_DIRS)
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            count += 1
+            if count > FINGERPRINT_MAX_FILES:
+                return None
+            relative = os.path.relpath(path, project_directory)
+            digest.update(f"{relative}\0{stat.st_size}:{stat.st_mtime_ns}\0".encode("utf-8", errors="surrogateescape"))
+    return "files:" + digest.hexdigest()
+
+def project_fingerprint(project_directory: str) -> Optional[str]:
+    # None when the project can't be fingerprinted; its runs are not cached
+    if not os.path.isdir(project_directory):
+        return None
+    return _git_fingerprint(project_directory) or _files_fingerprint(project_directory)
+
+class CommandCache:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(os.path.dirname(get_settings_path()), "command_cache.db")
+        # Used from worker threads; the database is only opened once a
+        # project with caching enabled runs a command
+        self.lock = threading.Lock()
+        self.db: Optional[sqlite3.Connection] = None
+
+    def _open(self) -> sqlite3.Connection:
+        if self.db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.db = sqlite3.connect(
+                self.path,
+                timeout=SETTINGS_BUSY_TIMEOUT,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            if self.db.execute("PRAGMA user_version").fetchone()[0] != CACHE_SCHEMA_VERSION:
+                # It is only a cache
+                self.db.execute("DROP TABLE IF EXISTS results")
+                self.db.execute(f"PRAGMA user_version = {CACHE_SCHEMA_VERSION}")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "scope TEXT NOT NULL, command TEXT NOT NULL, fingerprint TEXT NOT NULL, "
+                "exit_code INTEGER NOT NULL, usage TEXT NOT NULL, created REAL NOT NULL, "
+                "logs BLOB NOT NULL, dropped_lines INTEGER NOT NULL, tail_logs BLOB NOT NULL, "
+                "PRIMARY KEY (scope, command))"
+            )
+        return self.db
+
+    def get(self, project_directory: str, command: str, fingerprint: str) -> Optional[CachedResult]:
+        with self.lock:
+            row = self._open().execute(
+                "SELECT exit_code, usage, created, logs, dropped_lines, tail_logs FROM results "
+                "WHERE scope = ? AND command = ? AND fingerprint = ?",
+                (get_project_settings_group(project_directory), command, fingerprint),
+            ).fetchone()
+        if row is None:
+            return None
+        exit_code, usage, created, logs, dropped_lines, tail_logs = row
+        return CachedResult(
+            logs=zlib.decompress(logs).decode("utf-8", errors="replace"),
+            dropped_lines=dropped_lines,
+            tail_logs=zlib.decompress(tail_logs).decode("utf-8", errors="replace"),
+            exit_code=exit_code,
+            usage=json.loads(usage),
+            created=created,
+        )
+
+    def put(
+        self,
+        project_directory: str,
+        command: str,
+        fingerprint: str,
+        logs: tuple[str, int, str],
+        exit_code: int,
+        usage: CommandUsage,
+    ):
+        # logs: the run's output, as returned by LogStore.split()
+        head, dropped_lines, tail = logs
+        data = zlib.compress(head.encode("utf-8"), 6)
+        tail_data = zlib.compress(tail.encode("utf-8"), 6)
+        with self.lock:
+            db = self._open()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO results "
+                    "(scope, command, fingerprint, exit_code, usage, created, logs, dropped_lines, tail_logs) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        get_project_settings_group(project_directory), command, fingerprint,
+                        exit_code, json.dumps(usage), time.time(), data, dropped_lines, tail_data,
+                    ),
+                )
+                db.execute(
+                    "DELETE FROM results WHERE rowid NOT IN "
+                    "(SELECT rowid FROM results ORDER BY created DESC LIMIT ?)",
+                    (CACHE_MAX_ENTRIES,),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+# The two steps around a run, both meant for a worker thread: lookup() before
+# the command starts, store() once it exited with the fingerprint lookup() took.
+
+def lookup(cache: CommandCache, project_directory: str, command: str, replay: bool) -> tuple[Optional[str], Optional[CachedResult]]:
+    fingerprint = project_fingerprint(project_directory)
+    if fingerprint is None or not replay:
+        return fingerprint, None
+    return fingerprint, cache.get(project_directory, command, fingerprint)
+
+def store(
+    cache: CommandCache,
+    project_directory: str,
+    command: str,
+    fingerprint: str,
+    logs: tuple[str, int, str],
+    exit_code: int,
+    usage: CommandUsage,
+) -> bool:
+    # Runs that changed the project (or during which it was edited) are not replayable
+    if project_fingerprint(project_directory) != fingerprint:
+        return False
+    cache.put(project_directory, command, fingerprint, logs, exit_code, usage)
+    return True
+
+def describe(result: CachedResult) -> str:
+    # Console line shown before replayed output
+    when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(result["created"]))
+    return f"[Cached result of the run at {when}; no files have changed since.]\n"
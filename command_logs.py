@@ -0,0 +1,175 @@
+# Interactive Feedback MCP command logs
+# Developed by Fábio Ferreira (https://x.com/fabiomlferreira)
+# Inspired by/related to dotcursorrules.com (https://dotcursorrules.com/)
+#
+# The console of every answered request is kept here under a run id, so the
+# result of interactive_feedback only needs a short excerpt of the output: the
+# agent reads the rest a page at a time with the get_command_logs tool. The UI
+# process writes the logs when it makes the result; the server reads them.
+#
+# Lines are stored in zlib compressed blocks keyed by the number of their
+# first line, so a page is read without decompressing the whole log, and lines
+# the log store dropped from the middle of a long output keep their numbers.
+import os
+import re
+import time
+import zlib
+import sqlite3
+import secrets
+import threading
+from typing import Optional, TypedDict
+
+from log_store import LogStore
+from project_settings import SETTINGS_BUSY_TIMEOUT, get_settings_path
+
+# Lines per stored block
+LOG_BLOCK_LINES = 500
+# Runs kept over all projects
+LOGS_MAX_RUNS = 50
+# Stored in PRAGMA user_version; logs stored with another layout are dropped
+LOGS_SCHEMA_VERSION = 1
+
+# Default and largest number of lines in a page, and the most characters a
+# page holds (a single longer line is cut)
+PAGE_LINES = 200
+PAGE_MAX_LINES = 2000
+PAGE_MAX_CHARS = 64 * 1024
+
+class LogPage(TypedDict):
+    run_id: str
+    project_directory: str
+    # Of the last command that finished, if any
+    exit_code: Optional[int]
+    total_lines: int
+    # "<line number>: <line>" for each line of the page
+    logs: str
+    # offset of the next page, or None after the last one
+    next_offset: Optional[int]
+
+class CommandLogs:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(os.path.dirname(get_settings_path()), "command_logs.db")
+        # Used from worker threads; the database is only opened once there
+        # are logs to store or read
+        self.lock = threading.Lock()
+        self.db: Optional[sqlite3.Connection] = None
+
+    def _open(self) -> sqlite3.Connection:
+        if self.db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.db = sqlite3.connect(
+                self.path,
+                timeout=SETTINGS_BUSY_TIMEOUT,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            if self.db.execute("PRAGMA user_version").fetchone()[0] != LOGS_SCHEMA_VERSION:
+                self.db.execute("DROP TABLE IF EXISTS runs")
+                self.db.execute("DROP TABLE IF EXISTS blocks")
+                self.db.execute(f"PRAGMA user_version = {LOGS_SCHEMA_VERSION}")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "run_id TEXT PRIMARY KEY, project_directory TEXT NOT NULL, exit_code INTEGER, "
+                "total_lines INTEGER NOT NULL, created REAL NOT NULL)"
+            )
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS blocks ("
+                "run_id TEXT NOT NULL, first_line INTEGER NOT NULL, line_count INTEGER NOT NULL, "
+                "data BLOB NOT NULL, PRIMARY KEY (run_id, first_line))"
+            )
+        return self.db
+
+    def put(self, project_directory: str, sections: list[tuple[int, str]], total_lines: int, exit_code: Optional[int]) -> str:
+        # sections as returned by LogStore.sections(); returns the new run id
+        run_id = secrets.token_hex(6)
+        blocks = []
+        for first_line, text in sections:
+            lines = text.splitlines()
+            for start in range(0, len(lines), LOG_BLOCK_LINES):
+                block = lines[start:start + LOG_BLOCK_LINES]
+                blocks.append((run_id, first_line + start, len(block), zlib.compress("\n".join(block).encode("utf-8"), 6)))
+        with self.lock:
+            db = self._open()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute(
+                    "INSERT INTO runs (run_id, project_directory, exit_code, total_lines, created) VALUES (?, ?, ?, ?, ?)",
+                    (run_id, project_directory, exit_code, total_lines, time.time()),
+                )
+                db.executemany("INSERT INTO blocks (run_id, first_line, line_count, data) VALUES (?, ?, ?, ?)", blocks)
+                db.execute(
+                    "DELETE FROM runs WHERE rowid NOT IN "
+                    "(SELECT rowid FROM runs ORDER BY created DESC LIMIT ?)",
+                    (LOGS_MAX_RUNS,),
+                )
+                db.execute("DELETE FROM blocks WHERE run_id NOT IN (SELECT run_id FROM runs)")
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return run_id
+
+    def page(self, run_id: str, offset: int = 0, limit: int = PAGE_LINES, pattern: Optional[str] = None) -> LogPage:
+        # Lines after the first `offset` ones; with a pattern (a regular
+        # expression), only the lines that match it
+        limit = max(1, min(limit, PAGE_MAX_LINES))
+        try:
+            regex = re.compile(pattern) if pattern else None
+        except re.error as e:
+            raise ValueError(f"Invalid pattern: {e}")
+
+        with self.lock:
+            db = self._open()
+            run = db.execute(
+                "SELECT project_directory, exit_code, total_lines FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+            if run is None:
+                raise ValueError(f"Unknown run_id {run_id!r}; only the logs of the last {LOGS_MAX_RUNS} requests are kept")
+            blocks = db.execute(
+                "SELECT first_line, data FROM blocks WHERE run_id = ? AND first_line + line_count > ? ORDER BY first_line",
+                (run_id, offset + 1),
+            )
+            project_directory, exit_code, total_lines = run
+
+            parts = []
+            size = 0
+            next_offset = None
+            for first_line, data in blocks:
+                for number, line in enumerate(zlib.decompress(data).decode("utf-8").split("\n"), first_line):
+                    if number <= offset or (regex and not regex.search(line)):
+                        continue
+                    if len(parts) == limit or (parts and size + len(line) > PAGE_MAX_CHARS):
+                        next_offset = number - 1
+                        break
+                    line = line[:PAGE_MAX_CHARS]
+                    parts.append(f"{number}: {line}")
+                    size += len(line)
+                if next_offset is not None:
+                    break
+
+        return LogPage(
+            run_id=run_id,
+            project_directory=project_directory,
+            exit_code=exit_code,
+            total_lines=total_lines,
+            logs="\n".join(parts) + ("\n" if parts else ""),
+            next_offset=next_offset,
+        )
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+def archive(logs: CommandLogs, project_directory: str, log_store: LogStore, exit_code: Optional[int]) -> Optional[str]:
+    # The run id of the logs in log_store, if there are any; a result without
+    # a run id is better than no result
+    if not log_store.total_lines:
+        return None
+    try:
+        return logs.put(project_directory, log_store.sections(), log_store.total_lines, exit_code)
+    except sqlite3.Error:
+        return None
@@ -0,0 +1,274 @@
+# Interactive Feedback MCP command pipelines
+# Developed by Fábio Ferreira (https://x.com/fabiomlferreira)
+# Inspired by/related to dotcursorrules.com (https://dotcursorrules.com/)
+#
+# Several named commands run side by side instead of the project's single
+# command ("commands" in the project settings), one per line:
+#
+#   lint: ruff check .
+#   typecheck: mypy .
+#   test [lint]: pytest -q
+#   build [typecheck, test]: python -m build
+#
+# A step starts once the steps in its brackets have passed, with at most
+# max_parallel steps running at a time; the steps after one that failed are
+# skipped. CommandPipeline has the interface of CommandRunner, so it runs
+# wherever a single command does: the combined output has every line prefixed
+# with its step's name, and the exit code is 0 only if every step passed.
+import re
+import time
+import threading
+from typing import Callable, Optional, TypedDict
+
+from command_runner import (
+    NO_LIMITS, STOP_GRACE_PERIOD, CommandLimits, CommandRunner, CommandUsage, OutputChunk,
+)
+
+# Steps running at the same time unless the project says otherwise
+PIPELINE_MAX_PARALLEL = 4
+
+STEP_LINE = re.compile(r"^([\w.-]+)\s*(?:\[([^\]]*)\])?\s*:\s*(.*)$")
+
+class PipelineStep(TypedDict):
+    name: str
+    command: str
+    # Names of the steps that have to pass first
+    after: list[str]
+
+class StepResult(TypedDict):
+    name: str
+    command: str
+    # "pending", "running", then "passed", "failed", "stopped" or "skipped"
+    status: str
+    # None if the step didn't run, or couldn't be started
+    exit_code: Optional[int]
+    wall_time: Optional[float]
+
+FINISHED = ("passed", "failed", "stopped", "skipped")
+
+def parse_pipeline(text: str) -> list[PipelineStep]:
+    # ValueError for lines that are not steps, unknown or circular dependencies
+    steps: list[PipelineStep] = []
+    names = set()
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        match = STEP_LINE.match(line)
+        if not match or not match.group(3).strip():
+            raise ValueError(f"line {number}: expected 'name: command' or 'name [other, ...]: command'")
+        name, after, command = match.group(1), match.group(2) or "", match.group(3).strip()
+        if name in names:
+            raise ValueError(f"line {number}: there is another step named {name!r}")
+        names.add(name)
+        steps.append(PipelineStep(name=name, command=command, after=[dep.strip() for dep in after.split(",") if dep.strip()]))
+
+    for step in steps:
+        for dep in step["after"]:
+            if dep not in names:
+                raise ValueError(f"step {step['name']!r} runs after {dep!r}, which is not a step")
+    # Dependencies are resolved in rounds; a round that resolves nothing is a cycle
+    done: set[str] = set()
+    while len(done) < len(steps):
+        ready = [step["name"] for step in steps if step["name"] not in done and all(dep in done for dep in step["after"])]
+        if not ready:
+            cycle = sorted(step["name"] for step in steps if step["name"] not in done)
+            raise ValueError(f"steps {', '.join(cycle)} wait for each other")
+        done.update(ready)
+    return steps
+
+def format_pipeline(steps: list[PipelineStep]) -> str:
+    # One line per step, as parse_pipeline reads them
+    return "\n".join(
+        f"{step['name']}{' [' + ', '.join(step['after']) + ']' if step['after'] else ''}: {step['command']}"
+        for step in steps
+    )
+
+def format_summary(results: list[StepResult]) -> str:
+    # Console block shown once every step finished
+    width = max(len(result["name"]) for result in results)
+    lines = ["\nSteps:"]
+    for result in results:
+        status = result["status"]
+        if result["exit_code"] is not None:
+            status += f" (exit code {result['exit_code']})"
+        if result["wall_time"] is not None:
+            status += f" in {result['wall_time']:.1f}s"
+        lines.append(f"  {result['name'].ljust(width)}  {status}")
+    return "\n".join(lines) + "\n"
+
+class CommandPipeline:
+    def __init__(
+        self,
+        steps: list[PipelineStep],
+        cwd: str,
+        on_output: Callable[[list[OutputChunk]], None],
+        on_exit: Callable[[int, CommandUsage], None],
+        on_step_output: Optional[Callable[[str, str], None]] = None,
+        on_step: Optional[Callable[[StepResult], None]] = None,
+        limits: CommandLimits = NO_LIMITS,
+        stop_grace_period: float = STOP_GRACE_PERIOD,
+        max_parallel: int = PIPELINE_MAX_PARALLEL,
+    ):
+        # on_step_output(name, text) gets each step's own output, on_step a
+        # copy of a step's result whenever its status changes; both are
+        # called from the steps' reader and waiter threads
+        self.steps = steps
+        self.command = format_pipeline(steps)
+        self.cwd = cwd
+        self.on_output = on_output
+        self.on_exit = on_exit
+        self.on_step_output = on_step_output
+        self.on_step = on_step
+        self.limits = limits
+        self.stop_grace_period = stop_grace_period
+        self.max_parallel = max(1, max_parallel)
+        self.lock = threading.Lock()
+        # Keeps the combined output of the steps in one order for all consumers
+        self.output_lock = threading.Lock()
+        self.results = {
+            step["name"]: StepResult(name=step["name"], command=step["command"], status="pending", exit_code=None, wall_time=None)
+            for step in steps
+        }
+        self.runners: dict[str, CommandRunner] = {}
+        self.usages: list[CommandUsage] = []
+        self.started_at = 0.0
+        self.started = False
+        self.stopping = False
+        self.exited = False
+
+    def step_results(self) -> list[StepResult]:
+        with self.lock:
+            return [StepResult(**self.results[step["name"]]) for step in self.steps]
+
+    def start(self):
+        self.started = True
+        self.started_at = time.monotonic()
+        self._advance()
+
+    def stop(self):
+        # Steps that haven't started are skipped; on_exit follows once the
+        # running ones are gone
+        with self.lock:
+            if not self.started or self.stopping:
+                return
+            self.stopping = True
+            runners = list(self.runners.values())
+        for runner in runners:
+            runner.stop()
+        self._advance()
+
+    def _emit(self, name: str, text: str, stream: str = "stdout", read_time: Optional[float] = None):
+        prefixed = "".join(f"[{name}] {line}" for line in text.splitlines(keepends=True))
+        with self.output_lock:
+            self.on_output([OutputChunk(stream=stream, text=prefixed, time=read_time or time.time())])
+            if self.on_step_output:
+                self.on_step_output(name, text)
+
+    def _update(self, result: StepResult, **changes):
+        # Called with self.lock held
+        result.update(changes)
+        if self.on_step:
+            self.on_step(StepResult(**result))
+
+    def _advance(self):
+        # Starts the steps that can run now and skips those that never will;
+        # ends the pipeline once nothing is left to run
+        to_start: list[PipelineStep] = []
+        skipped: list[tuple[str, str]] = []
+        with self.lock:
+            if self.exited:
+                return
+            running = sum(1 for result in self.results.values() if result["status"] == "running")
+            changed = True
+            while changed:
+                changed = False
+                for step in self.steps:
+                    result = self.results[step["name"]]
+                    if result["status"] != "pending":
+                        continue
+                    blocked = [dep for dep in step["after"] if self.results[dep]["status"] in ("failed", "stopped", "skipped")]
+                    if self.stopping or blocked:
+                        self._update(result, status="skipped")
+                        skipped.append((step["name"], "stopped" if self.stopping else f"{', '.join(blocked)} did not pass"))
+                        changed = True
+                    elif running < self.max_parallel and all(self.results[dep]["status"] == "passed" for dep in step["after"]):
+                        self._update(result, status="running")
+                        to_start.append(step)
+                        running += 1
+            finished = running == 0 and all(result["status"] in FINISHED for result in self.results.values())
+            if finished:
+                self.exited = True
+
+        for name, reason in skipped:
+            self._emit(name, f"skipped: {reason}\n")
+        for step in to_start:
+            self._start_step(step)
+        if finished:
+            self._finish()
+
+    def _start_step(self, step: PipelineStep):
+        name = step["name"]
+        started = time.monotonic()
+        runner = CommandRunner(
+            step["command"],
+            self.cwd,
+            on_output=lambda chunks: self._on_step_output(name, chunks),
+            on_exit=lambda exit_code, usage: self._on_step_exit(name, exit_code, usage),
+            limits=self.limits,
+            stop_grace_period=self.stop_grace_period,
+        )
+        with self.lock:
+            if self.stopping:
+                self._update(self.results[name], status="skipped")
+            else:
+                self.runners[name] = runner
+        if name not in self.runners:
+            self._emit(name, "skipped: stopped\n")
+            self._advance()
+            return
+        self._emit(name, f"$ {step['command']}\n")
+        try:
+            runner.start()
+        except Exception as e:
+            self._emit(name, f"Error running command: {str(e)}\n")
+            with self.lock:
+                self._update(self.results[name], status="failed", wall_time=time.monotonic() - started)
+            self._advance()
+            return
+        if self.stopping:
+            # stop() came before the process existed
+            runner.stop()
+
+    def _on_step_output(self, name: str, chunks: list[OutputChunk]):
+        for chunk in chunks:
+            self._emit(name, chunk["text"], chunk["stream"], chunk["time"])
+
+    def _on_step_exit(self, name: str, exit_code: int, usage: CommandUsage):
+        self._emit(name, f"exited with code {exit_code} after {usage['wall_time']:.1f}s\n")
+        with self.lock:
+            self.usages.append(usage)
+            if exit_code == 0:
+                status = "passed"
+            else:
+                status = "stopped" if self.stopping else "failed"
+            self._update(self.results[name], status=status, exit_code=exit_code, wall_time=usage["wall_time"])
+        self._advance()
+
+    def _finish(self):
+        results = self.step_results()
+        with self.output_lock:
+            self.on_output([OutputChunk(stream="stdout", text=format_summary(results), time=time.time())])
+        if all(result["status"] == "passed" for result in results):
+            exit_code = 0
+        else:
+            # That of the first step that failed, in the order of the steps
+            exit_codes = [result["exit_code"] for result in results if result["status"] in ("failed", "stopped")]
+            exit_code = next((code for code in exit_codes if code), 1)
+        self.on_exit(exit_code, CommandUsage(
+            wall_time=time.monotonic() - self.started_at,
+            cpu_time=sum(usage["cpu_time"] for usage in self.usages),
+            # Steps overlap, so the peak of all of them is at most this
+            peak_rss=sum(usage["peak_rss"] for usage in self.usages),
+            child_processes=sum(usage["child_processes"] for usage in self.usages),
+        ))
@@ -0,0 +1,505 @@
+# Interactive Feedback MCP command runner
+# Developed by Fábio Ferreira (https://x.com/fabiomlferreira)
+# Inspired by/related to dotcursorrules.com (https://dotcursorrules.com/)
+#
+# Running the project command without any Qt dependency, shared by the Qt
+# window (feedback_ui.py) and the browser frontend (web_ui.py).
+import os
+import sys
+import time
+import queue
+import shlex
+import codecs
+import signal
+import selectors
+import threading
+import subprocess
+from typing import IO, Callable, Optional, TypedDict
+
+# Seconds to wait for a command's output pipes to reach EOF after it exited
+OUTPUT_DRAIN_TIMEOUT = 2
+
+# Bytes read from a pipe at a time
+READ_CHUNK_SIZE = 64 * 1024
+# Longer lines are passed on in pieces of this many characters, so a command
+# that never prints a newline doesn't grow the reader's buffer without bound
+MAX_LINE_LENGTH = 64 * 1024
+
+# Seconds between samples of a running command's process tree
+USAGE_SAMPLE_INTERVAL = 0.25
+
+# Seconds a stopped command gets to exit after SIGTERM (CTRL_BREAK_EVENT on
+# Windows) before it is killed
+STOP_GRACE_PERIOD = 5
+STOP_POLL_INTERVAL = 0.1
+
+# Per-process resource limits for a command, applied with the shell's ulimit
+# (not on Windows); 0 means no limit
+class CommandLimits(TypedDict):
+    # CPU seconds
+    cpu_time: int
+    # Bytes of address space
+    memory: int
+    open_files: int
+
+NO_LIMITS = CommandLimits(cpu_time=0, memory=0, open_files=0)
+
+class CommandUsage(TypedDict):
+    wall_time: float
+    # User + system seconds of the whole process tree
+    cpu_time: float
+    # Largest sampled sum of the resident memory of the tree, in bytes
+    peak_rss: int
+    # Descendants of the command's shell seen while sampling
+    child_processes: int
+
+# Complete lines read from one of the command's pipes at once
+class OutputChunk(TypedDict):
+    # "stdout" or "stderr"
+    stream: str
+    text: str
+    # time.time() of the read
+    time: float
+
+def output_text(chunks: list[OutputChunk]) -> str:
+    return "".join(chunk["text"] for chunk in chunks)
+
+# Incremental decoding of one pipe into complete lines. Invalid UTF-8 is
+# replaced rather than dropped, and line endings are translated like a text
+# mode pipe would (\r\n and \r become \n).
+class LineDecoder:
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.partial = ""
+
+    def decode(self, data: bytes, final: bool = False) -> str:
+        text = self.partial + self.decoder.decode(data, final)
+        self.partial = ""
+        if text.endswith("\r") and not final:
+            # May be the first half of a \r\n split between two reads
+            text, self.partial = text[:-1], "\r"
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        end = text.rfind("\n") + 1
+        lines, rest = text[:end], text[end:]
+        if final and rest:
+            lines, rest = lines + rest + "\n", ""
+        while len(rest) >= MAX_LINE_LENGTH:
+            lines += rest[:MAX_LINE_LENGTH] + "\n"
+            rest = rest[MAX_LINE_LENGTH:]
+        self.partial = rest + self.partial
+        return lines
+
+# Reads stdout and stderr of a command from a single thread. Both pipes are
+# read as raw bytes in chunks as soon as either has data, so their relative
+# order is kept and a long line is not buffered whole. Everything read in one
+# pass is handed to on_output as one batch of OutputChunks. On Windows, where
+# pipes can't be selected, a small thread per pipe feeds the same loop.
+class OutputReader:
+    def __init__(self, pipes: dict[str, IO[bytes]], on_output: Callable[[list[OutputChunk]], None]):
+        self.pipes = pipes
+        self.on_output = on_output
+        self.decoders = {stream: LineDecoder() for stream in pipes}
+        # Held while on_output runs; close() takes it so that nothing is
+        # passed on once it returned
+        self.lock = threading.Lock()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        # False if the pipes are still open after timeout
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+    def close(self):
+        # Output that is still read afterwards (a background process holding
+        # the pipes open) is dropped
+        with self.lock:
+            self.closed = True
+
+    def _emit(self, reads: list[tuple[str, bytes, float]]):
+        batch = []
+        for stream, data, read_time in reads:
+            text = self.decoders[stream].decode(data, final=not data)
+            if text:
+                batch.append(OutputChunk(stream=stream, text=text, time=read_time))
+        if not batch:
+            return
+        with self.lock:
+            if not self.closed:
+                self.on_output(batch)
+
+    def _run(self):
+        if sys.platform == "win32":
+            self._run_threads()
+        else:
+            self._run_selector()
+        for pipe in self.pipes.values():
+            pipe.close()
+
+    def _run_selector(self):
+        with selectors.DefaultSelector() as selector:
+            for stream, pipe in self.pipes.items():
+                os.set_blocking(pipe.fileno(), False)
+                selector.register(pipe.fileno(), selectors.EVENT_READ, stream)
+            while selector.get_map():
+                reads = []
+                for key, _ in selector.select():
+                    try:
+                        data = os.read(key.fd, READ_CHUNK_SIZE)
+                    except BlockingIOError:
+                        continue
+                    except OSError:
+                        data = b""
+                    if not data:
+                        selector.unregister(key.fd)
+                    reads.append((key.data, data, time.time()))
+                self._emit(reads)
+
+    def _run_threads(self):
+        reads: queue.Queue[tuple[str, bytes, float]] = queue.Queue()
+
+        def feed(stream: str, pipe: IO[bytes]):
+            while True:
+                try:
+                    data = pipe.read(READ_CHUNK_SIZE)
+                except OSError:
+                    data = b""
+                reads.put((stream, data, time.time()))
+                if not data:
+                    return
+
+        for stream, pipe in self.pipes.items():
+            threading.Thread(target=feed, args=(stream, pipe), daemon=True).start()
+        open_pipes = len(self.pipes)
+        while open_pipes:
+            batch = [reads.get()]
+            while True:
+                try:
+                    batch.append(reads.get_nowait())
+                except queue.Empty:
+                    break
+            open_pipes -= sum(1 for _, data, _ in batch if not data)
+            self._emit(batch)
+
+def signal_group(pgid: int, sig: int) -> bool:
+    # False once no process is left in the group
+    try:
+        os.killpg(pgid, sig)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def terminate_tree(process: subprocess.Popen, exited: threading.Event, grace_period: float):
+    # The command runs in its own process group, so a signal to the group also
+    # reaches descendants that were re-parented or started while stopping.
+    # Descendants that left the group (setsid) are found with psutil. All get
+    # SIGTERM, and SIGKILL if anything is left after grace_period.
+    import psutil
+
+    def running(proc: psutil.Process) -> bool:
+        try:
+            return proc.status() != psutil.STATUS_ZOMBIE
+        except psutil.Error:
+            return False
+
+    try:
+        descendants = psutil.Process(process.pid).children(recursive=True)
+    except psutil.Error:
+        descendants = []
+
+    if sys.platform == "win32":
+        try:
+            process.send_signal(signal.CTRL_BREAK_EVENT)
+        except OSError:
+            pass
+        group_alive = lambda: not exited.is_set()
+    else:
+        signal_group(process.pid, signal.SIGTERM)
+        # The shell stays in the group as a zombie until the waiter reaps it
+        group_alive = lambda: signal_group(process.pid, 0)
+    for proc in descendants:
+        try:
+            proc.terminate()
+        except psutil.Error:
+            pass
+
+    deadline = time.monotonic() + grace_period
+    while group_alive() or any(running(proc) for proc in descendants):
+        if time.monotonic() >= deadline:
+            break
+        time.sleep(STOP_POLL_INTERVAL)
+    else:
+        return
+
+    if sys.platform != "win32":
+        signal_group(process.pid, signal.SIGKILL)
+    elif not exited.is_set():
+        try:
+            descendants.append(psutil.Process(process.pid))
+        except psutil.Error:
+            pass
+    for proc in descendants:
+        try:
+            if running(proc):
+                proc.kill()
+        except psutil.Error:
+            pass
+
+def limited_command(command: str, limits: CommandLimits) -> str:
+    # ulimit applies to the shell and everything it starts
+    settings = []
+    if limits["cpu_time"]:
+        settings.append(f"ulimit -t {int(limits['cpu_time'])}")
+    if limits["memory"]:
+        settings.append(f"ulimit -v {int(limits['memory']) // 1024}")
+    if limits["open_files"]:
+        settings.append(f"ulimit -n {int(limits['open_files'])}")
+    if not settings or sys.platform == "win32":
+        return command
+    # The command is run by a nested shell so that a failing ulimit stops it
+    # and its syntax is checked as usual
+    return " && ".join(settings) + f" && exec /bin/sh -c {shlex.quote(command)}"
+
+# Resource use of one command's process tree, from periodic samples with
+# psutil. Processes that start and exit between two samples are not seen, but
+# on POSIX their CPU time is still counted: the shell is sampled once more
+# after it exited and before it is reaped, when its CPU time includes that of
+# every descendant that was waited for.
+class UsageTracker:
+    def __init__(self, pid: int):
+        self.pid = pid
+        # Last CPU seconds seen per process, keyed by (pid, create_time)
+        self.cpu: dict[tuple[int, float], float] = {}
+        self.peak_rss = 0
+
+    def sample(self):
+        import psutil
+
+        try:
+            root = psutil.Process(self.pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return
+        rss = 0
+        for proc in processes:
+            try:
+                with proc.oneshot():
+                    key = (proc.pid, proc.create_time())
+                    times = proc.cpu_times()
+                    rss += proc.memory_info().rss
+            except psutil.Error:
+                continue
+            self.cpu[key] = times.user + times.system
+        self.peak_rss = max(self.peak_rss, rss)
+
+    def finish(self, wall_time: float) -> CommandUsage:
+        # Called after the shell exited, before it is reaped
+        import psutil
+
+        cpu_time = sum(self.cpu.values())
+        try:
+            times = psutil.Process(self.pid).cpu_times()
+            # children_* are always 0 on Windows and macOS
+            cpu_time = max(cpu_time, times.user + times.system + times.children_user + times.children_system)
+        except psutil.Error:
+            pass
+        return CommandUsage(
+            wall_time=wall_time,
+            cpu_time=cpu_time,
+            peak_rss=self.peak_rss,
+            child_processes=sum(1 for pid, _ in self.cpu if pid != self.pid),
+        )
+
+def format_exit(exit_code: int, usage: CommandUsage, cached: bool = False) -> str:
+    # Console footer of a run
+    megabytes = usage["peak_rss"] / (1024 * 1024)
+    return (
+        f"\nProcess exited with code {exit_code} after {usage['wall_time']:.1f}s"
+        f" (CPU {usage['cpu_time']:.1f}s, peak memory {megabytes:.0f} MB,"
+        f" {usage['child_processes']} child process{'es' if usage['child_processes'] != 1 else ''})"
+        f"{' (cached)' if cached else ''}\n"
+    )
+
+def get_user_environment() -> dict[str, str]:
+    if sys.platform != "win32":
+        return os.environ.copy()
+
+    import ctypes
+    from ctypes import wintypes
+
+    # Load required DLLs
+    advapi32 = ctypes.WinDLL("advapi32")
+    userenv = ctypes.WinDLL("userenv")
+    kernel32 = ctypes.WinDLL("kernel32")
+
+    # Constants
+    TOKEN_QUERY = 0x0008
+
+    # Function prototypes
+    OpenProcessToken = advapi32.OpenProcessToken
+    OpenProcessToken.argtypes = [wintypes.HANDLE, wintypes.DWORD, ctypes.POINTER(wintypes.HANDLE)]
+    OpenProcessToken.restype = wintypes.BOOL
+
+    CreateEnvironmentBlock = userenv.CreateEnvironmentBlock
+    CreateEnvironmentBlock.argtypes = [ctypes.POINTER(ctypes.c_void_p), wintypes.HANDLE, wintypes.BOOL]
+    CreateEnvironmentBlock.restype = wintypes.BOOL
+
+    DestroyEnvironmentBlock = userenv.DestroyEnvironmentBlock
+    DestroyEnvironmentBlock.argtypes = [wintypes.LPVOID]
+    DestroyEnvironmentBlock.restype = wintypes.BOOL
+
+    GetCurrentProcess = kernel32.GetCurrentProcess
+    GetCurrentProcess.argtypes = []
+    GetCurrentProcess.restype = wintypes.HANDLE
+
+    CloseHandle = kernel32.CloseHandle
+    CloseHandle.argtypes = [wintypes.HANDLE]
+    CloseHandle.restype = wintypes.BOOL
+
+    # Get process token
+    token = wintypes.HANDLE()
+    if not OpenProcessToken(GetCurrentProcess(), TOKEN_QUERY, ctypes.byref(token)):
+        raise RuntimeError("Failed to open process token")
+
+    try:
+        # Create environment block
+        environment = ctypes.c_void_p()
+        if not CreateEnvironmentBlock(ctypes.byref(environment), token, False):
+            raise RuntimeError("Failed to create environment block")
+
+        try:
+            # Convert environment block to list of strings
+            result = {}
+            env_ptr = ctypes.cast(environment, ctypes.POINTER(ctypes.c_wchar))
+            offset = 0
+
+            while True:
+                # Get string at current offset
+                current_string = ""
+                while env_ptr[offset] != "\0":
+                    current_string += env_ptr[offset]
+                    offset += 1
+
+                # Skip null terminator
+                offset += 1
+
+                # Break if we hit double null terminator
+                if not current_string:
+                    break
+
+                equal_index = current_string.index("=")
+                if equal_index == -1:
+                    continue
+
+                key = current_string[:equal_index]
+                value = current_string[equal_index + 1:]
+                result[key] = value
+
+            return result
+
+        finally:
+            DestroyEnvironmentBlock(environment)
+
+    finally:
+        CloseHandle(token)
+
+
+# Runs one shell command in the project directory, in a new session (process
+# group) of its own. Output is passed to on_output in batches of complete lines
+# from the reader thread; on_exit(exit_code, usage) is called exactly once,
+# from a waiter thread, after all output has been passed on.
+class CommandRunner:
+    def __init__(
+        self,
+        command: str,
+        cwd: str,
+        on_output: Callable[[list[OutputChunk]], None],
+        on_exit: Callable[[int, CommandUsage], None],
+        limits: CommandLimits = NO_LIMITS,
+        stop_grace_period: float = STOP_GRACE_PERIOD,
+    ):
+        self.command = command
+        self.cwd = cwd
+        self.on_output = on_output
+        self.on_exit = on_exit
+        self.limits = limits
+        self.stop_grace_period = stop_grace_period
+        self.process: Optional[subprocess.Popen] = None
+        # Set once the shell has exited (the rest of its group may still run)
+        self.exited = threading.Event()
+        self.stopping = False
+
+    @property
+    def started(self) -> bool:
+        return self.process is not None
+
+    def start(self):
+        started = time.monotonic()
+        self.process = subprocess.Popen(
+            limited_command(self.command, self.limits),
+            shell=True,
+            cwd=self.cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=get_user_environment(),
+            bufsize=0,
+            close_fds=True,
+            start_new_session=sys.platform != "win32",
+            creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if sys.platform == "win32" else 0,
+        )
+        process = self.process
+
+        reader = OutputReader({"stdout": process.stdout, "stderr": process.stderr}, self.on_output)
+        reader.start()
+
+        tracker = UsageTracker(process.pid)
+        exited = self.exited
+
+        def sample_usage():
+            while True:
+                tracker.sample()
+                if exited.wait(USAGE_SAMPLE_INTERVAL):
+                    return
+
+        sampler = threading.Thread(target=sample_usage, daemon=True)
+        sampler.start()
+
+        def wait_for_exit():
+            if hasattr(os, "waitid"):
+                # Wait without reaping the shell, so UsageTracker.finish can
+                # still read its CPU time
+                try:
+                    os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+                except OSError:
+                    pass
+            wall_time = time.monotonic() - started
+            exited.set()
+            sampler.join()
+            usage = tracker.finish(wall_time)
+            exit_code = process.wait()
+            # Drain the pipes first so on_exit comes after the last line; a
+            # background grandchild may keep them open, so don't wait forever
+            if not reader.join(OUTPUT_DRAIN_TIMEOUT):
+                reader.close()
+            self.on_exit(exit_code, usage)
+
+        threading.Thread(target=wait_for_exit, daemon=True).start()
+
+    def stop(self):
+        # Returns right away; on_exit follows once the shell is gone. Also
+        # stops what is left in the group after the shell exited. Not
+        # process.poll(): it would reap the shell before the waiter is done.
+        if self.process is None or self.stopping:
+            return
+        self.stopping = True
+        # Not a daemon: a process that exits right after stopping a command
+        # (the UI host at shutdown) waits until the command is gone
+        threading.Thread(
+            target=terminate_tree,
+            args=(self.process, self.exited, self.stop_grace_period),
+        ).start()
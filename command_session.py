@@ -0,0 +1,362 @@
+# Interactive Feedback MCP command sessions
+# Developed by Fábio Ferreira (https://x.com/fabiomlferreira)
+# Inspired by/related to dotcursorrules.com (https://dotcursorrules.com/)
+#
+# The command side of one feedback request, without any Qt or HTTP: running
+# the project's command (or its pipeline) with the project's limits, replaying
+# a cached result or storing a new one (command_cache), keeping the output in
+# a log store and a log reducer, and the exit code, resource use and steps of
+# the last run for the result. The Qt window (feedback_ui.py), the browser
+# frontend (web_ui.py), headless calls (headless.py) and the server's early
+# commands (server.py) each only add their view of it, through the callbacks.
+#
+# on_output and on_step_output are called from whichever thread produced the
+# output. Everything else happens on the frontend's own thread: what the
+# command's threads report is handed to post(function), which is to run the
+# function there later (loop.call_soon_threadsafe, or a queued Qt signal).
+import threading
+from typing import Any, Callable, Optional, TypedDict
+
+from command_runner import CommandRunner, CommandUsage, OutputChunk, format_exit, output_text
+from command_pipeline import CommandPipeline, StepResult, parse_pipeline
+import command_cache
+from command_cache import CachedResult, CommandCache
+from log_store import LogStore
+from log_reducer import LogReducer
+from project_settings import FeedbackConfig, command_limits
+from tracing import Span, TraceContext, tracer
+
+class FeedbackResult(TypedDict):
+    logs: str
+    logs_total_lines: int
+    logs_dropped_lines: int
+    # The logs are a replay of an earlier run; the project has not changed since
+    logs_cached: bool
+    # Exit code of and resources used by the last command that finished, if any
+    command_exit_code: Optional[int]
+    command_usage: Optional[CommandUsage]
+    # Each step's result, if the last command that finished was a pipeline
+    command_steps: Optional[list[StepResult]]
+    # All of the logs can be read with get_command_logs under this id
+    run_id: Optional[str]
+    interactive_feedback: str
+    # The request's deadline passed; interactive_feedback is what had been typed
+    timed_out: bool
+
+def empty_result(timed_out: bool = False) -> FeedbackResult:
+    # A request that ended before anything was typed or run
+    return FeedbackResult(
+        logs="",
+        logs_total_lines=0,
+        logs_dropped_lines=0,
+        logs_cached=False,
+        command_exit_code=None,
+        command_usage=None,
+        command_steps=None,
+        run_id=None,
+        interactive_feedback="",
+        timed_out=timed_out,
+    )
+
+class CommandSession:
+    def __init__(
+        self,
+        project_directory: str,
+        config: FeedbackConfig,
+        command_cache: CommandCache,
+        post: Callable[[Callable[[], None]], Any],
+        on_output: Callable[[str], None],
+        on_exit: Callable[[Optional[int]], None],
+        on_run: Optional[Callable[[str, list[StepResult]], None]] = None,
+        on_started: Optional[Callable[[str], None]] = None,
+        on_step: Optional[Callable[[StepResult], None]] = None,
+        on_step_output: Optional[Callable[[str, str], None]] = None,
+        trace: Optional[TraceContext] = None,
+    ):
+        # config: the project's, read again for every run, so changes made in
+        # the window (or page) apply to the next one.
+        # on_run(command, steps): a run begins, with the steps of its pipeline
+        # (none for a single command, and none again when a cached result
+        # replaces the run).
+        # on_started(command): the command started, or its cached result is replayed.
+        # on_exit(exit_code): the run is over; None if it was cancelled or
+        # could not be started.
+        # on_step(result), on_step_output(name, text): a step of a pipeline
+        # changed, or printed something.
+        # trace: the span the run_command spans go below
+        self.project_directory = project_directory
+        self.config = config
+        self.command_cache = command_cache
+        self.post = post
+        self.on_output = on_output
+        self.on_exit = on_exit
+        self.on_run = on_run
+        self.on_started = on_started
+        self.on_step = on_step
+        self.on_step_output = on_step_output
+        self.trace = trace
+
+        self.runner: Optional[Any] = None
+        # Held while output is stored and passed to on_output, so the log
+        # store can be read in step with what on_output has been given
+        self.lock = threading.Lock()
+        self.log_store = LogStore(config["log_memory_limit"], config["log_spool_limit"])
+        self.log_reducer = LogReducer(config["log_budget"])
+        self.logs_cached = False
+        # Exit code of and resources used by the last command that finished
+        self.command_exit_code: Optional[int] = None
+        self.command_usage: Optional[CommandUsage] = None
+        self.command_steps: Optional[list[StepResult]] = None
+        # Fingerprint of the project when the running command started, if it is to be cached
+        self.run_fingerprint: Optional[str] = None
+        self.command_span: Optional[Span] = None
+        self.closed = False
+
+    @property
+    def running(self) -> bool:
+        return self.runner is not None
+
+    def _post(self, function: Callable[[], None]):
+        # Nothing is reported after close(): the frontend's event loop may be
+        # gone by the time a stopped command exits
+        if not self.closed:
+            self.post(function)
+
+    def append_log(self, text: str):
+        # Safe to call from the output reader threads. Output that arrives
+        # after close() (a command that is still stopping) is dropped.
+        with self.lock:
+            if self.closed:
+                return
+            self.log_store.append(text)
+            self.log_reducer.append(text)
+            self.on_output(text)
+
+    def _skip_logs(self, count: int):
+        # The lines the log store of a replayed run had dropped: they keep
+        # their numbers in the archived logs and in the excerpt
+        with self.lock:
+            if self.closed:
+                return
+            self.log_store.skip(count)
+            self.log_reducer.skip(count)
+            self.on_output(f"... {count} lines dropped ...\n")
+
+    def _append_output(self, chunks: list[OutputChunk]):
+        self.append_log(output_text(chunks))
+
+    def _new_run(self):
+        # The logs of the result are those of the last run
+        with self.lock:
+            self.log_store.clear()
+            self.log_reducer = LogReducer(self.config["log_budget"])
+        self.logs_cached = False
+        self.command_steps = None
+
+    def clear_logs(self):
+        self.log_store.clear()
+        self.log_reducer.clear()
+        self.logs_cached = False
+
+    def take_log_store(self) -> LogStore:
+        # The output so far, to be archived (command_logs) off the frontend's
+        # thread; the session goes on with an empty store
+        with self.lock:
+            log_store, self.log_store = self.log_store, LogStore()
+        return log_store
+
+    def run(self, command: str, commands: str = "", replay_cached: bool = False):
+        # Runs the steps of commands if it has any, command otherwise; stops
+        # the running command instead, if there is one.
+        # replay_cached: for the automatic run, replay the cached result instead
+        # if the project has not changed since it was stored
+        if self.runner:
+            self.stop()
+            return
+
+        self._new_run()
+        try:
+            steps = parse_pipeline(commands)
+        except ValueError as e:
+            self.append_log(f"Invalid commands: {e}\n")
+            return
+        if not steps and not command:
+            self.append_log("Please enter a command to run\n")
+            return
+
+        on_exit = lambda exit_code, usage: self._post(lambda: self._on_exit(runner, exit_code, usage))
+        if steps:
+            runner = CommandPipeline(
+                steps,
+                self.project_directory,
+                on_output=self._append_output,
+                on_exit=on_exit,
+                on_step_output=self.on_step_output,
+                on_step=lambda result: self._post(lambda: self._on_step(runner, result)),
+                limits=command_limits(self.config),
+                stop_grace_period=self.config["stop_grace_period"],
+                max_parallel=self.config["max_parallel_commands"],
+            )
+            command = runner.command
+        else:
+            runner = CommandRunner(
+                command,
+                self.project_directory,
+                on_output=self._append_output,
+                on_exit=on_exit,
+                limits=command_limits(self.config),
+                stop_grace_period=self.config["stop_grace_period"],
+            )
+        self.runner = runner
+        if self.on_run:
+            self.on_run(command, runner.step_results() if steps else [])
+        self.append_log(f"$ {command}\n")
+        self.command_span = tracer.start_span("run_command", self.trace, steps=len(steps))
+        if self.config["cache_results"]:
+            # The command starts (or its cached result is replayed) once the
+            # project has been fingerprinted, which can take a moment
+            def check_cache():
+                fingerprint, cached = command_cache.lookup(self.command_cache, self.project_directory, command, replay_cached)
+                self._post(lambda: self._on_cache_checked(runner, fingerprint, cached))
+
+            threading.Thread(target=check_cache, daemon=True).start()
+            return
+        self._start_runner(runner)
+
+    def attach(self, runner: Any):
+        # A command that already runs elsewhere (RemoteCommand in
+        # feedback_ui.py): it passes on all of its output, the "$" and exit
+        # lines included, caches its own result, and reports its exit with
+        # runner.on_exit(exit_code, usage, cached) on the frontend's thread
+        self._new_run()
+        runner.on_output = self.append_log
+        runner.on_exit = lambda exit_code, usage, cached: self._on_attached_exit(runner, exit_code, usage, cached)
+        self.runner = runner
+        if self.on_run:
+            self.on_run(runner.command, [])
+        if self.on_started:
+            self.on_started(runner.command)
+
+    def stop(self):
+        # Returns right away; on_exit follows once the command is gone
+        if not self.runner:
+            return
+        # A stopped run is not cached
+        self.run_fingerprint = None
+        if not self.runner.started:
+            # Still fingerprinting the project; _on_cache_checked ignores the result
+            self.runner = None
+            self.append_log("Cancelled\n")
+            self._end_command_span(cancelled=True)
+            self.on_exit(None)
+            return
+        self.runner.stop()
+
+    def _start_runner(self, runner: CommandRunner):
+        try:
+            runner.start()
+        except Exception as e:
+            self.append_log(f"Error running command: {str(e)}\n")
+            self.runner = None
+            self.run_fingerprint = None
+            self._end_command_span(error=type(e).__name__)
+            self.on_exit(None)
+            return
+        if self.on_started:
+            self.on_started(runner.command)
+
+    def _end_command_span(self, **attributes):
+        if self.command_span is not None:
+            self.command_span.end(**attributes)
+            self.command_span = None
+
+    def _on_cache_checked(self, runner: CommandRunner, fingerprint: Optional[str], cached: Optional[CachedResult]):
+        if runner is not self.runner:
+            # Cancelled, or the request ended in the meantime
+            return
+        self.run_fingerprint = fingerprint
+        if cached is None:
+            self._start_runner(runner)
+            return
+
+        self.runner = None
+        self.run_fingerprint = None
+        self.logs_cached = True
+        if self.on_run:
+            self.on_run(runner.command, [])
+        if self.on_started:
+            self.on_started(runner.command)
+        self.append_log(command_cache.describe(cached))
+        self.append_log(cached["logs"])
+        if cached["dropped_lines"]:
+            self._skip_logs(cached["dropped_lines"])
+            self.append_log(cached["tail_logs"])
+        self.append_log(format_exit(cached["exit_code"], cached["usage"], cached=True))
+        self.command_exit_code = cached["exit_code"]
+        self.command_usage = cached["usage"]
+        self._end_command_span(exit_code=cached["exit_code"], cached=True)
+        self.on_exit(cached["exit_code"])
+
+    def _on_step(self, runner: CommandPipeline, result: StepResult):
+        if runner is self.runner and self.on_step:
+            self.on_step(result)
+
+    def _on_exit(self, runner: CommandRunner, exit_code: int, usage: CommandUsage):
+        # Runs exactly once per command, after all of its output has been passed on
+        if runner is not self.runner:
+            # Stopped because the request ended
+            return
+        if self.run_fingerprint is not None:
+            # Stored off the frontend's thread, if the project is still as it
+            # was at the start. Without the gap marker of text(): a replay
+            # numbers the lines after the gap as this run did
+            head, dropped_lines, tail = self.log_store.split()
+            logs = (head.removeprefix(f"$ {runner.command}\n"), dropped_lines, tail)
+            threading.Thread(
+                target=command_cache.store,
+                args=(self.command_cache, self.project_directory, runner.command, self.run_fingerprint, logs, exit_code, usage),
+                daemon=True,
+            ).start()
+            self.run_fingerprint = None
+        self.append_log(format_exit(exit_code, usage))
+        self.command_exit_code = exit_code
+        self.command_usage = usage
+        self.command_steps = runner.step_results() if isinstance(runner, CommandPipeline) else None
+        self.runner = None
+        self._end_command_span(exit_code=exit_code)
+        self.on_exit(exit_code)
+
+    def _on_attached_exit(self, runner: Any, exit_code: Optional[int], usage: Optional[CommandUsage], cached: bool):
+        if runner is not self.runner:
+            return
+        if exit_code is not None:
+            self.command_exit_code = exit_code
+            self.command_usage = usage
+        self.logs_cached = cached
+        self.runner = None
+        self.on_exit(exit_code)
+
+    def result(self, interactive_feedback: str, timed_out: bool = False) -> FeedbackResult:
+        # run_id is filled in once the logs have been archived
+        return FeedbackResult(
+            logs=self.log_reducer.text(),
+            logs_total_lines=self.log_reducer.total_lines,
+            logs_dropped_lines=self.log_reducer.dropped_lines,
+            logs_cached=self.logs_cached,
+            command_exit_code=self.command_exit_code,
+            command_usage=self.command_usage,
+            command_steps=self.command_steps,
+            run_id=None,
+            interactive_feedback=interactive_feedback,
+            timed_out=timed_out,
+        )
+
+    def close(self):
+        # The request is over: a running command is stopped and whatever it
+        # still reports is ignored
+        self.closed = True
+        if self.runner:
+            runner, self.runner = self.runner, None
+            runner.stop()
+        self.run_fingerprint = None
+        self._end_command_span(stopped=True)
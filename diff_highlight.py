@@ -0,0 +1,138 @@
+# Interactive Feedback MCP diff highlighting
+# Developed by Fábio Ferreira (https://x.com/fabiomlferreira)
+# Inspired by/related to dotcursorrules.com (https://dotcursorrules.com/)
+#
+# Splits a unified diff (git diff, diff -u) into styled ranges per line for the
+# diff view of the feedback window. Each line gets a list of
+# (start, length, style) ranges, with style one of
+#
+#   file      diff --git, index, ---/+++ and other lines about a file
+#   hunk      @@ -a,b +c,d @@
+#   added     a + line; added_change marks the characters that differ from
+#   removed   the - line it replaces (same for removed/removed_change)
+#   note      \ No newline at end of file
+#
+# and context lines get none. Hunk headers are parsed for their line counts,
+# so a "--- " or "+++ " line inside a hunk is still a removed or added line.
+# highlight_diff() is a generator that yields the styles a chunk of lines at a
+# time, so the window can do the work on a thread and show it as it comes.
+# The chunks are bounded whatever the lines are: a - line is yielded together
+# with the + line it pairs with, so a long run of changed lines is split too.
+import re
+import difflib
+from collections import deque
+from typing import Iterator
+
+# Lines per chunk yielded by highlight_diff. The window's thread hands each
+# chunk over with a signal, which also lets the UI thread have the GIL; with
+# 2000 lines the UI thread waited for it often enough to load the diff ~30%
+# slower
+DIFF_CHUNK_LINES = 200
+# Changed characters are only looked for in pairs of lines up to this long
+INTRALINE_MAX_CHARS = 1000
+
+HUNK_HEADER = re.compile(r"^@@ -\d+(?:,(\d+))? \+\d+(?:,(\d+))? @@")
+
+StyleRange = tuple[int, int, str]
+
+def split_lines(diff: str) -> list[str]:
+    # One entry per line of the diff view (a block of the document); only "\n"
+    # ends a line there, so str.splitlines() would not match it
+    return [line.removesuffix("\r") for line in diff.removesuffix("\n").split("\n")]
+
+def _changed_ranges(removed: str, added: str) -> tuple[list[StyleRange], list[StyleRange]]:
+    if len(removed) > INTRALINE_MAX_CHARS or len(added) > INTRALINE_MAX_CHARS:
+        return [], []
+    # Without the +/- prefix
+    matcher = difflib.SequenceMatcher(None, removed[1:], added[1:], autojunk=False)
+    if matcher.ratio() < 0.5:
+        # Rewritten rather than edited; marking nearly everything helps nobody
+        return [], []
+    removed_ranges, added_ranges = [], []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        if i2 > i1:
+            removed_ranges.append((i1 + 1, i2 - i1, "removed_change"))
+        if j2 > j1:
+            added_ranges.append((j1 + 1, j2 - j1, "added_change"))
+    return removed_ranges, added_ranges
+
+def highlight_diff(lines: list[str], chunk_lines: int = DIFF_CHUNK_LINES) -> Iterator[tuple[int, list[list[StyleRange]]]]:
+    # Yields (index of the first line, styles of that line and up to
+    # chunk_lines - 1 following ones). Every line is yielded once, but not
+    # necessarily in order: the - lines of a change wait for the + lines they
+    # pair with (the first with the first, and so on).
+    styles: dict[int, list[StyleRange]] = {}
+    # Lines left in the current hunk on either side
+    old_left = new_left = 0
+    # The - lines of the current change still waiting for a + line, by index
+    removed: deque[tuple[int, str]] = deque()
+    # Whether the current change has + lines yet
+    added = False
+
+    def end_change():
+        nonlocal added
+        while removed:
+            index, line = removed.popleft()
+            styles[index] = [(0, len(line), "removed")]
+        added = False
+
+    for index, line in enumerate(lines):
+        in_hunk = old_left > 0 or new_left > 0
+        if in_hunk and line.startswith("-"):
+            if added:
+                # Removed lines after added ones start the next change
+                end_change()
+            removed.append((index, line))
+            old_left -= 1
+        elif in_hunk and line.startswith("+"):
+            added_styles = [(0, len(line), "added")]
+            if removed:
+                removed_index, removed_line = removed.popleft()
+                removed_ranges, added_ranges = _changed_ranges(removed_line, line)
+                styles[removed_index] = [(0, len(removed_line), "removed")] + removed_ranges
+                added_styles += added_ranges
+            styles[index] = added_styles
+            added = True
+            new_left -= 1
+        else:
+            end_change()
+            if line.startswith("\\"):
+                styles[index] = [(0, len(line), "note")]
+            elif in_hunk and (line.startswith(" ") or not line):
+                # Some tools strip the space of empty context lines
+                styles[index] = []
+                old_left -= 1
+                new_left -= 1
+            elif (match := HUNK_HEADER.match(line)) is not None:
+                old_left = int(match.group(1) or 1)
+                new_left = int(match.group(2) or 1)
+                styles[index] = [(0, match.end(), "hunk")]
+            elif line.startswith(("diff ", "index ", "--- ", "+++ ", "new file", "deleted file", "old mode", "new mode", "similarity", "rename ", "copy ", "Binary files")):
+                old_left = new_left = 0
+                styles[index] = [(0, len(line), "file")]
+            else:
+                # Text around the diff (a commit message, say)
+                old_left = new_left = 0
+                styles[index] = []
+
+        if len(styles) >= chunk_lines:
+            yield from _runs(styles, chunk_lines)
+            styles = {}
+    end_change()
+    yield from _runs(styles, chunk_lines)
+
+def _runs(styles: dict[int, list[StyleRange]], chunk_lines: int) -> Iterator[tuple[int, list[list[StyleRange]]]]:
+    # The styles as runs of consecutive lines, at most chunk_lines long (the
+    # end of a long run of - lines comes all at once)
+    start, run = 0, []
+    for index in sorted(styles):
+        if run and (index != start + len(run) or len(run) >= chunk_lines):
+            yield start, run
+            run = []
+        if not run:
+            start = index
+        run.append(styles[index])
+    if run:
+        yield start, run
@@ -0,0 +1,165 @@
+# Interactive Feedback MCP feedback history
+# Developed by Fábio Ferreira (https://x.com/fabiomlferreira)
+# Inspired by/related to dotcursorrules.com (https://dotcursorrules.com/)
+#
+# Every feedback that is sent is recorded per project, with the prompt it
+# answered and the exit code of the last command, and the feedback box
+# suggests earlier feedback while typing. Each distinct feedback of a project is
+# a phrase with a use count; suggestions are the phrases that start with the
+# typed text, then those that contain every typed word as a word prefix (an
+# FTS5 index), most used first.
+#
+# The database is only opened by the first suggestion or record, so it adds
+# nothing to the startup of the window.
+import os
+import re
+import time
+import sqlite3
+import threading
+from typing import Optional
+
+from project_settings import SETTINGS_BUSY_TIMEOUT, get_project_settings_group, get_settings_path
+
+# Requests kept over all projects, and phrases kept per project
+HISTORY_MAX_ENTRIES = 100_000
+HISTORY_MAX_PHRASES = 20_000
+# Stored in PRAGMA user_version; a history with another layout is dropped
+HISTORY_SCHEMA_VERSION = 1
+
+# Suggestions shown, and the shortest text they are looked up for
+SUGGEST_LIMIT = 8
+SUGGEST_MIN_CHARS = 2
+
+# Sorts after any text that starts with the same characters
+PREFIX_END = "\U0010ffff"
+WORD = re.compile(r"\w+")
+
+class FeedbackHistory:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(os.path.dirname(get_settings_path()), "feedback_history.db")
+        # Used from worker threads; the database is only opened once there
+        # is feedback to record or look up
+        self.lock = threading.Lock()
+        self.db: Optional[sqlite3.Connection] = None
+
+    def _open(self) -> sqlite3.Connection:
+        if self.db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.db = sqlite3.connect(
+                self.path,
+                timeout=SETTINGS_BUSY_TIMEOUT,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            if self.db.execute("PRAGMA user_version").fetchone()[0] != HISTORY_SCHEMA_VERSION:
+                for table in ("entries", "phrases", "phrases_fts"):
+                    self.db.execute(f"DROP TABLE IF EXISTS {table}")
+                self.db.execute(f"PRAGMA user_version = {HISTORY_SCHEMA_VERSION}")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "id INTEGER PRIMARY KEY, scope TEXT NOT NULL, prompt TEXT NOT NULL, feedback TEXT NOT NULL, "
+                "exit_code INTEGER, timed_out INTEGER NOT NULL, created REAL NOT NULL)"
+            )
+            # key is the casefolded feedback, for prefix lookups with the index
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS phrases ("
+                "id INTEGER PRIMARY KEY, scope TEXT NOT NULL, feedback TEXT NOT NULL, key TEXT NOT NULL, "
+                "uses INTEGER NOT NULL, last_used REAL NOT NULL, UNIQUE (scope, feedback))"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS phrases_key ON phrases (scope, key)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS phrases_last_used ON phrases (scope, last_used)")
+            self.db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS phrases_fts USING fts5("
+                "feedback, content='phrases', content_rowid='id')"
+            )
+            self.db.execute(
+                "CREATE TRIGGER IF NOT EXISTS phrases_insert AFTER INSERT ON phrases BEGIN "
+                "INSERT INTO phrases_fts (rowid, feedback) VALUES (new.id, new.feedback); END"
+            )
+            self.db.execute(
+                "CREATE TRIGGER IF NOT EXISTS phrases_delete AFTER DELETE ON phrases BEGIN "
+                "INSERT INTO phrases_fts (phrases_fts, rowid, feedback) VALUES ('delete', old.id, old.feedback); END"
+            )
+        return self.db
+
+    def add(self, project_directory: str, prompt: str, feedback: str, exit_code: Optional[int], timed_out: bool = False):
+        scope = get_project_settings_group(project_directory)
+        now = time.time()
+        with self.lock:
+            db = self._open()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute(
+                    "INSERT INTO entries (scope, prompt, feedback, exit_code, timed_out, created) VALUES (?, ?, ?, ?, ?, ?)",
+                    (scope, prompt, feedback, exit_code, int(timed_out), now),
+                )
+                db.execute(
+                    "INSERT INTO phrases (scope, feedback, key, uses, last_used) VALUES (?, ?, ?, 1, ?) "
+                    "ON CONFLICT (scope, feedback) DO UPDATE SET uses = uses + 1, last_used = excluded.last_used",
+                    (scope, feedback, feedback.casefold(), now),
+                )
+                # Ids only grow, so the oldest entries are the lowest ids
+                db.execute("DELETE FROM entries WHERE id <= (SELECT MAX(id) FROM entries) - ?", (HISTORY_MAX_ENTRIES,))
+                db.execute(
+                    "DELETE FROM phrases WHERE scope = ? AND last_used < "
+                    "(SELECT last_used FROM phrases WHERE scope = ? ORDER BY last_used DESC LIMIT 1 OFFSET ?)",
+                    (scope, scope, HISTORY_MAX_PHRASES - 1),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def suggest(self, project_directory: str, text: str, limit: int = SUGGEST_LIMIT) -> list[str]:
+        # Earlier feedback of the project for what has been typed so far
+        key = text.strip().casefold()
+        if len(key) < SUGGEST_MIN_CHARS:
+            return []
+        scope = get_project_settings_group(project_directory)
+        suggestions: list[str] = []
+        with self.lock:
+            db = self._open()
+            for (feedback,) in db.execute(
+                "SELECT feedback FROM phrases WHERE scope = ? AND key >= ? AND key < ? "
+                "ORDER BY uses DESC, last_used DESC LIMIT ?",
+                (scope, key, key + PREFIX_END, limit + 1),
+            ):
+                if feedback != text and len(suggestions) < limit:
+                    suggestions.append(feedback)
+
+            words = WORD.findall(key)
+            if words and len(suggestions) < limit:
+                query = " ".join(f'"{word}"*' for word in words)
+                for (feedback,) in db.execute(
+                    "SELECT phrases.feedback FROM phrases_fts JOIN phrases ON phrases.id = phrases_fts.rowid "
+                    "WHERE phrases_fts MATCH ? AND phrases.scope = ? "
+                    "ORDER BY phrases.uses DESC, phrases.last_used DESC LIMIT ?",
+                    (query, scope, limit + len(suggestions) + 1),
+                ):
+                    if feedback != text and feedback not in suggestions and len(suggestions) < limit:
+                        suggestions.append(feedback)
+        return suggestions
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+def record(history: FeedbackHistory, project_directory: str, prompt: str, feedback: str, exit_code: Optional[int], timed_out: bool = False):
+    # Empty feedback (nothing to add) is not recorded; neither is anything
+    # when the history can't be written, which must not lose the result
+    if not feedback:
+        return
+    try:
+        history.add(project_directory, prompt, feedback, exit_code, timed_out)
+    except sqlite3.Error:
+        pass
+
+def suggest(history: FeedbackHistory, project_directory: str, text: str) -> list[str]:
+    try:
+        return history.suggest(project_directory, text)
+    except sqlite3.Error:
+        return []
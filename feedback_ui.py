@@ -1,30 +1,85 @@
 # Interactive Feedback MCP UI
 # Developed by Fábio Ferreira (https://x.com/fabiomlferreira)
 # Inspired by/related to dotcursorrules.com (https://dotcursorrules.com/)
+import time
+# Taken before anything else is imported, for --profile-startup and the
+# ui_startup span
+STARTUP_TIME = time.perf_counter()
+STARTUP_WALL_TIME = time.time()
+
 import os
 import sys
 import json
-import psutil
 import argparse
-import subprocess
 import threading
-import hashlib
-from typing import Optional, TypedDict
+from collections import deque
+from typing import Any, Callable, Optional
+
+from ipc import encode_message, read_message
+from log_store import LOG_MEMORY_LIMIT, LOG_SPOOL_LIMIT, LogStore, TailBuffer
+from log_reducer import LOG_BUDGET
+from command_runner import STOP_GRACE_PERIOD, CommandUsage
+from command_pipeline import PIPELINE_MAX_PARALLEL, StepResult
+from command_cache import CommandCache
+from command_session import CommandSession, FeedbackResult, empty_result
+from tracing import TRACE_PARENT_ENV, Span, TraceContext, tracer
+from project_settings import (
+    FeedbackConfig, SettingsStore, get_project_settings_group, load_project_config, save_project_config
+)
 
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QLabel, QLineEdit, QPushButton, QCheckBox, QTextEdit, QGroupBox
+    QLabel, QLineEdit, QPushButton, QCheckBox, QTextEdit, QPlainTextEdit, QTextBrowser, QGroupBox, QSpinBox,
+    QTabWidget, QCompleter, QFrame
+)
+from PySide6.QtCore import Qt, Signal, QObject, QTimer, QByteArray, QEvent, QModelIndex
+from PySide6.QtGui import (
+    QIcon, QKeyEvent, QFont, QFontDatabase, QPalette, QColor, QStandardItem, QStandardItemModel, QTextCursor,
+    QTextDocument, QTextLayout, QTextCharFormat
 )
-from PySide6.QtCore import Qt, Signal, QObject, QTimer, QSettings
-from PySide6.QtGui import QTextCursor, QIcon, QKeyEvent, QFont, QFontDatabase, QPalette, QColor
-
-class FeedbackResult(TypedDict):
-    command_logs: str
-    interactive_feedback: str
 
-class FeedbackConfig(TypedDict):
-    run_command: str
-    execute_automatically: bool
+# Console rendering: output is queued and appended in batches every
+# CONSOLE_FLUSH_INTERVAL_MS, spending at most CONSOLE_FLUSH_TIME_SLICE seconds
+# per batch so input events are processed in between. Only the last
+# CONSOLE_MAX_BLOCKS lines are kept in the widget; the full output lives in the
+# log store. Target: at least 100k lines/s of command output with no gap over
+# 50 ms in event processing (measured with the offscreen platform: `seq 1
+# 1000000` renders at ~137k lines/s with a worst gap of ~33 ms).
+CONSOLE_FLUSH_INTERVAL_MS = 50
+CONSOLE_FLUSH_TIME_SLICE = 0.015
+CONSOLE_FLUSH_CHUNK_LINES = 2000
+CONSOLE_MAX_BLOCKS = 10000
+
+# Command output is also streamed to the server as "output" events, every
+# OUTPUT_EVENT_INTERVAL_MS with the last OUTPUT_EVENT_MAX_CHARS characters
+# rendered in between. The host polls the panels for it: a signal per rendered
+# chunk releases the GIL to the output reader threads on every emit, which
+# costs ~15% of console throughput.
+OUTPUT_EVENT_INTERVAL_MS = 250
+OUTPUT_EVENT_MAX_CHARS = 64 * 1024
+
+# Diff view: nothing is done with the diff of a request until the view has
+# been painted (so it adds nothing to the time to the window). Then it is added
+# to the widget about DIFF_LOAD_CHUNK_CHARS characters (whole lines) at a time
+# for at most DIFF_LOAD_TIME_SLICE seconds per event loop pass, and
+# highlighted on a thread (diff_highlight). Lines are not wrapped, so QPlainTextEdit only lays
+# out the blocks in view, and the highlighting is only applied to the blocks
+# in view as well.
+DIFF_LOAD_TIME_SLICE = 0.015
+DIFF_LOAD_CHUNK_CHARS = 32 * 1024
+# Foreground and background of each diff_highlight style (None: unchanged)
+DIFF_COLORS = {
+    "file": ("#d2a8ff", None),
+    "hunk": ("#79c0ff", None),
+    "added": ("#aff5b4", "#1b3a24"),
+    "added_change": (None, "#2e6b3c"),
+    "removed": ("#ffdcd7", "#3f1d20"),
+    "removed_change": (None, "#7a2e33"),
+    "note": ("#888888", None),
+}
+
+# The summary grows with its text up to this many lines, then scrolls
+SUMMARY_MAX_LINES = 10
 
 def set_dark_title_bar(widget: QWidget, dark_title_bar: bool) -> None:
     # Ensure we're on Windows
@@ -88,195 +143,457 @@ def get_dark_mode_palette(app: QApplication):
     darkPalette.setColor(QPalette.PlaceholderText, QColor(130, 130, 130))
     return darkPalette
 
-def kill_tree(process: subprocess.Popen):
-    killed: list[psutil.Process] = []
-    parent = psutil.Process(process.pid)
-    for proc in parent.children(recursive=True):
-        try:
-            proc.kill()
-            killed.append(proc)
-        except psutil.Error:
-            pass
-    try:
-        parent.kill()
-    except psutil.Error:
-        pass
-    killed.append(parent)
-
-    # Terminate any remaining processes
-    for proc in killed:
-        try:
-            if proc.is_running():
-                proc.terminate()
-        except psutil.Error:
-            pass
-
-def get_user_environment() -> dict[str, str]:
-    if sys.platform != "win32":
-        return os.environ.copy()
-
-    import ctypes
-    from ctypes import wintypes
-
-    # Load required DLLs
-    advapi32 = ctypes.WinDLL("advapi32")
-    userenv = ctypes.WinDLL("userenv")
-    kernel32 = ctypes.WinDLL("kernel32")
-
-    # Constants
-    TOKEN_QUERY = 0x0008
-
-    # Function prototypes
-    OpenProcessToken = advapi32.OpenProcessToken
-    OpenProcessToken.argtypes = [wintypes.HANDLE, wintypes.DWORD, ctypes.POINTER(wintypes.HANDLE)]
-    OpenProcessToken.restype = wintypes.BOOL
-
-    CreateEnvironmentBlock = userenv.CreateEnvironmentBlock
-    CreateEnvironmentBlock.argtypes = [ctypes.POINTER(ctypes.c_void_p), wintypes.HANDLE, wintypes.BOOL]
-    CreateEnvironmentBlock.restype = wintypes.BOOL
-
-    DestroyEnvironmentBlock = userenv.DestroyEnvironmentBlock
-    DestroyEnvironmentBlock.argtypes = [wintypes.LPVOID]
-    DestroyEnvironmentBlock.restype = wintypes.BOOL
-
-    GetCurrentProcess = kernel32.GetCurrentProcess
-    GetCurrentProcess.argtypes = []
-    GetCurrentProcess.restype = wintypes.HANDLE
-
-    CloseHandle = kernel32.CloseHandle
-    CloseHandle.argtypes = [wintypes.HANDLE]
-    CloseHandle.restype = wintypes.BOOL
-
-    # Get process token
-    token = wintypes.HANDLE()
-    if not OpenProcessToken(GetCurrentProcess(), TOKEN_QUERY, ctypes.byref(token)):
-        raise RuntimeError("Failed to open process token")
-
-    try:
-        # Create environment block
-        environment = ctypes.c_void_p()
-        if not CreateEnvironmentBlock(ctypes.byref(environment), token, False):
-            raise RuntimeError("Failed to create environment block")
-
-        try:
-            # Convert environment block to list of strings
-            result = {}
-            env_ptr = ctypes.cast(environment, ctypes.POINTER(ctypes.c_wchar))
-            offset = 0
-
-            while True:
-                # Get string at current offset
-                current_string = ""
-                while env_ptr[offset] != "\0":
-                    current_string += env_ptr[offset]
-                    offset += 1
-
-                # Skip null terminator
-                offset += 1
-
-                # Break if we hit double null terminator
-                if not current_string:
-                    break
-
-                equal_index = current_string.index("=")
-                if equal_index == -1:
-                    continue
-
-                key = current_string[:equal_index]
-                value = current_string[equal_index + 1:]
-                result[key] = value
-
-            return result
-
-        finally:
-            DestroyEnvironmentBlock(environment)
-
-    finally:
-        CloseHandle(token)
-
 class FeedbackTextEdit(QTextEdit):
+    # Suggestions for a text, from the thread that queried them
+    suggestions_found = Signal(str, list)
+
     def __init__(self, parent=None):
         super().__init__(parent)
+        # Earlier feedback for the text typed so far (set by the panel), shown
+        # in a completer popup that is only built once there is something to show.
+        # suggest queries a database, so it runs on a thread of its own, one
+        # query at a time; keys typed meanwhile are answered by the next one
+        self.suggest: Optional[Callable[[str], list[str]]] = None
+        self.completer: Optional[QCompleter] = None
+        self.suggest_running = False
+        self.suggest_stale = False
+        self.suggestions_found.connect(self._show_suggestions)
 
     def keyPressEvent(self, event: QKeyEvent):
+        if self.completer is not None and self.completer.popup().isVisible():
+            if event.modifiers() == Qt.ControlModifier and event.key() == Qt.Key_Return:
+                self.hide_suggestions()
+            elif event.key() in (Qt.Key_Enter, Qt.Key_Return, Qt.Key_Tab, Qt.Key_Backtab, Qt.Key_Escape):
+                # Picks a suggestion or closes the popup
+                event.ignore()
+                return
         if event.key() == Qt.Key_Return and event.modifiers() == Qt.ControlModifier:
-            # Find the parent FeedbackUI instance and call submit
+            # Find the parent FeedbackPanel instance and call submit
             parent = self.parent()
-            while parent and not isinstance(parent, FeedbackUI):
+            while parent and not isinstance(parent, FeedbackPanel):
                 parent = parent.parent()
             if parent:
                 parent._submit_feedback()
         else:
             super().keyPressEvent(event)
+            if event.text().isprintable() or event.key() in (Qt.Key_Backspace, Qt.Key_Delete):
+                self._update_suggestions()
+
+    def hide_suggestions(self):
+        if self.completer is not None:
+            self.completer.popup().hide()
+
+    def _update_suggestions(self):
+        if self.suggest is None:
+            return
+        if self.suggest_running:
+            self.suggest_stale = True
+            return
+        self.suggest_running = True
+        threading.Thread(target=self._query_suggestions, args=(self.toPlainText(), self.suggest), daemon=True).start()
+
+    def _query_suggestions(self, text: str, suggest: Callable[[str], list[str]]):
+        # Runs on its own thread, and always answers: without suggestions_found
+        # suggest_running would stay set and no query would run again
+        try:
+            found = suggest(text)
+        except Exception:
+            found = []
+        self.suggestions_found.emit(text, found)
+
+    def _show_suggestions(self, text: str, suggestions: list[str]):
+        self.suggest_running = False
+        if self.suggest_stale:
+            # Typed on while the query ran: ask again for the current text
+            self.suggest_stale = False
+            self._update_suggestions()
+            return
+        if text != self.toPlainText():
+            # Replaced meanwhile (a suggestion was picked, or the next request loaded)
+            return
+        if not suggestions:
+            self.hide_suggestions()
+            return
+        if self.completer is None:
+            self.completer = QCompleter(QStandardItemModel(self), self)
+            self.completer.setWidget(self)
+            self.completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+            self.completer.activated[QModelIndex].connect(self._insert_suggestion)
+
+        model = self.completer.model()
+        model.clear()
+        for suggestion in suggestions:
+            # One line per suggestion in the popup
+            item = QStandardItem(" ⏎ ".join(suggestion.splitlines()))
+            item.setData(suggestion, Qt.UserRole)
+            model.appendRow(item)
+        rect = self.cursorRect()
+        rect.setX(0)
+        rect.setWidth(self.width())
+        self.completer.complete(rect)
+
+    def _insert_suggestion(self, index: QModelIndex):
+        self.setPlainText(index.data(Qt.UserRole))
+        self.moveCursor(QTextCursor.End)
+
+class SummaryView(QTextBrowser):
+    # The request's summary as Markdown, as tall as its text up to
+    # SUMMARY_MAX_LINES lines
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setProperty("class", "description")
+        self.setFrameShape(QFrame.NoFrame)
+        self.setOpenExternalLinks(True)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        # Follows the width of the panel
+        self.document().documentLayout().documentSizeChanged.connect(self._fit_height)
+
+    def set_markdown(self, text: str):
+        # HTML in the summary is shown as text
+        self.document().setMarkdown(text, QTextDocument.MarkdownDialectGitHub | QTextDocument.MarkdownNoHTML)
+        self._fit_height()
+
+    def _fit_height(self):
+        margins = self.contentsMargins()
+        height = int(self.document().size().height()) + 1 + margins.top() + margins.bottom()
+        self.setFixedHeight(min(height, SUMMARY_MAX_LINES * self.fontMetrics().lineSpacing()))
+
+class DiffSignals(QObject):
+    # generation, index of the first line, styles of that line and the next ones
+    highlighted = Signal(int, int, object)
+
+class DiffView(QPlainTextEdit):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setUndoRedoEnabled(False)
+        self.setLineWrapMode(QPlainTextEdit.NoWrap)
+        font = QFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        font.setPointSize(9)
+        self.setFont(font)
+        self.formats: dict[str, QTextCharFormat] = {}
+        for style, (foreground, background) in DIFF_COLORS.items():
+            text_format = QTextCharFormat()
+            if foreground:
+                text_format.setForeground(QColor(foreground))
+            if background:
+                text_format.setBackground(QColor(background))
+            self.formats[style] = text_format
+
+        # The diff until the view is first painted
+        self.pending_diff = ""
+        # The diff being loaded, and how much of it has been added to the document
+        self.text = ""
+        self.position = 0
+        # Per line: its styles (diff_highlight.StyleRange) once the thread has
+        # got to it, and whether they have been applied to its block
+        self.styles: list[Optional[list[tuple[int, int, str]]]] = []
+        self.applied = bytearray()
+        # Bumped by every load(); the thread of an earlier diff stops at its next chunk
+        self.generation = 0
+        self.signals = DiffSignals()
+        self.signals.highlighted.connect(self._on_highlighted)
+        self.load_timer = QTimer(self)
+        self.load_timer.setSingleShot(True)
+        self.load_timer.timeout.connect(self._load_chunk)
+        # Scrolling or resizing brings other blocks into view
+        self.updateRequest.connect(lambda rect, dy: self._apply_visible())
+
+    def load(self, diff: str):
+        # Returns right away; an empty diff clears the view
+        self.generation += 1
+        self.load_timer.stop()
+        self.clear()
+        self.pending_diff = diff
+        self.text = ""
+        self.position = 0
+        self.styles = []
+        self.applied = bytearray()
+        if diff and self.isVisible():
+            self.viewport().update()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.pending_diff and not self.load_timer.isActive():
+            # Painted (empty) for the first time since load()
+            self.load_timer.start(0)
+
+    def _highlight(self, generation: int, text: str):
+        # Runs on its own thread. diff_highlight (and difflib) are only
+        # imported here, for requests that come with a diff
+        from diff_highlight import highlight_diff, split_lines
+
+        for start, styles in highlight_diff(split_lines(text)):
+            if generation != self.generation:
+                return
+            self.signals.highlighted.emit(generation, start, styles)
+
+    def _on_highlighted(self, generation: int, start: int, styles: list[list[tuple[int, int, str]]]):
+        if generation != self.generation:
+            return
+        self.styles[start:start + len(styles)] = styles
+        self._apply_visible()
+
+    def _load_chunk(self):
+        deadline = time.perf_counter() + DIFF_LOAD_TIME_SLICE
+        if self.pending_diff:
+            # The lines are the blocks of the document, as split by split_lines()
+            self.text = self.pending_diff.replace("\r\n", "\n").removesuffix("\n")
+            self.pending_diff = ""
+            line_count = self.text.count("\n") + 1
+            self.styles = [None] * line_count
+            self.applied = bytearray(line_count)
+            threading.Thread(target=self._highlight, args=(self.generation, self.text), daemon=True).start()
+        cursor = QTextCursor(self.document())
+        cursor.movePosition(QTextCursor.End)
+        while self.position < len(self.text) and time.perf_counter() < deadline:
+            # Up to a line break; every chunk after the first starts with one
+            end = self.text.find("\n", self.position + DIFF_LOAD_CHUNK_CHARS)
+            if end < 0:
+                end = len(self.text)
+            if self.position:
+                # Splitting the last block may drop its layout's formats
+                self.applied[self.document().blockCount() - 1] = 0
+            cursor.insertText(self.text[self.position:end])
+            self.position = end
+        if self.position < len(self.text):
+            # Continue after pending events
+            self.load_timer.start(0)
+        self._apply_visible()
+
+    def _apply_visible(self):
+        # Lines aren't wrapped, so a block is a line; blocks that were just
+        # added have no geometry yet, so they are counted rather than measured
+        block = self.firstVisibleBlock()
+        # The span of the blocks that got formats, repainted in one go
+        dirty_start = dirty_end = None
+        for _ in range(self.viewport().height() // self.fontMetrics().lineSpacing() + 2):
+            if not block.isValid():
+                break
+            number = block.blockNumber()
+            styles = self.styles[number] if number < len(self.styles) else None
+            if styles is not None and not self.applied[number]:
+                self.applied[number] = 1
+                if styles:
+                    ranges = []
+                    for start, length, style in styles:
+                        format_range = QTextLayout.FormatRange()
+                        format_range.start = start
+                        format_range.length = length
+                        format_range.format = self.formats[style]
+                        ranges.append(format_range)
+                    block.layout().setFormats(ranges)
+                    if dirty_start is None:
+                        dirty_start = block.position()
+                    dirty_end = block.position() + block.length()
+            block = block.next()
+        if dirty_start is not None:
+            # Repaints the blocks (as QSyntaxHighlighter does); ~60 us a call,
+            # so per block it added up to milliseconds per screen
+            self.document().markContentsDirty(dirty_start, dirty_end - dirty_start)
 
 class LogSignals(QObject):
-    append_log = Signal(str)
+    # Emitted once per batch, when the first line is queued for rendering
+    flush_requested = Signal()
+    # A function to run on the UI thread (the post() of the CommandSession)
+    call = Signal(object)
+
+# The automatic command of a request, already started by the server (see
+# EarlyCommand in server.py), which also replays or caches its result. It
+# stands in for a CommandRunner (see CommandSession.attach): the host passes
+# the output and exit frames to on_output/on_exit, and stop() asks the server
+# to stop the command.
+class RemoteCommand:
+    def __init__(self, command: str, stop: Callable[[], None]):
+        self.command = command
+        self.started = True
+        self.on_output: Optional[Callable[[str], None]] = None
+        self.on_exit: Optional[Callable[[Optional[int], Optional[CommandUsage], bool], None]] = None
+        self.stop = stop
+
+# The feedback history and the log archive, shared by the panels of a window.
+# Each is created (and its module imported) when first needed, which is on a
+# worker thread once feedback is typed or a result is stored: neither is needed
+# for the first paint.
+class FeedbackStores:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.history: Optional[Any] = None
+        self.logs: Optional[Any] = None
+
+    def feedback_history(self) -> Any:
+        with self.lock:
+            if self.history is None:
+                from feedback_history import FeedbackHistory
+                self.history = FeedbackHistory()
+            return self.history
+
+    def command_logs(self) -> Any:
+        with self.lock:
+            if self.logs is None:
+                from command_logs import CommandLogs
+                self.logs = CommandLogs()
+            return self.logs
+
+# One feedback request: its command section, console and feedback text. The
+# window shows one panel per project as a tab; a panel can be loaded with the
+# next request for the same project once the current one is finished.
+class FeedbackPanel(QWidget):
+    # Emitted once per request, when it is answered or closed
+    finished = Signal()
+    command_started = Signal(str)
+    command_exited = Signal(int)
+
+    def __init__(
+        self,
+        settings: SettingsStore,
+        command_cache: CommandCache,
+        stores: FeedbackStores,
+        parent: Optional[QWidget] = None,
+    ):
+        super().__init__(parent)
+        self.settings = settings
+        self.command_cache = command_cache
+        self.stores = stores
+        self.project_directory = ""
+        self.prompt = ""
+        self.diff = ""
+        self.project_group_name = ""
+        self.is_finished = True
 
-class FeedbackUI(QMainWindow):
-    def __init__(self, project_directory: str, prompt: str):
-        super().__init__()
+        self.feedback_result = None
+        # The logs of feedback_result, and the span of storing it if it was submitted
+        self.result_logs: Optional[LogStore] = None
+        self.submit_span: Optional[Span] = None
+        self.log_signals = LogSignals()
+        self.render_lock = threading.Lock()
+        self.render_queue = deque()
+        # Output of each step of a pipeline for its own console pane
+        self.step_render_queue: dict[str, deque[str]] = {}
+        self.step_panes: dict[str, QPlainTextEdit] = {}
+        self.flush_scheduled = False
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.timeout.connect(self._flush_logs)
+        # command_exited waits until the command's output has been rendered
+        self.pending_exit_code: Optional[int] = None
+        # Rendered output not yet sent to the server by the host
+        self.output_tail = TailBuffer(OUTPUT_EVENT_MAX_CHARS)
+        self.log_signals.flush_requested.connect(self._schedule_flush)
+        # Queued also when emitted from the UI thread, like call_soon
+        self.log_signals.call.connect(lambda function: function(), Qt.QueuedConnection)
+        self.deadline: Optional[float] = None
+        # The request's span (see tracing.py) and the span of the time the
+        # user takes to answer; the command's spans are the CommandSession's
+        self.trace: Optional[TraceContext] = None
+        self.wait_span: Optional[Span] = None
+        self.countdown_timer = QTimer(self)
+        self.countdown_timer.setInterval(1000)
+        self.countdown_timer.timeout.connect(self._update_countdown)
+
+        self.config = FeedbackConfig(
+            run_command="",
+            execute_automatically=False,
+            log_budget=LOG_BUDGET,
+            cache_results=False,
+            commands="",
+            max_parallel_commands=PIPELINE_MAX_PARALLEL,
+            log_memory_limit=LOG_MEMORY_LIMIT,
+            log_spool_limit=LOG_SPOOL_LIMIT,
+            stop_grace_period=STOP_GRACE_PERIOD,
+            limit_cpu_time=0,
+            limit_memory=0,
+            limit_open_files=0,
+            headless_policy="",
+            headless_feedback="",
+            command_section_visible=False,
+        )
+        # The command side of the current request; a new one for every request
+        self.command_session = self._create_command_session()
+
+        self._create_ui()
+
+    def load_request(
+        self,
+        project_directory: str,
+        prompt: str,
+        timeout: Optional[float] = None,
+        command: Optional[RemoteCommand] = None,
+        trace: Optional[TraceContext] = None,
+        diff: Optional[str] = None,
+    ):
+        # command: the automatic command, if the server has already started it.
+        # trace: the span the request's spans go below.
+        # diff: a unified diff of the changes, shown below the prompt
+        self.trace = trace
+        self.wait_span = tracer.start_span("wait_for_user", trace)
         self.project_directory = project_directory
         self.prompt = prompt
-
-        self.process: Optional[subprocess.Popen] = None
-        self.log_buffer = []
+        self.diff = diff or ""
+        self.is_finished = False
         self.feedback_result = None
-        self.log_signals = LogSignals()
-        self.log_signals.append_log.connect(self._append_log)
+        self.pending_exit_code = None
+        self.output_tail.take()
+        self._clear_console()
+        if self.command_group is not None:
+            self._set_step_panes([])
+        self.feedback_text.clear()
+        self.feedback_text.hide_suggestions()
+        self.summary_view.set_markdown(prompt)
+        if self.diff_view is not None:
+            self.diff_view.load("")
+            self.diff_view.setVisible(False)
+        if self.diff:
+            # Built (styling it alone takes ~15 ms) and filled in once the window is shown
+            QTimer.singleShot(0, self._show_diff)
+
+        # The server ends the request at the deadline; this only shows the time left
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.countdown_label.setVisible(self.deadline is not None)
+        if self.deadline is not None:
+            self._update_countdown()
+            self.countdown_timer.start()
 
-        self.setWindowTitle("Interactive Feedback MCP")
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        icon_path = os.path.join(script_dir, "images", "feedback.png")
-        self.setWindowIcon(QIcon(icon_path))
-        self.setWindowFlags(self.windowFlags() | Qt.WindowStaysOnTopHint)
-        
-        self.settings = QSettings("InteractiveFeedbackMCP", "InteractiveFeedbackMCP")
-        
-        # Load general UI settings for the main window (geometry, state)
-        self.settings.beginGroup("MainWindow_General")
-        geometry = self.settings.value("geometry")
-        if geometry:
-            self.restoreGeometry(geometry)
-        else:
-            self.resize(900, 700)
-            screen = QApplication.primaryScreen().geometry()
-            x = (screen.width() - 900) // 2
-            y = (screen.height() - 700) // 2
-            self.move(x, y)
-        
-        # Set minimum window size
-        self.setMinimumSize(600, 500)
-        state = self.settings.value("windowState")
-        if state:
-            self.restoreState(state)
-        self.settings.endGroup() # End "MainWindow_General" group
-        
         # Load project-specific settings (command, auto-execute, command section visibility)
         self.project_group_name = get_project_settings_group(self.project_directory)
-        self.settings.beginGroup(self.project_group_name)
-        loaded_run_command = self.settings.value("run_command", "", type=str)
-        loaded_execute_auto = self.settings.value("execute_automatically", False, type=bool)
-        command_section_visible = self.settings.value("commandSectionVisible", False, type=bool)
-        self.settings.endGroup() # End project-specific group
-        
-        self.config: FeedbackConfig = {
-            "run_command": loaded_run_command,
-            "execute_automatically": loaded_execute_auto
-        }
-
-        self._create_ui() # self.config is used here to set initial values
-
-        # Set command section visibility AFTER _create_ui has created relevant widgets
-        self.command_group.setVisible(command_section_visible)
+        config = load_project_config(self.settings, self.project_directory)
+        command_section_visible = config["command_section_visible"]
+
+        self.config = config
+        self.command_session = self._create_command_session()
+
+        # The command section is only built once it is shown or a command runs
+        if self.command_group is not None:
+            self._load_command_section()
+        elif command_section_visible or config["execute_automatically"]:
+            self._ensure_command_section()
+        if self.command_group is not None:
+            self.command_group.setVisible(command_section_visible)
         if command_section_visible:
             self.toggle_command_button.setText("Hide Command Section")
         else:
             self.toggle_command_button.setText("Show Command Section")
 
-        set_dark_title_bar(self, True)
-
-        if self.config.get("execute_automatically", False):
-            self._run_command()
+        if command is not None:
+            self._ensure_command_section()
+            self.command_session.attach(command)
+        elif self.config.get("execute_automatically", False):
+            self._run_command(replay_cached=True)
+
+    def _create_command_session(self) -> CommandSession:
+        return CommandSession(
+            self.project_directory,
+            self.config,
+            self.command_cache,
+            post=self.log_signals.call.emit,
+            on_output=self._queue_output,
+            on_exit=self._on_command_exit,
+            on_run=self._on_run,
+            on_started=self.command_started.emit,
+            on_step=self._on_step_changed,
+            on_step_output=self._append_step_output,
+            trace=self.trace,
+        )
 
     def _format_windows_path(self, path: str) -> str:
         if sys.platform == "win32":
@@ -288,11 +605,9 @@ class FeedbackUI(QMainWindow):
         return path
 
     def _create_ui(self):
-        central_widget = QWidget()
-        self.setCentralWidget(central_widget)
-        layout = QVBoxLayout(central_widget)
+        layout = QVBoxLayout(self)
         layout.setSpacing(12)
-        layout.setContentsMargins(16, 16, 16, 16)
+        layout.setContentsMargins(0, 0, 0, 0)
 
         # Toggle Command Section Button
         self.toggle_command_button = QPushButton("Show Command Section")
@@ -300,43 +615,129 @@ class FeedbackUI(QMainWindow):
         self.toggle_command_button.clicked.connect(self._toggle_command_section)
         layout.addWidget(self.toggle_command_button)
 
-        # Command section
+        # Command section, built by _ensure_command_section
+        self.command_group: Optional[QGroupBox] = None
+
+        # Feedback section with adjusted height
+        self.feedback_group = QGroupBox("Feedback")
+        feedback_layout = QVBoxLayout(self.feedback_group)
+        feedback_layout.setSpacing(12)
+        feedback_layout.setContentsMargins(16, 20, 16, 16)
+
+        # The prompt, as Markdown
+        self.summary_view = SummaryView()
+        feedback_layout.addWidget(self.summary_view)
+
+        # Time left to answer, for requests with a deadline
+        self.countdown_label = QLabel()
+        self.countdown_label.setProperty("class", "countdown")
+        self.countdown_label.setVisible(False)
+        feedback_layout.addWidget(self.countdown_label)
+
+        self.feedback_text = FeedbackTextEdit()
+        self.feedback_text.suggest = self._suggest
+        font_metrics = self.feedback_text.fontMetrics()
+        row_height = font_metrics.height()
+        # Calculate height for 4 lines + some padding for margins
+        padding = self.feedback_text.contentsMargins().top() + self.feedback_text.contentsMargins().bottom() + 5 # 5 is extra vertical padding
+        self.feedback_text.setMinimumHeight(4 * row_height + padding)
+
+        self.feedback_text.setPlaceholderText("Enter your feedback here (Ctrl+Enter to submit)")
+        submit_button = QPushButton("&Send Feedback (Ctrl+Enter)")
+        submit_button.clicked.connect(self._submit_feedback)
+
+        feedback_layout.addWidget(self.feedback_text)
+        feedback_layout.addWidget(submit_button)
+
+        # Set minimum height for feedback_group to accommodate its contents
+        # This will be based on one line of the prompt and the 5-line feedback_text
+        self.feedback_group.setMinimumHeight(self.summary_view.fontMetrics().lineSpacing() + 16 + self.feedback_text.minimumHeight() + submit_button.sizeHint().height() + feedback_layout.spacing() * 2 + feedback_layout.contentsMargins().top() + feedback_layout.contentsMargins().bottom() + 10) # 10 for extra padding
+
+        # Diff of the changes, built by _ensure_diff_view
+        self.diff_view: Optional[DiffView] = None
+
+        # Add widgets in a specific order
+        layout.addWidget(self.feedback_group)
+
+    def _suggest(self, text: str) -> list[str]:
+        # Runs on the suggestion thread of feedback_text
+        import feedback_history
+
+        return feedback_history.suggest(self.stores.feedback_history(), self.project_directory, text)
+
+    def _show_diff(self):
+        if self.is_finished or not self.diff:
+            return
+        # Only built for requests that come with a diff
+        if self.diff_view is None:
+            self.diff_view = DiffView()
+            self.diff_view.setMinimumHeight(200)
+            # Between the prompt and the feedback text, taking the room the window has left
+            feedback_layout = self.feedback_group.layout()
+            feedback_layout.insertWidget(feedback_layout.indexOf(self.feedback_text), self.diff_view, 1)
+        self.diff_view.setVisible(True)
+        self.diff_view.load(self.diff)
+
+    def _ensure_command_section(self):
+        # Most requests never show the command section, so it is left out of
+        # the first paint and built here on first use
+        if self.command_group is not None:
+            return
         self.command_group = QGroupBox("Command")
         command_layout = QVBoxLayout(self.command_group)
         command_layout.setSpacing(12)
         command_layout.setContentsMargins(16, 20, 16, 16)
 
-        # Working directory label
-        formatted_path = self._format_windows_path(self.project_directory)
-        working_dir_label = QLabel(f"Working directory: {formatted_path}")
-        working_dir_label.setProperty("class", "workingDir")
-        command_layout.addWidget(working_dir_label)
+        # Working directory label (text is set per request in load_request)
+        self.working_dir_label = QLabel()
+        self.working_dir_label.setProperty("class", "workingDir")
+        command_layout.addWidget(self.working_dir_label)
 
         # Command input row
         command_input_layout = QHBoxLayout()
         self.command_entry = QLineEdit()
-        self.command_entry.setText(self.config["run_command"])
-        self.command_entry.returnPressed.connect(self._run_command)
+        self.command_entry.returnPressed.connect(lambda: self._run_command())
         self.command_entry.textChanged.connect(self._update_config)
         self.run_button = QPushButton("&Run")
-        self.run_button.clicked.connect(self._run_command)
+        self.run_button.clicked.connect(lambda: self._run_command())
 
         command_input_layout.addWidget(self.command_entry)
         command_input_layout.addWidget(self.run_button)
         command_layout.addLayout(command_input_layout)
 
+        # Named commands that run in parallel instead of the command above
+        self.commands_edit = QPlainTextEdit()
+        self.commands_edit.setPlaceholderText(
+            "Or several commands that run in parallel, one per line: \"name: command\",\n"
+            "or \"name [other, ...]: command\" to start once the other steps have passed"
+        )
+        self.commands_edit.setFixedHeight(self.commands_edit.fontMetrics().lineSpacing() * 4 + 20)
+        self.commands_edit.textChanged.connect(self._update_config)
+        command_layout.addWidget(self.commands_edit)
+
         # Auto-execute and save config row
         auto_layout = QHBoxLayout()
         self.auto_check = QCheckBox("Execute automatically on next run")
-        self.auto_check.setChecked(self.config.get("execute_automatically", False))
         self.auto_check.stateChanged.connect(self._update_config)
+        self.cache_check = QCheckBox("Reuse the last result if nothing changed")
+        self.cache_check.setToolTip("When the command runs automatically and no project files changed since it last ran, show that run's output instead of running it again")
+        self.cache_check.stateChanged.connect(self._update_config)
+
+        # Size of the reduced logs returned to the agent
+        self.log_budget_spin = QSpinBox()
+        self.log_budget_spin.setRange(1, 1024)
+        self.log_budget_spin.setPrefix("Log budget: ")
+        self.log_budget_spin.setSuffix(" KB")
+        self.log_budget_spin.valueChanged.connect(self._update_config)
 
         save_button = QPushButton("&Save Configuration")
         save_button.setObjectName("saveButton")
         save_button.clicked.connect(self._save_config)
 
         auto_layout.addWidget(self.auto_check)
+        auto_layout.addWidget(self.cache_check)
         auto_layout.addStretch()
+        auto_layout.addWidget(self.log_budget_spin)
         auto_layout.addWidget(save_button)
         command_layout.addLayout(auto_layout)
 
@@ -348,12 +749,17 @@ class FeedbackUI(QMainWindow):
         console_group.setMinimumHeight(200)
 
         # Log text area
-        self.log_text = QTextEdit()
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_text.setMaximumBlockCount(CONSOLE_MAX_BLOCKS)
         font = QFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
         font.setPointSize(9)
         self.log_text.setFont(font)
-        console_layout_internal.addWidget(self.log_text)
+        # The steps of a pipeline get a tab each next to the combined output
+        self.console_tabs = QTabWidget()
+        self.console_tabs.setTabBarAutoHide(True)
+        self.console_tabs.addTab(self.log_text, "All")
+        console_layout_internal.addWidget(self.console_tabs)
 
         # Clear button
         button_layout = QHBoxLayout()
@@ -366,206 +772,549 @@ class FeedbackUI(QMainWindow):
         
         command_layout.addWidget(console_group)
 
-        self.command_group.setVisible(False) 
-        layout.addWidget(self.command_group)
-
-        # Feedback section with adjusted height
-        self.feedback_group = QGroupBox("Feedback")
-        feedback_layout = QVBoxLayout(self.feedback_group)
-        feedback_layout.setSpacing(12)
-        feedback_layout.setContentsMargins(16, 20, 16, 16)
-
-        # Short description label (from self.prompt)
-        self.description_label = QLabel(self.prompt)
-        self.description_label.setProperty("class", "description")
-        self.description_label.setWordWrap(True)
-        feedback_layout.addWidget(self.description_label)
+        self.command_group.setVisible(False)
+        # Between the toggle button and the feedback section
+        self.layout().insertWidget(1, self.command_group)
+        self._load_command_section()
 
-        self.feedback_text = FeedbackTextEdit()
-        font_metrics = self.feedback_text.fontMetrics()
-        row_height = font_metrics.height()
-        # Calculate height for 4 lines + some padding for margins
-        padding = self.feedback_text.contentsMargins().top() + self.feedback_text.contentsMargins().bottom() + 5 # 5 is extra vertical padding
-        self.feedback_text.setMinimumHeight(4 * row_height + padding)
-
-        self.feedback_text.setPlaceholderText("Enter your feedback here (Ctrl+Enter to submit)")
-        submit_button = QPushButton("&Send Feedback (Ctrl+Enter)")
-        submit_button.clicked.connect(self._submit_feedback)
-
-        feedback_layout.addWidget(self.feedback_text)
-        feedback_layout.addWidget(submit_button)
-
-        # Set minimum height for feedback_group to accommodate its contents
-        # This will be based on the description label and the 5-line feedback_text
-        self.feedback_group.setMinimumHeight(self.description_label.sizeHint().height() + self.feedback_text.minimumHeight() + submit_button.sizeHint().height() + feedback_layout.spacing() * 2 + feedback_layout.contentsMargins().top() + feedback_layout.contentsMargins().bottom() + 10) # 10 for extra padding
-
-        # Add widgets in a specific order
-        layout.addWidget(self.feedback_group)
-
-        # Credits/Contact Label
-        contact_label = QLabel('Need to improve? Contact Fábio Ferreira on <a href="https://x.com/fabiomlferreira">X.com</a> or visit <a href="https://dotcursorrules.com/">dotcursorrules.com</a>')
-        contact_label.setProperty("class", "contact")
-        contact_label.setOpenExternalLinks(True)
-        contact_label.setAlignment(Qt.AlignCenter)
-        layout.addWidget(contact_label)
+    def _load_command_section(self):
+        formatted_path = self._format_windows_path(self.project_directory)
+        self.working_dir_label.setText(f"Working directory: {formatted_path}")
+        # Setting the widgets calls _update_config, so take the values first
+        config = dict(self.config)
+        self.command_entry.setText(config["run_command"])
+        self.commands_edit.setPlainText(config["commands"])
+        self.auto_check.setChecked(config["execute_automatically"])
+        self.cache_check.setChecked(config["cache_results"])
+        self.log_budget_spin.setValue(config["log_budget"] // 1024)
+
+    def _update_countdown(self):
+        remaining = max(0, int(self.deadline - time.monotonic()))
+        minutes, seconds = divmod(remaining, 60)
+        self.countdown_label.setText(f"Time left to answer: {minutes}:{seconds:02d} (what you have typed is sent when it runs out)")
 
     def _toggle_command_section(self):
+        self._ensure_command_section()
         is_visible = self.command_group.isVisible()
         self.command_group.setVisible(not is_visible)
         if not is_visible:
             self.toggle_command_button.setText("Hide Command Section")
         else:
             self.toggle_command_button.setText("Show Command Section")
-        
-        # Immediately save the visibility state for this project
-        self.settings.beginGroup(self.project_group_name)
-        self.settings.setValue("commandSectionVisible", self.command_group.isVisible())
-        self.settings.endGroup()
+        # Saved for the project when the request finishes
+        self.config["command_section_visible"] = not is_visible
 
         # Adjust window height only
-        new_height = self.centralWidget().sizeHint().height()
+        window = self.window()
+        new_height = window.centralWidget().sizeHint().height()
         if self.command_group.isVisible() and self.command_group.layout().sizeHint().height() > 0 :
              # if command group became visible and has content, ensure enough height
-             min_content_height = self.command_group.layout().sizeHint().height() + self.feedback_group.minimumHeight() + self.toggle_command_button.height() + self.centralWidget().layout().spacing() * 2
+             min_content_height = self.command_group.layout().sizeHint().height() + self.feedback_group.minimumHeight() + self.toggle_command_button.height() + self.layout().spacing() * 2
              new_height = max(new_height, min_content_height)
 
-        current_width = self.width()
-        self.resize(current_width, new_height)
+        current_width = window.width()
+        window.resize(current_width, new_height)
 
     def _update_config(self):
         self.config["run_command"] = self.command_entry.text()
+        self.config["commands"] = self.commands_edit.toPlainText()
+        self.command_entry.setEnabled(not self.config["commands"].strip())
         self.config["execute_automatically"] = self.auto_check.isChecked()
+        self.config["cache_results"] = self.cache_check.isChecked()
+        self.config["log_budget"] = self.log_budget_spin.value() * 1024
+
+    def _queue_output(self, text: str):
+        # Called from the output reader threads as well (CommandSession.on_output):
+        # the text is rendered by _flush_logs on the UI thread in batches of lines
+        self._queue_render(text.splitlines(keepends=True))
+
+    def _append_step_output(self, name: str, text: str):
+        # Called from the steps' reader threads, like _queue_output
+        with self.render_lock:
+            queue = self.step_render_queue.get(name)
+            if queue is None:
+                queue = self.step_render_queue[name] = deque(maxlen=CONSOLE_MAX_BLOCKS)
+            queue.extend(text.splitlines(keepends=True))
+            if self.flush_scheduled:
+                return
+            self.flush_scheduled = True
+        self.log_signals.flush_requested.emit()
+
+    def _queue_render(self, lines: list[str]):
+        with self.render_lock:
+            self.render_queue.extend(lines)
+            if self.flush_scheduled:
+                return
+            self.flush_scheduled = True
+        self.log_signals.flush_requested.emit()
+
+    def _schedule_flush(self):
+        if not self.flush_timer.isActive():
+            self.flush_timer.start(CONSOLE_FLUSH_INTERVAL_MS)
+
+    def _flush_logs(self):
+        self._ensure_command_section()
+        scrollbar = self.log_text.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum()
+        deadline = time.perf_counter() + CONSOLE_FLUSH_TIME_SLICE
+
+        while time.perf_counter() < deadline:
+            skipped = 0
+            with self.render_lock:
+                # Lines that would be scrolled out of the widget right away are skipped
+                while len(self.render_queue) > CONSOLE_MAX_BLOCKS:
+                    skipped += len(self.render_queue.popleft())
+                count = min(len(self.render_queue), CONSOLE_FLUSH_CHUNK_LINES)
+                chunk = [self.render_queue.popleft() for _ in range(count)]
+            if not chunk:
+                break
+            text = "".join(chunk)
+            self.log_text.appendPlainText(text[:-1] if text.endswith("\n") else text)
+            self.output_tail.append(text, skipped)
+
+        # Only follow the output if the user has not scrolled up to read something
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+
+        with self.render_lock:
+            step_output, self.step_render_queue = self.step_render_queue, {}
+        for name, lines in step_output.items():
+            pane = self.step_panes.get(name)
+            if pane is not None:
+                text = "".join(lines)
+                pane.appendPlainText(text[:-1] if text.endswith("\n") else text)
+
+        with self.render_lock:
+            if self.render_queue or self.step_render_queue:
+                # Out of time for this slice; continue after pending events
+                self.flush_timer.start(0)
+                return
+            self.flush_scheduled = False
+
+        if self.pending_exit_code is not None:
+            exit_code, self.pending_exit_code = self.pending_exit_code, None
+            self.command_exited.emit(exit_code)
+
+    def _set_step_panes(self, names: list[str]):
+        # One pane per step of the pipeline about to run; none for a single command
+        while self.console_tabs.count() > 1:
+            pane = self.console_tabs.widget(1)
+            self.console_tabs.removeTab(1)
+            pane.deleteLater()
+        self.step_panes = {}
+        for name in names:
+            pane = QPlainTextEdit()
+            pane.setReadOnly(True)
+            pane.setMaximumBlockCount(CONSOLE_MAX_BLOCKS)
+            pane.setFont(self.log_text.font())
+            self.console_tabs.addTab(pane, name)
+            self.step_panes[name] = pane
+
+    def _on_step_changed(self, result: StepResult):
+        if result["name"] not in self.step_panes:
+            return
+        marks = {"running": " …", "passed": " ✓", "failed": " ✗", "stopped": " ■", "skipped": " –"}
+        index = self.console_tabs.indexOf(self.step_panes[result["name"]])
+        self.console_tabs.setTabText(index, result["name"] + marks.get(result["status"], ""))
+
+    def _clear_console(self):
+        with self.render_lock:
+            self.render_queue.clear()
+            self.step_render_queue.clear()
+        if self.command_group is not None:
+            self.log_text.clear()
+            for pane in self.step_panes.values():
+                pane.clear()
+
+    def _on_run(self, command: str, steps: list[StepResult]):
+        self._set_step_panes([step["name"] for step in steps])
+        self.run_button.setText("Sto&p")
 
-    def _append_log(self, text: str):
-        self.log_buffer.append(text)
-        self.log_text.append(text.rstrip())
-        cursor = self.log_text.textCursor()
-        cursor.movePosition(QTextCursor.End)
-        self.log_text.setTextCursor(cursor)
-
-    def _check_process_status(self):
-        if self.process and self.process.poll() is not None:
-            # Process has terminated
-            exit_code = self.process.poll()
-            self._append_log(f"\nProcess exited with code {exit_code}\n")
-            self.run_button.setText("&Run")
-            self.process = None
-            self.activateWindow()
+    def _on_command_exit(self, exit_code: Optional[int]):
+        self.run_button.setText("&Run")
+        if exit_code is None:
+            # Cancelled, or it could not be started
+            return
+        # Emitted by _flush_logs once the exit line has been rendered
+        self.pending_exit_code = exit_code
+        if not self.command_session.logs_cached:
+            self.window().activateWindow()
             self.feedback_text.setFocus()
 
-    def _run_command(self):
-        if self.process:
-            kill_tree(self.process)
-            self.process = None
-            self.run_button.setText("&Run")
+    def _run_command(self, replay_cached: bool = False):
+        # replay_cached: for the automatic run, show the cached result instead
+        # if the project has not changed since it was stored. Stops the
+        # command if it is running.
+        self._ensure_command_section()
+        self.command_session.run(self.command_entry.text(), self.config["commands"], replay_cached)
+
+    def _end_wait_span(self, outcome: str):
+        # The first outcome counts
+        if self.wait_span is not None:
+            self.wait_span.end(outcome=outcome)
+            self.wait_span = None
+
+    def _submit_feedback(self):
+        if self.is_finished:
             return
+        self._end_wait_span("submitted")
+        # Ended by store_result, once the result is stored
+        self.submit_span = tracer.start_span("submit_feedback", self.trace)
+        self.feedback_result = self._make_result(self.feedback_text.toPlainText().strip())
+        self.finish()
 
-        # Clear the log buffer but keep UI logs visible
-        self.log_buffer = []
+    def clear_logs(self):
+        self.command_session.clear_logs()
+        self._clear_console()
 
-        command = self.command_entry.text()
-        if not command:
-            self._append_log("Please enter a command to run\n")
+    def _save_config(self):
+        # Save run_command, execute_automatically and log_budget for this project
+        save_project_config(self.settings, self.project_directory, self.config)
+        self.command_session.append_log("Configuration saved for this project.\n")
+
+    def time_out(self):
+        if self.is_finished:
             return
+        self._end_wait_span("timed_out")
+        self.feedback_result = self._make_result(self.feedback_text.toPlainText().strip(), timed_out=True)
+        self.finish()
 
-        self._append_log(f"$ {command}\n")
-        self.run_button.setText("Sto&p")
+    def finish(self):
+        # Ends the current request: submitted, closed by the user, timed out or cancelled
+        if self.is_finished:
+            return
+        self.is_finished = True
+        self.countdown_timer.stop()
+        self.settings.save({self.project_group_name: {"commandSectionVisible": self.config["command_section_visible"]}})
 
-        try:
-            self.process = subprocess.Popen(
-                command,
-                shell=True,
-                cwd=self.project_directory,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                env=get_user_environment(),
-                text=True,
-                bufsize=1,
-                encoding="utf-8",
-                errors="ignore",
-                close_fds=True,
+        if self.command_session.running:
+            self.run_button.setText("&Run")
+        self.command_session.close()
+        self._end_wait_span("closed")
+        if self.diff_view is not None:
+            # Stops the highlighting and lets go of the diff
+            self.diff_view.load("")
+        self.finished.emit()
+
+    def _make_result(self, interactive_feedback: str, timed_out: bool = False) -> FeedbackResult:
+        # The answer as it is now, with the logs so far (kept for store_result)
+        result = self.command_session.result(interactive_feedback, timed_out)
+        self.result_logs = self.command_session.take_log_store()
+        return result
+
+    def take_result(self) -> Callable[[], FeedbackResult]:
+        # The request's result (empty feedback if it was closed without an
+        # answer), as a function that stores it and returns it: it adds the
+        # feedback to the history and archives the logs (filling in run_id).
+        # Both write to a database, so the host calls it off the UI thread;
+        # the panel can take the next request meanwhile.
+        if not self.feedback_result:
+            self.feedback_result = self._make_result("")
+        result, log_store, span = self.feedback_result, self.result_logs, self.submit_span
+        self.feedback_result, self.result_logs, self.submit_span = None, None, None
+        project_directory, prompt = self.project_directory, self.prompt
+
+        def store() -> FeedbackResult:
+            import command_logs
+            import feedback_history
+
+            feedback_history.record(
+                self.stores.feedback_history(), project_directory, prompt,
+                result["interactive_feedback"], result["command_exit_code"], result["timed_out"],
             )
+            result["run_id"] = command_logs.archive(self.stores.command_logs(), project_directory, log_store, result["command_exit_code"])
+            log_store.clear()
+            if span is not None:
+                span.end()
+            return result
 
-            def read_output(pipe):
-                for line in iter(pipe.readline, ""):
-                    self.log_signals.append_log.emit(line)
-
-            threading.Thread(
-                target=read_output,
-                args=(self.process.stdout,),
-                daemon=True
-            ).start()
-
-            threading.Thread(
-                target=read_output,
-                args=(self.process.stderr,),
-                daemon=True
-            ).start()
-
-            # Start process status checking
-            self.status_timer = QTimer()
-            self.status_timer.timeout.connect(self._check_process_status)
-            self.status_timer.start(100)  # Check every 100ms
-
-        except Exception as e:
-            self._append_log(f"Error running command: {str(e)}\n")
-            self.run_button.setText("&Run")
+        return store
 
-    def _submit_feedback(self):
-        self.feedback_result = FeedbackResult(
-            logs="".join(self.log_buffer),
-            interactive_feedback=self.feedback_text.toPlainText().strip(),
-        )
-        self.close()
+class FeedbackUI(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Interactive Feedback MCP")
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        icon_path = os.path.join(script_dir, "images", "feedback.png")
+        self.setWindowIcon(QIcon(icon_path))
+        self.setWindowFlags(self.windowFlags() | Qt.WindowStaysOnTopHint)
+        
+        self.settings = SettingsStore()
+        self.command_cache = CommandCache()
+        self.stores = FeedbackStores()
+        
+        # Load general UI settings for the main window (geometry, state)
+        general_settings = self.settings.load("MainWindow_General")
+        geometry = general_settings.get("geometry")
+        if geometry:
+            self.restoreGeometry(QByteArray(geometry))
+        else:
+            self.resize(900, 700)
+            screen = QApplication.primaryScreen().geometry()
+            x = (screen.width() - 900) // 2
+            y = (screen.height() - 700) // 2
+            self.move(x, y)
+        
+        # Set minimum window size
+        self.setMinimumSize(600, 500)
+        state = general_settings.get("windowState")
+        if state:
+            self.restoreState(QByteArray(state))
 
-    def clear_logs(self):
-        self.log_buffer = []
-        self.log_text.clear()
+        self._create_ui()
 
-    def _save_config(self):
-        # Save run_command and execute_automatically to QSettings under project group
-        self.settings.beginGroup(self.project_group_name)
-        self.settings.setValue("run_command", self.config["run_command"])
-        self.settings.setValue("execute_automatically", self.config["execute_automatically"])
-        self.settings.endGroup()
-        self._append_log("Configuration saved for this project.\n")
+        set_dark_title_bar(self, True)
 
-    def closeEvent(self, event):
-        # Save general UI settings for the main window (geometry, state)
-        self.settings.beginGroup("MainWindow_General")
-        self.settings.setValue("geometry", self.saveGeometry())
-        self.settings.setValue("windowState", self.saveState())
-        self.settings.endGroup()
-
-        # Save project-specific command section visibility (this is now slightly redundant due to immediate save in toggle, but harmless)
-        self.settings.beginGroup(self.project_group_name)
-        self.settings.setValue("commandSectionVisible", self.command_group.isVisible())
-        self.settings.endGroup()
-
-        if self.process:
-            kill_tree(self.process)
-        super().closeEvent(event)
+    def _create_ui(self):
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        layout = QVBoxLayout(central_widget)
+        layout.setSpacing(12)
+        layout.setContentsMargins(16, 16, 16, 16)
 
-    def run(self) -> FeedbackResult:
-        self.show()
-        QApplication.instance().exec()
+        # One tab per request; the tab bar only shows up with two or more
+        self.tabs = QTabWidget()
+        self.tabs.setDocumentMode(True)
+        self.tabs.setTabsClosable(True)
+        self.tabs.setTabBarAutoHide(True)
+        self.tabs.tabCloseRequested.connect(lambda index: self.tabs.widget(index).finish())
+        layout.addWidget(self.tabs)
 
-        if self.process:
-            kill_tree(self.process)
+        # Credits/Contact Label
+        contact_label = QLabel('Need to improve? Contact Fábio Ferreira on <a href="https://x.com/fabiomlferreira">X.com</a> or visit <a href="https://dotcursorrules.com/">dotcursorrules.com</a>')
+        contact_label.setProperty("class", "contact")
+        contact_label.setOpenExternalLinks(True)
+        contact_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(contact_label)
 
-        if not self.feedback_result:
-            return FeedbackResult(logs="".join(self.log_buffer), interactive_feedback="")
+    def add_panel(self) -> FeedbackPanel:
+        panel = FeedbackPanel(self.settings, self.command_cache, self.stores)
+        self.tabs.addTab(panel, "")
+        return panel
+
+    def remove_panel(self, panel: FeedbackPanel):
+        self.tabs.removeTab(self.tabs.indexOf(panel))
+        panel.deleteLater()
+
+    def set_panel_title(self, panel: FeedbackPanel, title: str, tooltip: str):
+        index = self.tabs.indexOf(panel)
+        self.tabs.setTabText(index, title)
+        self.tabs.setTabToolTip(index, tooltip)
 
-        return self.feedback_result
+    def closeEvent(self, event):
+        # Save general UI settings for the main window (geometry, state)
+        self.settings.save({
+            "MainWindow_General": {
+                "geometry": self.saveGeometry().data(),
+                "windowState": self.saveState().data(),
+            },
+        })
+
+        # Closing the window answers every open request with empty feedback
+        for panel in [self.tabs.widget(index) for index in range(self.tabs.count())]:
+            panel.finish()
+        super().closeEvent(event)
+
+class HostSignals(QObject):
+    message_received = Signal(object)
+    input_closed = Signal()
+    # A result stored off the UI thread, to be sent: request id, result
+    result_stored = Signal(int, object)
+
+# Serves feedback requests from server.py with one long-lived window.
+# Messages are exchanged as ipc frames over stdin and the original stdout
+# ("request" opens or queues a request, "cancel" drops one); progress events
+# and the result are tagged with the request id. A request can come with its
+# automatic command already running in the server, followed by that command's
+# "command_output"/"command_exit" frames (see RemoteCommand). Concurrent requests are shown
+# as tabs, one per project directory; requests for a project that already has
+# a tab are queued and loaded into that tab once it is answered.
+class FeedbackUIHost(QObject):
+    def __init__(self, ui: FeedbackUI, channel):
+        super().__init__()
+        self.ui = ui
+        self.channel = channel
+        # Keyed by project directory
+        self.panels: dict[str, FeedbackPanel] = {}
+        self.request_ids: dict[str, int] = {}
+        self.pending: dict[str, deque] = {}
+        # Keyed by request id
+        self.commands: dict[int, RemoteCommand] = {}
+        self.request_spans: dict[int, Span] = {}
+        self.output_timer = QTimer(self)
+        self.output_timer.setInterval(OUTPUT_EVENT_INTERVAL_MS)
+        self.output_timer.timeout.connect(self._send_output)
+        self.signals = HostSignals()
+        self.signals.message_received.connect(self._handle_message)
+        self.signals.input_closed.connect(self._shutdown)
+        self.signals.result_stored.connect(self._send_result)
+
+    def _read_messages(self):
+        # A private reader: sys.stdin.buffer would still be locked by this daemon
+        # thread when the interpreter finalizes it at shutdown
+        stream = open(sys.stdin.fileno(), "rb", closefd=False)
+        while (message := read_message(stream)) is not None:
+            self.signals.message_received.emit(message)
+        self.signals.input_closed.emit()
+
+    def _send(self, message: dict):
+        try:
+            self.channel.write(encode_message(message))
+            self.channel.flush()
+        except OSError:
+            # The server is gone; _shutdown follows once stdin reports EOF
+            pass
 
-def get_project_settings_group(project_dir: str) -> str:
-    # Create a safe, unique group name from the project directory path
-    # Using only the last component + hash of full path to keep it somewhat readable but unique
-    basename = os.path.basename(os.path.normpath(project_dir))
-    full_hash = hashlib.md5(project_dir.encode('utf-8')).hexdigest()[:8]
-    return f"{basename}_{full_hash}"
+    def _send_event(self, project_directory: str, event: str, **fields):
+        request_id = self.request_ids.get(project_directory)
+        if request_id is not None:
+            self._send({"type": "event", "id": request_id, "event": event, **fields})
+
+    def _handle_message(self, message: dict):
+        if message["type"] == "request":
+            # The deadline runs from now, also while the request is queued
+            message["received"] = time.monotonic()
+            project_directory = message["project_directory"]
+            message["span"] = tracer.start_span("ui_request", message.get("trace"), queued=project_directory in self.panels)
+            if project_directory in self.panels:
+                if message.get("command"):
+                    # The server only starts commands for idle projects; this
+                    # one runs again once the request is shown
+                    self._send({"type": "stop_command", "id": message["id"]})
+                    message["command"] = None
+                self.pending.setdefault(project_directory, deque()).append(message)
+                self._update_tab(project_directory)
+            else:
+                self._start_request(message)
+        elif message["type"] == "timeout":
+            for project_directory, request_id in self.request_ids.items():
+                if request_id == message["id"]:
+                    self.panels[project_directory].time_out()
+                    return
+            # Still queued: nothing has been typed or run for it yet
+            if self._drop_pending(message["id"]):
+                self._send({"type": "result", "id": message["id"], "result": empty_result(timed_out=True)})
+        elif message["type"] in ("command_output", "command_exit"):
+            command = self.commands.get(message["id"])
+            if command is None or command.on_output is None:
+                return
+            if message["type"] == "command_output":
+                command.on_output(message["text"])
+            else:
+                command.on_exit(message["exit_code"], message["usage"], message["cached"])
+        elif message["type"] == "cancel":
+            for project_directory, request_id in self.request_ids.items():
+                if request_id == message["id"]:
+                    # finish() stops any running command and answers the request
+                    self.panels[project_directory].finish()
+                    return
+            self._drop_pending(message["id"])
+
+    def _drop_pending(self, request_id: int) -> bool:
+        for project_directory, queue in self.pending.items():
+            for request in queue:
+                if request["id"] == request_id:
+                    queue.remove(request)
+                    self._update_tab(project_directory)
+                    request["span"].end(dropped=True)
+                    return True
+        return False
+
+    def _start_request(self, request: dict):
+        project_directory = request["project_directory"]
+        panel = self.panels.get(project_directory)
+        if panel is None:
+            panel = self.ui.add_panel()
+            panel.finished.connect(lambda: self._finish_request(project_directory))
+            panel.command_started.connect(lambda command: self._send_event(project_directory, "command_started", command=command))
+            panel.command_exited.connect(lambda exit_code: self._on_command_exited(project_directory, exit_code))
+            self.panels[project_directory] = panel
+        request_id = request["id"]
+        self.request_ids[project_directory] = request_id
+        self.request_spans[request_id] = request["span"]
+        show_span = tracer.start_span("show_window", request["span"].context)
+        timeout = request.get("timeout")
+        if timeout:
+            timeout -= time.monotonic() - request["received"]
+        command = None
+        if request.get("command"):
+            command = RemoteCommand(**request["command"], stop=lambda: self._send({"type": "stop_command", "id": request_id}))
+            self.commands[request_id] = command
+        panel.load_request(project_directory, request["prompt"], timeout, command, request["span"].context, request.get("diff"))
+        self._update_tab(project_directory)
+
+        if self.ui.isVisible():
+            # Don't switch tabs under the user; flag the window instead
+            QApplication.alert(self.ui)
+        else:
+            self.ui.tabs.setCurrentWidget(panel)
+            self.ui.show()
+            self.ui.raise_()
+            self.ui.activateWindow()
+        show_span.end()
+        self._send_event(project_directory, "window_shown")
+
+    def _send_output(self, project_directory: Optional[str] = None):
+        for project_directory in [project_directory] if project_directory else list(self.panels):
+            panel = self.panels[project_directory]
+            if panel.output_tail:
+                text, skipped = panel.output_tail.take()
+                self._send_event(project_directory, "output", text=text, skipped=skipped)
+
+    def _on_command_exited(self, project_directory: str, exit_code: int):
+        # Output that is still buffered goes out before the exit
+        self._send_output(project_directory)
+        self._send_event(project_directory, "command_exited", exit_code=exit_code)
+
+    def _update_tab(self, project_directory: str):
+        title = os.path.basename(os.path.normpath(project_directory)) or project_directory
+        queued = len(self.pending.get(project_directory, ()))
+        if queued:
+            title += f" (+{queued})"
+        self.ui.set_panel_title(self.panels[project_directory], title, project_directory)
+
+    def _finish_request(self, project_directory: str):
+        request_id = self.request_ids.pop(project_directory, None)
+        if request_id is None:
+            return
+        self.commands.pop(request_id, None)
+        panel = self.panels[project_directory]
+        # The result carries the logs; unsent output is not needed anymore
+        panel.output_tail.take()
+        store_result = panel.take_result()
+        threading.Thread(target=lambda: self.signals.result_stored.emit(request_id, store_result()), daemon=True).start()
+
+        queue = self.pending.get(project_directory)
+        if queue:
+            # finished may be emitted from inside the window's closeEvent; let
+            # the close complete before the next request shows the window again
+            QTimer.singleShot(0, lambda: self._start_request(queue.popleft()))
+            return
+        self.pending.pop(project_directory, None)
+        del self.panels[project_directory]
+        self.ui.remove_panel(panel)
+        if not self.panels:
+            self.ui.close()
+
+    def _send_result(self, request_id: int, result: FeedbackResult):
+        span = self.request_spans.pop(request_id)
+        with tracer.span("send_result", span.context):
+            self._send({"type": "result", "id": request_id, "result": result})
+        span.end(timed_out=result["timed_out"])
+
+    def _shutdown(self):
+        self.pending.clear()
+        self.ui.close()
+        QApplication.instance().quit()
+
+    def run(self):
+        # Closing the window only hides it; the host lives until stdin closes
+        QApplication.instance().setQuitOnLastWindowClosed(False)
+        self.output_timer.start()
+        threading.Thread(target=self._read_messages, daemon=True).start()
+        QApplication.instance().exec()
 
-def feedback_ui(project_directory: str, prompt: str, output_file: Optional[str] = None) -> Optional[FeedbackResult]:
+def create_app() -> QApplication:
     app = QApplication.instance() or QApplication()
     app.setPalette(get_dark_mode_palette(app))
     app.setStyle("Fusion")
@@ -606,6 +1355,26 @@ def feedback_ui(project_directory: str, prompt: str, output_file: Optional[str]
             background-color: transparent;
         }
         
+        /* 标签页样式 - 每个请求一个标签 */
+        QTabWidget::pane {
+            border: none;
+        }
+        
+        QTabBar::tab {
+            background: #1a1a1a;
+            color: #cccccc;
+            border: 1px solid #333333;
+            border-radius: 8px;
+            padding: 6px 14px;
+            margin: 0 4px 8px 0;
+        }
+        
+        QTabBar::tab:selected {
+            background: #007AFF;
+            color: #ffffff;
+            border: 1px solid #007AFF;
+        }
+        
         /* 按钮样式 - Apple统一蓝色 */
         QPushButton {
             background: qlineargradient(x1: 0, y1: 0, x2: 0, y2: 1,
@@ -671,7 +1440,7 @@ def feedback_ui(project_directory: str, prompt: str, output_file: Optional[str]
         }
         
         /* 输入框样式 - Apple现代设计 */
-        QLineEdit, QTextEdit {
+        QLineEdit, QTextEdit, QPlainTextEdit {
             background: qlineargradient(x1: 0, y1: 0, x2: 0, y2: 1,
                                       stop: 0 #1a1a1a, stop: 1 #0f0f0f);
             border: 1px solid #333333;
@@ -682,13 +1451,13 @@ def feedback_ui(project_directory: str, prompt: str, output_file: Optional[str]
             selection-background-color: #007AFF;
         }
         
-        QLineEdit:focus, QTextEdit:focus {
+        QLineEdit:focus, QTextEdit:focus, QPlainTextEdit:focus {
             border: 2px solid #007AFF;
             background: qlineargradient(x1: 0, y1: 0, x2: 0, y2: 1,
                                       stop: 0 #222222, stop: 1 #111111);
         }
         
-        QTextEdit {
+        QTextEdit, QPlainTextEdit {
             padding: 16px;
             line-height: 1.4;
         }
@@ -731,6 +1500,19 @@ def feedback_ui(project_directory: str, prompt: str, output_file: Optional[str]
             line-height: 1.5;
         }
         
+        QTextBrowser[class="description"] {
+            font-size: 14px;
+            color: #cccccc;
+            background: transparent;
+            border: none;
+            padding: 8px 0;
+        }
+        
+        QLabel[class="countdown"] {
+            font-size: 12px;
+            color: #FF9F0A;
+        }
+        
         QLabel[class="contact"] {
             font-size: 11px;
             color: #888888;
@@ -770,27 +1552,119 @@ def feedback_ui(project_directory: str, prompt: str, output_file: Optional[str]
         }
         """
     )
-    ui = FeedbackUI(project_directory, prompt)
-    result = ui.run()
-
-    if output_file and result:
-        # Ensure the directory exists
-        os.makedirs(os.path.dirname(output_file) if os.path.dirname(output_file) else ".", exist_ok=True)
-        # Save the result to the output file
-        with open(output_file, "w") as f:
-            json.dump(result, f)
-        return None
-
-    return result
+    return app
+
+def feedback_ui(project_directory: str, prompt: str, diff: Optional[str] = None) -> FeedbackResult:
+    with tracer.span("feedback_ui") as span:
+        create_app()
+        with tracer.span("FeedbackUI.__init__"):
+            ui = FeedbackUI()
+        panel = ui.add_panel()
+        panel.finished.connect(ui.close)
+        panel.load_request(project_directory, prompt, trace=span.context, diff=diff)
+        ui.show()
+        QApplication.instance().exec()
+        # The window is gone; nothing is left to keep responsive
+        return panel.take_result()()
+
+# Phase timings for --profile-startup, each measured from the end of the
+# previous phase (the first one from STARTUP_TIME). Measured with the
+# offscreen platform: imports ~120 ms, application ~9 ms, window ~17 ms,
+# show ~4 ms, first paint ~1.5 ms; deferring the command section and psutil
+# took ~20 ms off the time to the first paint, and the feedback history, log
+# archive and diff highlighting modules ~4 ms. `benchmarks/run.py startup`
+# checks the total against STARTUP_PAINT_LIMIT_MS.
+class StartupProfile(QObject):
+    def __init__(self):
+        super().__init__()
+        self.phases: list[tuple[str, float]] = []
+        self.last = STARTUP_TIME
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint:
+            watched.removeEventFilter(self)
+            self.mark("first paint")
+            self.report()
+            QApplication.instance().quit()
+        return False
+
+    def report(self):
+        for phase, seconds in self.phases:
+            print(f"{phase:<12} {seconds * 1000:8.1f} ms", file=sys.stderr)
+        total = sum(seconds for _, seconds in self.phases)
+        print(f"{'total':<12} {total * 1000:8.1f} ms", file=sys.stderr)
+
+def profile_startup(project_directory: str, prompt: str, diff: Optional[str] = None):
+    # Same path as feedback_ui(), but exits as soon as the window has painted
+    profile = StartupProfile()
+    profile.mark("imports")
+    create_app()
+    profile.mark("application")
+    ui = FeedbackUI()
+    panel = ui.add_panel()
+    panel.load_request(project_directory, prompt, diff=diff)
+    profile.mark("window")
+    ui.installEventFilter(profile)
+    ui.show()
+    profile.mark("show")
+    QApplication.instance().exec()
+    panel.finish()
+
+def record_startup(imported: float, app_created: float, ready: float):
+    # Below the server's ui_process_start span; not inherited by commands
+    parent = os.environ.pop(TRACE_PARENT_ENV, None)
+    if not parent:
+        return
+    parent = json.loads(parent)
+    startup = tracer.record("ui_startup", parent, parent["spawned"], ready)
+    tracer.record("interpreter", startup, parent["spawned"], STARTUP_WALL_TIME)
+    tracer.record("imports", startup, STARTUP_WALL_TIME, imported)
+    tracer.record("create_app", startup, imported, app_created)
+    tracer.record("FeedbackUI.__init__", startup, app_created, ready)
+
+def run_host():
+    # Keep the real stdout for ipc frames only; anything else that writes to
+    # stdout (Qt, plugins) is redirected to stderr so it cannot corrupt them
+    channel = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    imported = time.time()
+    create_app()
+    app_created = time.time()
+    # Build the window up front so the first request only has to show it
+    ui = FeedbackUI()
+    ui.ensurePolished()
+    record_startup(imported, app_created, time.time())
+    FeedbackUIHost(ui, channel).run()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the feedback UI")
     parser.add_argument("--project-directory", default=os.getcwd(), help="The project directory to run the command in")
     parser.add_argument("--prompt", default="I implemented the changes you requested.", help="The prompt to show to the user")
-    parser.add_argument("--output-file", help="Path to save the feedback result as JSON")
+    parser.add_argument("--diff", help="File with a unified diff of the changes to show below the prompt")
+    parser.add_argument("--host", action="store_true", help="Serve requests from server.py over stdin/stdout")
+    parser.add_argument("--profile-startup", action="store_true", help="Print how long each startup phase took up to the first paint of the window to stderr, then exit")
     args = parser.parse_args()
 
-    result = feedback_ui(args.project_directory, args.prompt, args.output_file)
+    diff = None
+    if args.diff:
+        with open(args.diff, encoding="utf-8", errors="replace") as f:
+            diff = f.read()
+
+    if args.profile_startup:
+        profile_startup(args.project_directory, args.prompt, diff)
+        sys.exit(0)
+
+    if args.host:
+        run_host()
+        sys.exit(0)
+
+    result = feedback_ui(args.project_directory, args.prompt, diff)
     if result:
         print(f"\nLogs collected: \n{result['logs']}")
         print(f"\nFeedback received:\n{result['interactive_feedback']}")
@@ -0,0 +1,220 @@
+# Interactive Feedback MCP headless mode
+# Developed by Fábio Ferreira (https://x.com/fabiomlferreira)
+# Inspired by/related to dotcursorrules.com (https://dotcursorrules.com/)
+#
+# Answers interactive_feedback calls without a window, for CI, SSH sessions
+# and containers where nobody is there to answer. HeadlessFrontend wraps the
+# server's frontend and takes over a call when
+#
+#   - the project has a "headless_policy" in the settings database,
+#   - the server was started with --headless <policy>, or
+#   - the Qt frontend is used and there is no display (the policy is then
+#     "fail" unless one of the above says otherwise).
+#
+# The project's saved command (or commands) runs as if started from the
+# window, and the result has the usual fields. The call returns within its
+# timeout (HEADLESS_COMMAND_TIMEOUT without one): a command that is still
+# running is stopped early enough for it to be killed and its logs archived
+# in time, which the logs say. The policy decides the feedback:
+#
+#   approve   empty feedback, as if the user had nothing to add
+#   canned    the project's "headless_feedback" text
+#   fail      nothing runs and the call fails right away with an error
+import os
+import sys
+import asyncio
+import threading
+from typing import Any, Callable, Optional
+
+from command_cache import CommandCache
+import command_logs
+from command_logs import CommandLogs
+from command_session import CommandSession, empty_result
+from project_settings import FeedbackConfig, SettingsStore, load_project_config
+import tracing
+from tracing import tracer
+
+HEADLESS_POLICIES = ("approve", "canned", "fail")
+# Seconds a headless call may take when it has no timeout
+HEADLESS_COMMAND_TIMEOUT = 600
+# Stopping a command that is still running takes up to this share of the
+# call's timeout: its stop_grace_period (shortened if need be), then
+# HEADLESS_KILL_WAIT seconds for the killed command to exit and its output
+# to be drained
+HEADLESS_STOP_SHARE = 0.2
+HEADLESS_KILL_WAIT = 2
+# Output is sent to the client as "output" events in batches, every
+# HEADLESS_OUTPUT_INTERVAL seconds
+HEADLESS_OUTPUT_INTERVAL = 0.05
+
+# Qt platforms that need no display server
+HEADLESS_QT_PLATFORMS = ("offscreen", "minimal", "vnc", "linuxfb", "eglfs")
+
+class HeadlessError(Exception):
+    pass
+
+def display_available() -> bool:
+    # Whether the Qt window can be shown at all
+    if sys.platform in ("win32", "darwin"):
+        return True
+    if os.environ.get("QT_QPA_PLATFORM", "").split(":")[0] in HEADLESS_QT_PLATFORMS:
+        return True
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+class HeadlessRequest:
+    # The command run of one headless call: a CommandSession whose output goes
+    # to the client as events instead of a console
+    def __init__(
+        self,
+        command_cache: CommandCache,
+        project_directory: str,
+        config: FeedbackConfig,
+        timeout: float,
+        on_event: Optional[Callable[[dict], None]],
+    ):
+        self.config = config
+        self.timeout = timeout
+        self.on_event = on_event
+        self.loop = asyncio.get_running_loop()
+        self.lock = threading.Lock()
+        self.pending_output: list[str] = []
+        self.exited: asyncio.Future = self.loop.create_future()
+        # The time kept at the end of the call for stopping the command, and
+        # the grace period it gets before it is killed
+        self.stop_time = min(timeout * HEADLESS_STOP_SHARE, config["stop_grace_period"] + HEADLESS_KILL_WAIT)
+        grace_period = min(config["stop_grace_period"], max(self.stop_time - HEADLESS_KILL_WAIT, self.stop_time / 2))
+        self.session = CommandSession(
+            project_directory,
+            FeedbackConfig(**{**config, "stop_grace_period": grace_period}),
+            command_cache,
+            post=self.loop.call_soon_threadsafe,
+            on_output=self._queue_output,
+            on_exit=self._on_exit,
+            on_started=lambda command: self._send_event("command_started", command=command),
+            trace=tracing.current_context(),
+        )
+
+    def _send_event(self, event: str, **fields):
+        if self.on_event:
+            self.on_event({"type": "event", "event": event, **fields})
+
+    def _queue_output(self, text: str):
+        # Called from the output reader threads as well
+        with self.lock:
+            self.pending_output.append(text)
+            if len(self.pending_output) > 1:
+                return
+        self.loop.call_soon_threadsafe(self.loop.call_later, HEADLESS_OUTPUT_INTERVAL, self._flush_output)
+
+    def _flush_output(self):
+        with self.lock:
+            text = "".join(self.pending_output)
+            self.pending_output.clear()
+        if text:
+            self._send_event("output", text=text, skipped=0)
+
+    def _on_exit(self, exit_code: Optional[int]):
+        self._flush_output()
+        if exit_code is not None:
+            self._send_event("command_exited", exit_code=exit_code)
+        if not self.exited.done():
+            self.exited.set_result(exit_code)
+
+    async def run(self):
+        # Runs the saved command (or replays its cached result). One that is
+        # still running when only stop_time is left is stopped; one that has
+        # not exited by the end of the timeout is left to the session to stop,
+        # and its exit is not waited for.
+        if not self.config["run_command"] and not self.config["commands"].strip():
+            return
+        started = self.loop.time()
+        self.session.run(self.config["run_command"], self.config["commands"], replay_cached=True)
+        if not self.session.running:
+            # Invalid commands, or the command could not be started
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self.exited), self.timeout - self.stop_time)
+            return
+        except asyncio.TimeoutError:
+            pass
+        self.session.append_log(
+            f"Stopped after {self.loop.time() - started:.1f}s, to answer within the call's {self.timeout:g}s timeout without a feedback window\n"
+        )
+        self.session.stop()
+        try:
+            await asyncio.wait_for(asyncio.shield(self.exited), max(0, started + self.timeout - self.loop.time()))
+        except asyncio.TimeoutError:
+            self._flush_output()
+            self.session.append_log(f"The command did not exit within {self.stop_time:.1f}s of being stopped; its exit is not known\n")
+            # Whatever it still prints is left out of the logs being archived
+            self.session.close()
+
+class HeadlessFrontend:
+    def __init__(self, fallback: Any, policy: Optional[str] = None, needs_display: bool = True, grace_period: float = 0):
+        # fallback: the frontend that shows a window (or page) otherwise.
+        # policy: the --headless policy for every project without its own.
+        # needs_display: the fallback can't work without a display (Qt).
+        # grace_period: seconds past a call's timeout after which the fallback's
+        # request is cancelled; it ends the request itself at the deadline, so
+        # this only covers a UI that doesn't answer
+        self.fallback = fallback
+        self.policy = policy
+        self.needs_display = needs_display
+        self.grace_period = grace_period
+        self.settings: Optional[SettingsStore] = None
+        self.settings_lock = asyncio.Lock()
+        self.command_cache = CommandCache()
+        self.command_logs = CommandLogs()
+
+    async def _load_config(self, project_directory: str) -> FeedbackConfig:
+        async with self.settings_lock:
+            if self.settings is None:
+                self.settings = await asyncio.to_thread(SettingsStore)
+        return await asyncio.to_thread(load_project_config, self.settings, project_directory)
+
+    async def request(
+        self,
+        project_directory: str,
+        summary: str,
+        on_event: Optional[Callable[[dict], None]] = None,
+        timeout: Optional[float] = None,
+        diff: Optional[str] = None,
+    ) -> dict[str, Any]:
+        config = await self._load_config(project_directory)
+        policy = config["headless_policy"] or self.policy
+        if not policy:
+            if not self.needs_display or display_available():
+                # The fallback starts with the config loaded here rather than reading it again
+                if not timeout:
+                    return await self.fallback.request(project_directory, summary, on_event, diff=diff, config=config)
+                try:
+                    return await asyncio.wait_for(
+                        self.fallback.request(project_directory, summary, on_event, timeout, diff, config),
+                        timeout + self.grace_period,
+                    )
+                except asyncio.TimeoutError:
+                    return empty_result(timed_out=True)
+            raise HeadlessError(
+                "No display is available for the feedback window (DISPLAY and WAYLAND_DISPLAY are not set). "
+                "Start the server with --headless approve or --headless canned to answer calls without a window, "
+                "or with --frontend web, or set the project's headless_policy."
+            )
+        if policy not in HEADLESS_POLICIES:
+            raise HeadlessError(f"Unknown headless policy {policy!r}; expected one of {', '.join(HEADLESS_POLICIES)}")
+        if policy == "fail":
+            raise HeadlessError(f"Interactive feedback is not available for {project_directory} (headless policy 'fail')")
+
+        with tracer.span("headless_request", policy=policy):
+            request = HeadlessRequest(self.command_cache, project_directory, config, timeout or HEADLESS_COMMAND_TIMEOUT, on_event)
+            session = request.session
+            try:
+                await request.run()
+                result = session.result(config["headless_feedback"] if policy == "canned" else "")
+                result["run_id"] = await asyncio.to_thread(
+                    command_logs.archive, self.command_logs, project_directory, session.log_store, result["command_exit_code"]
+                )
+            finally:
+                # Also when the call is cancelled
+                session.close()
+                session.log_store.clear()
+            return result
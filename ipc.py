@@ -0,0 +1,51 @@
+# Interactive Feedback MCP IPC
+# Developed by Fábio Ferreira (https://x.com/fabiomlferreira)
+# Inspired by/related to dotcursorrules.com (https://dotcursorrules.com/)
+#
+# Message framing shared by server.py and feedback_ui.py. The server talks to
+# the UI process over the child's stdin/stdout; every message is a 4-byte
+# big-endian length followed by that many bytes of UTF-8 encoded JSON.
+#
+# server -> UI: {"type": "request", "id", "project_directory", "prompt", "diff", "timeout", "command"}
+#               ("prompt" is Markdown, "diff" null or a unified diff;
+#               "command" is null, or the automatic command the server has
+#               started (or whose cached result it replays): {"command"})
+#               {"type": "command_output", "id", "text"}
+#               {"type": "command_exit", "id", "exit_code", "usage", "cached"}
+#               {"type": "cancel", "id"}
+#               {"type": "timeout", "id"}
+# UI -> server: {"type": "event", "id", "event", ...}
+#               (window_shown, command_started, output, command_exited)
+#               {"type": "stop_command", "id"}
+#               {"type": "result", "id", "result"}
+import json
+import struct
+from typing import Optional
+
+HEADER = struct.Struct(">I")
+
+def encode_message(message: dict) -> bytes:
+    payload = json.dumps(message).encode("utf-8")
+    return HEADER.pack(len(payload)) + payload
+
+def read_message(stream) -> Optional[dict]:
+    # Blocking read from a binary file object; None once the stream is closed
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    (length,) = HEADER.unpack(header)
+    payload = stream.read(length)
+    if len(payload) < length:
+        return None
+    return json.loads(payload)
+
+async def read_message_async(reader) -> Optional[dict]:
+    # Same as read_message for an asyncio.StreamReader. IncompleteReadError is
+    # an EOFError, which keeps asyncio out of the UI process imports.
+    try:
+        header = await reader.readexactly(HEADER.size)
+        (length,) = HEADER.unpack(header)
+        payload = await reader.readexactly(length)
+    except EOFError:
+        return None
+    return json.loads(payload)
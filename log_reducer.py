@@ -0,0 +1,160 @@
+# Interactive Feedback MCP log reducer
+# Developed by Fábio Ferreira (https://x.com/fabiomlferreira)
+# Inspired by/related to dotcursorrules.com (https://dotcursorrules.com/)
+import re
+import threading
+from collections import deque
+from typing import Optional
+
+# Default size of the logs returned to the agent (roughly 4 bytes per token)
+LOG_BUDGET = 4 * 1024
+
+# Share of the budget used for the first lines, for error lines from the
+# omitted middle, and for the last lines of the output
+HEAD_SHARE = 0.25
+ERROR_SHARE = 0.25
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)|\x1b[@-Z\\-_]")
+ERROR_LINE = re.compile(r"error|fail|exception|traceback|panic|fatal|assert", re.IGNORECASE)
+DIGITS = re.compile(r"\d+")
+# A progress counter: a percentage or a "done/total" count
+PROGRESS = re.compile(r"\d%|\d+/\d+")
+
+def clean_line(line: str) -> str:
+    return ANSI_ESCAPE.sub("", line).rstrip()
+
+def collapsed(line: str, repeats: int) -> str:
+    return f"{line}  [{repeats} similar line{'s' if repeats > 1 else ''} collapsed]"
+
+# Streaming reduction of command output to what fits in a byte budget for the
+# agent. Lines are cleaned of ANSI escapes. Once the output no longer fits in
+# the budget, runs of identical lines and the frames of a progress counter
+# (lines with a percentage or a count that only differ in numbers:
+# command_runner reads \r as a line break, so each frame is a line) are
+# collapsed into their last line; lines that look like errors never are, as
+# they differ in what matters (file:line positions, test ids). Then the first
+# lines (head), the last lines (tail) and lines that look like errors from the
+# part in between are kept. Memory is bounded by the budget.
+class LogReducer:
+    def __init__(self, budget: int = LOG_BUDGET):
+        self.budget = budget
+        self.head_budget = int(budget * HEAD_SHARE)
+        self.error_budget = int(budget * ERROR_SHARE)
+        self.tail_budget = budget - self.head_budget - self.error_budget
+        self.lock = threading.Lock()
+        self.head: list[str] = []
+        self.head_bytes = 0
+        self.head_full = False
+        self.tail: deque[tuple[int, str]] = deque()
+        self.tail_bytes = 0
+        self.errors: list[tuple[int, str]] = []
+        self.error_bytes = 0
+        self.total_lines = 0
+        # Size of the cleaned output so far; nothing is collapsed while it fits
+        self.output_bytes = 0
+        # Lines folded into a "similar lines collapsed" marker
+        self.collapsed_lines = 0
+        # Lines from the middle of the output that were left out entirely
+        self.skipped_lines = 0
+        # Last line seen, kept back until we know whether it repeats
+        self.pending: Optional[tuple[int, str, str]] = None
+        self.pending_repeats = 0
+
+    def append(self, text: str):
+        with self.lock:
+            for line in text.splitlines():
+                self.total_lines += 1
+                line = clean_line(line)
+                shape = DIGITS.sub("#", line)
+                self.output_bytes += len(line.encode("utf-8")) + 1
+                if self.pending and self.output_bytes > self.budget and self._repeats(line, shape):
+                    self.pending = (self.total_lines, line, shape)
+                    self.pending_repeats += 1
+                    continue
+                self._commit_pending()
+                self.pending = (self.total_lines, line, shape)
+
+    def skip(self, count: int):
+        # count lines that are not there (see LogStore.skip) still take up
+        # their numbers, as lines left out of the middle
+        with self.lock:
+            self._commit_pending()
+            self.total_lines += count
+            self.skipped_lines += count
+
+    def _repeats(self, line: str, shape: str) -> bool:
+        # Whether line can be collapsed with the pending one
+        _, pending_line, pending_shape = self.pending
+        if ERROR_LINE.search(line):
+            return False
+        return line == pending_line or (shape == pending_shape and PROGRESS.search(line) is not None)
+
+    def _commit_pending(self):
+        if not self.pending:
+            return
+        line_number, line, _ = self.pending
+        if self.pending_repeats:
+            line = collapsed(line, self.pending_repeats)
+            self.collapsed_lines += self.pending_repeats
+        self.pending = None
+        self.pending_repeats = 0
+        self._keep(line_number, line)
+
+    def _keep(self, line_number: int, line: str):
+        size = len(line.encode("utf-8")) + 1
+        if not self.head_full and self.head_bytes + size <= self.head_budget:
+            self.head.append(line)
+            self.head_bytes += size
+            return
+        self.head_full = True
+
+        self.tail.append((line_number, line))
+        self.tail_bytes += size
+        while self.tail_bytes > self.tail_budget and len(self.tail) > 1:
+            evicted_number, evicted = self.tail.popleft()
+            evicted_size = len(evicted.encode("utf-8")) + 1
+            self.tail_bytes -= evicted_size
+            if ERROR_LINE.search(evicted) and self.error_bytes + evicted_size <= self.error_budget:
+                self.errors.append((evicted_number, evicted))
+                self.error_bytes += evicted_size
+            else:
+                self.skipped_lines += 1
+
+    @property
+    def dropped_lines(self) -> int:
+        # Lines of the output that do not appear verbatim in text()
+        return self.collapsed_lines + self.pending_repeats + self.skipped_lines
+
+    def text(self) -> str:
+        with self.lock:
+            tail = list(self.tail)
+            if self.pending:
+                line_number, line, _ = self.pending
+                if self.pending_repeats:
+                    line = collapsed(line, self.pending_repeats)
+                tail.append((line_number, line))
+
+            parts = list(self.head)
+            if self.errors or self.skipped_lines:
+                parts.append(f"... {self.skipped_lines} lines omitted ...")
+                parts.extend(f"[line {number}] {line}" for number, line in self.errors)
+                if self.errors:
+                    parts.append("...")
+            parts.extend(line for _, line in tail)
+            return "\n".join(parts) + ("\n" if parts else "")
+
+    def clear(self):
+        with self.lock:
+            self.head.clear()
+            self.head_bytes = 0
+            self.head_full = False
+            self.tail.clear()
+            self.tail_bytes = 0
+            self.errors.clear()
+            self.error_bytes = 0
+            self.total_lines = 0
+            self.output_bytes = 0
+            self.collapsed_lines = 0
+            self.skipped_lines = 0
+            self.pending = None
+            self.pending_repeats = 0
@@ -0,0 +1,143 @@
+# Interactive Feedback MCP log store
+# Developed by Fábio Ferreira (https://x.com/fabiomlferreira)
+# Inspired by/related to dotcursorrules.com (https://dotcursorrules.com/)
+import mmap
+import tempfile
+import threading
+from collections import deque
+
+# Defaults for the bytes of command output kept in memory and in the spool file
+LOG_MEMORY_LIMIT = 512 * 1024
+LOG_SPOOL_LIMIT = 8 * 1024 * 1024
+
+# Bounded store for command output. The most recent lines are kept in memory
+# (UTF-8 encoded) up to memory_limit bytes; lines pushed out of memory are
+# spilled to an anonymous spool file until it holds spool_limit bytes, after
+# which they are only counted as dropped. What is retained is therefore the
+# head (spool) and the tail (memory) of the output, whatever its volume.
+class LogStore:
+    def __init__(self, memory_limit: int = LOG_MEMORY_LIMIT, spool_limit: int = LOG_SPOOL_LIMIT):
+        self.memory_limit = memory_limit
+        self.spool_limit = spool_limit
+        self.lock = threading.Lock()
+        self.lines: deque[bytes] = deque()
+        self.memory_bytes = 0
+        self.spool = None
+        self.spool_bytes = 0
+        self.total_lines = 0
+        self.dropped_lines = 0
+
+    def append(self, text: str):
+        with self.lock:
+            for line in text.splitlines(keepends=True):
+                data = line.encode("utf-8")
+                self.lines.append(data)
+                self.memory_bytes += len(data)
+                self.total_lines += 1
+            while self.memory_bytes > self.memory_limit and len(self.lines) > 1:
+                self._evict(self.lines.popleft())
+
+    def _evict(self, data: bytes):
+        self.memory_bytes -= len(data)
+        # Once the dropped region has started, spilling more would put lines
+        # from after the gap into the head
+        if self.dropped_lines or self.spool_bytes + len(data) > self.spool_limit:
+            self.dropped_lines += 1
+            return
+        if self.spool is None:
+            self.spool = tempfile.TemporaryFile(prefix="interactive-feedback-", suffix=".log")
+        self.spool.write(data)
+        self.spool_bytes += len(data)
+
+    def text(self) -> str:
+        with self.lock:
+            head = b""
+            if self.spool_bytes:
+                self.spool.flush()
+                with mmap.mmap(self.spool.fileno(), 0, access=mmap.ACCESS_READ) as spooled:
+                    head = spooled[:]
+            gap = f"\n... {self.dropped_lines} lines dropped ...\n".encode("utf-8") if self.dropped_lines else b""
+            return (head + gap + b"".join(self.lines)).decode("utf-8", errors="replace")
+
+    def split(self) -> tuple[str, int, str]:
+        # The retained output as the lines before the dropped ones, how many
+        # lines were dropped and the lines after them (all of the output and
+        # 0 and "" if none were dropped)
+        with self.lock:
+            head = b""
+            if self.spool_bytes:
+                self.spool.flush()
+                with mmap.mmap(self.spool.fileno(), 0, access=mmap.ACCESS_READ) as spooled:
+                    head = spooled[:]
+            tail = b"".join(self.lines)
+            if not self.dropped_lines:
+                return (head + tail).decode("utf-8", errors="replace"), 0, ""
+            return head.decode("utf-8", errors="replace"), self.dropped_lines, tail.decode("utf-8", errors="replace")
+
+    def skip(self, count: int):
+        # Counts count lines as dropped right after what has been appended so
+        # far, for the replay of a run whose store dropped them (command_cache):
+        # the lines after them keep their numbers
+        with self.lock:
+            while self.lines:
+                self._evict(self.lines.popleft())
+            self.total_lines += count
+            self.dropped_lines += count
+
+    def sections(self) -> list[tuple[int, str]]:
+        # The retained output as (number of its first line, text) pairs,
+        # without the gap marker of text(); line numbers start at 1
+        with self.lock:
+            sections = []
+            if self.spool_bytes:
+                self.spool.flush()
+                with mmap.mmap(self.spool.fileno(), 0, access=mmap.ACCESS_READ) as spooled:
+                    sections.append((1, spooled[:].decode("utf-8", errors="replace")))
+            if self.lines:
+                first_line = self.total_lines - len(self.lines) + 1
+                sections.append((first_line, b"".join(self.lines).decode("utf-8", errors="replace")))
+            return sections
+
+    def clear(self):
+        with self.lock:
+            self.lines.clear()
+            self.memory_bytes = 0
+            if self.spool is not None:
+                self.spool.close()
+                self.spool = None
+            self.spool_bytes = 0
+            self.total_lines = 0
+            self.dropped_lines = 0
+
+# Coalesces streamed output between two sends, keeping only the last `limit`
+# characters; take() returns the text and how many characters were left out.
+class TailBuffer:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.parts: deque[str] = deque()
+        self.size = 0
+        self.skipped = 0
+
+    def append(self, text: str, skipped: int = 0):
+        self.skipped += skipped
+        self.parts.append(text)
+        self.size += len(text)
+        while self.size > self.limit and len(self.parts) > 1:
+            part = self.parts.popleft()
+            self.size -= len(part)
+            self.skipped += len(part)
+        if self.size > self.limit:
+            cut = self.size - self.limit
+            self.parts[0] = self.parts[0][cut:]
+            self.size -= cut
+            self.skipped += cut
+
+    def __bool__(self) -> bool:
+        return bool(self.parts) or self.skipped > 0
+
+    def take(self) -> tuple[str, int]:
+        text, skipped = "".join(self.parts), self.skipped
+        self.parts.clear()
+        self.size = 0
+        self.skipped = 0
+        return text, skipped
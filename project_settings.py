@@ -0,0 +1,201 @@
+# Interactive Feedback MCP project settings
+# Developed by Fábio Ferreira (https://x.com/fabiomlferreira)
+# Inspired by/related to dotcursorrules.com (https://dotcursorrules.com/)
+#
+# Per-project configuration shared by the Qt window and the browser frontend.
+# Settings live in a SQLite database (WAL mode) with one row per scope and key,
+# where a scope is a project (named by get_project_settings_group) or
+# "MainWindow_General" for the window geometry. Loading or saving a project
+# only touches its own rows, and several processes can use the database at once.
+import os
+import sys
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Optional, TypedDict
+
+from log_store import LOG_MEMORY_LIMIT, LOG_SPOOL_LIMIT
+from log_reducer import LOG_BUDGET
+from command_runner import STOP_GRACE_PERIOD, CommandLimits
+from command_pipeline import PIPELINE_MAX_PARALLEL
+
+# Seconds to wait for another process's write transaction to finish
+SETTINGS_BUSY_TIMEOUT = 5
+
+class FeedbackConfig(TypedDict):
+    run_command: str
+    execute_automatically: bool
+    log_budget: int
+    # Replay the last run of the automatic command if the project has not changed
+    cache_results: bool
+    # Named commands run instead of run_command when not empty (command_pipeline)
+    commands: str
+    # Only set by editing the settings database
+    max_parallel_commands: int
+    log_memory_limit: int
+    log_spool_limit: int
+    # Seconds between SIGTERM and SIGKILL when a command is stopped
+    stop_grace_period: float
+    # Per-process limits of the command (CommandLimits), 0 for none
+    limit_cpu_time: int
+    limit_memory: int
+    limit_open_files: int
+    # Answer requests without a window (headless.py): "approve", "canned" or
+    # "fail", or "" to show the window; headless_feedback is the canned answer
+    headless_policy: str
+    headless_feedback: str
+    # Saved by the Qt window when it closes
+    command_section_visible: bool
+
+def get_project_settings_group(project_dir: str) -> str:
+    # Create a safe, unique group name from the project directory path
+    # Using only the last component + hash of full path to keep it somewhat readable but unique
+    basename = os.path.basename(os.path.normpath(project_dir))
+    full_hash = hashlib.md5(project_dir.encode('utf-8')).hexdigest()[:8]
+    return f"{basename}_{full_hash}"
+
+def get_settings_path() -> str:
+    if sys.platform == "win32":
+        base = os.environ.get("APPDATA") or os.path.expanduser("~")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Application Support")
+    else:
+        base = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    return os.path.join(base, "InteractiveFeedbackMCP", "settings.db")
+
+class SettingsStore:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or get_settings_path()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Used from the web frontend's worker threads, one at a time
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(
+            self.path,
+            timeout=SETTINGS_BUSY_TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        with self.lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS settings ("
+                "scope TEXT NOT NULL, key TEXT NOT NULL, value, "
+                "PRIMARY KEY (scope, key)) WITHOUT ROWID"
+            )
+            self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._migrate_qsettings()
+
+    def _migrate_qsettings(self):
+        # One-time copy of the QSettings groups used by earlier versions. The
+        # check runs inside the write transaction so that concurrent processes
+        # don't both migrate.
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            if self.db.execute("SELECT 1 FROM meta WHERE key = 'qsettings_migrated'").fetchone() is None:
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO settings (scope, key, value) VALUES (?, ?, ?)",
+                    read_qsettings(),
+                )
+                self.db.execute("INSERT INTO meta (key, value) VALUES ('qsettings_migrated', '1')")
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def load(self, scope: str) -> dict[str, Any]:
+        with self.lock:
+            rows = self.db.execute("SELECT key, value FROM settings WHERE scope = ?", (scope,))
+            return dict(rows.fetchall())
+
+    def save(self, changes: dict[str, dict[str, Any]]):
+        # {scope: {key: value}}, written in a single transaction
+        rows = [
+            (scope, key, int(value) if isinstance(value, bool) else value)
+            for scope, values in changes.items()
+            for key, value in values.items()
+        ]
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.executemany(
+                    "INSERT INTO settings (scope, key, value) VALUES (?, ?, ?) "
+                    "ON CONFLICT (scope, key) DO UPDATE SET value = excluded.value",
+                    rows,
+                )
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+def read_qsettings() -> list[tuple[str, str, Any]]:
+    try:
+        from PySide6.QtCore import QByteArray, QSettings
+    except ImportError:
+        return []
+
+    settings = QSettings("InteractiveFeedbackMCP", "InteractiveFeedbackMCP")
+    rows = []
+    for group in settings.childGroups():
+        settings.beginGroup(group)
+        for key in settings.childKeys():
+            value = settings.value(key)
+            if isinstance(value, QByteArray):
+                value = bytes(value.data())
+            elif value in ("true", "false"):
+                # The INI backend stores booleans as text
+                value = int(value == "true")
+            elif isinstance(value, (bool, int, float, str, bytes)):
+                pass
+            else:
+                continue
+            rows.append((group, key, value))
+        settings.endGroup()
+    return rows
+
+def parse_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ("1", "true")
+    return bool(value)
+
+def load_project_config(settings: SettingsStore, project_directory: str) -> FeedbackConfig:
+    values = settings.load(get_project_settings_group(project_directory))
+    return FeedbackConfig(
+        run_command=str(values.get("run_command", "")),
+        execute_automatically=parse_bool(values.get("execute_automatically", False)),
+        log_budget=int(values.get("log_budget", LOG_BUDGET)),
+        cache_results=parse_bool(values.get("cache_results", False)),
+        commands=str(values.get("commands", "")),
+        max_parallel_commands=int(values.get("max_parallel_commands", PIPELINE_MAX_PARALLEL)),
+        log_memory_limit=int(values.get("log_memory_limit", LOG_MEMORY_LIMIT)),
+        log_spool_limit=int(values.get("log_spool_limit", LOG_SPOOL_LIMIT)),
+        stop_grace_period=float(values.get("stop_grace_period", STOP_GRACE_PERIOD)),
+        limit_cpu_time=int(values.get("limit_cpu_time", 0)),
+        limit_memory=int(values.get("limit_memory", 0)),
+        limit_open_files=int(values.get("limit_open_files", 0)),
+        headless_policy=str(values.get("headless_policy", "")),
+        headless_feedback=str(values.get("headless_feedback", "")),
+        command_section_visible=parse_bool(values.get("commandSectionVisible", False)),
+    )
+
+def command_limits(config: FeedbackConfig) -> CommandLimits:
+    return CommandLimits(
+        cpu_time=config["limit_cpu_time"],
+        memory=config["limit_memory"],
+        open_files=config["limit_open_files"],
+    )
+
+def save_project_config(settings: SettingsStore, project_directory: str, config: FeedbackConfig):
+    settings.save({
+        get_project_settings_group(project_directory): {
+            "run_command": config["run_command"],
+            "execute_automatically": config["execute_automatically"],
+            "log_budget": config["log_budget"],
+            "cache_results": config["cache_results"],
+            "commands": config["commands"],
+        }
+    })
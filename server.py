@@ -4,70 +4,541 @@
 import os
 import sys
 import json
-import tempfile
-import subprocess
+import psutil
+import asyncio
+import argparse
+import threading
+import itertools
 
-from typing import Annotated, Dict
+from typing import Annotated, Any, Callable, Dict, Optional
 
-from fastmcp import FastMCP
+from fastmcp import Context, FastMCP
 from pydantic import Field
 
+from ipc import encode_message, read_message_async
+from log_store import TailBuffer
+from command_cache import CommandCache
+from command_session import CommandSession
+from command_logs import PAGE_LINES, PAGE_MAX_LINES, CommandLogs
+from project_settings import FeedbackConfig, SettingsStore, load_project_config
+from headless import HEADLESS_POLICIES, HeadlessFrontend
+import tracing
+from tracing import STATS_TRACES, TRACE_PARENT_ENV, tracer
+
 # The log_level is necessary for Cline to work: https://github.com/jlowin/fastmcp/issues/81
 mcp = FastMCP("Interactive Feedback MCP", log_level="ERROR")
 
-def launch_feedback_ui(project_directory: str, summary: str) -> dict[str, str]:
-    # Create a temporary file for the feedback result
-    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
-        output_file = tmp.name
+# Seconds an idle UI process gets to exit after its input is closed before it
+# is killed, and a timed out request gets to return what the user typed
+UI_EXIT_GRACE_PERIOD = 5
+
+def get_feedback_ui_path() -> str:
+    # Get the path to feedback_ui.py relative to this script
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(script_dir, "feedback_ui.py")
 
+def kill_process_tree(pid: int):
+    # Last resort for a UI process that does not exit: it and any command it is running go away
     try:
-        # Get the path to feedback_ui.py relative to this script
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        feedback_ui_path = os.path.join(script_dir, "feedback_ui.py")
+        parent = psutil.Process(pid)
+        processes = parent.children(recursive=True) + [parent]
+    except psutil.Error:
+        return
+    for proc in processes:
+        try:
+            proc.kill()
+        except psutil.Error:
+            pass
+
+class HostExited(Exception):
+    pass
+
+# Command output is forwarded to the client at most every
+# OUTPUT_NOTIFY_INTERVAL seconds, with the last OUTPUT_NOTIFY_MAX_CHARS
+# characters of what was printed in between
+OUTPUT_NOTIFY_INTERVAL = 1.0
+OUTPUT_NOTIFY_MAX_CHARS = 4096
+# Seconds the notifications still queued when a call ends may take to be sent
+# before the call returns
+NOTIFY_DRAIN_TIMEOUT = 1.0
+
+# Request ids are unique across all UI processes started by this server
+request_ids = itertools.count(1)
+
+# Output of an early command is sent to the UI in batches, every
+# EARLY_OUTPUT_INTERVAL seconds
+EARLY_OUTPUT_INTERVAL = 0.05
+
+class EarlyCommand:
+    # A project's automatic command, started by the server as soon as the call
+    # arrives rather than by the window once it is up, so the command runs
+    # while the UI process starts. It is a CommandSession like the window's:
+    # a cached result (see command_cache) is replayed instead of running the
+    # command, and a new result is cached. Its output is kept (bounded, with
+    # the project's log limits) and sent to the UI as "command_output" frames
+    # once attach() is called; attaching a restarted UI process replays what
+    # was kept.
+    def __init__(self, project_directory: str, config: FeedbackConfig, command_cache: CommandCache):
+        self.command = config["run_command"]
+        self.loop = asyncio.get_running_loop()
+        self.lock = threading.Lock()
+        self.pending: list[str] = []
+        self.send: Optional[Callable[[dict], None]] = None
+        self.exited = False
+        self.session = CommandSession(
+            project_directory,
+            config,
+            command_cache,
+            post=self.loop.call_soon_threadsafe,
+            on_output=self._on_output,
+            on_exit=self._on_exit,
+            trace=tracing.current_context(),
+        )
+
+    @property
+    def running(self) -> bool:
+        return self.session.running
+
+    def describe(self) -> dict:
+        # The "command" field of the request frame
+        return {"command": self.command}
+
+    def start(self):
+        self.session.run(self.command, replay_cached=True)
+
+    def _on_output(self, text: str):
+        # Called from the output reader thread, with the session's lock held
+        with self.lock:
+            self.pending.append(text)
+            if len(self.pending) > 1:
+                return
+        self.loop.call_soon_threadsafe(self.loop.call_later, EARLY_OUTPUT_INTERVAL, self._flush_output)
 
-        # Run feedback_ui.py as a separate process
+    def _flush_output(self):
+        with self.lock:
+            text = "".join(self.pending)
+            self.pending.clear()
+        if text and self.send:
+            self.send({"type": "command_output", "text": text})
+
+    def _exit_message(self) -> dict:
+        return {
+            "type": "command_exit",
+            "exit_code": self.session.command_exit_code,
+            "usage": self.session.command_usage,
+            "cached": self.session.logs_cached,
+        }
+
+    def _on_exit(self, exit_code: Optional[int]):
+        self._flush_output()
+        self.exited = True
+        if self.send:
+            self.send(self._exit_message())
+
+    def attach(self, send: Callable[[dict], None]):
+        # Everything kept so far, then the rest as it comes
+        with self.session.lock:
+            text = self.session.log_store.text()
+            with self.lock:
+                self.pending.clear()
+        self.send = send
+        if text:
+            send({"type": "command_output", "text": text})
+        if self.exited:
+            send(self._exit_message())
+
+    def stop(self):
+        self.session.stop()
+
+    def close(self):
+        self.send = None
+        self.session.close()
+        self.session.log_store.clear()
+
+def close_early_command(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is None and task.result():
+        task.result().close()
+
+class FeedbackUIProcess:
+    # One `feedback_ui.py --host` process and the requests sent to it. Messages
+    # are ipc frames over the child's stdin/stdout; results and progress events
+    # are matched back to the waiting call by request id.
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.requests: dict[int, tuple[asyncio.Future, Optional[Callable[[dict], None]]]] = {}
+        self.commands: dict[int, EarlyCommand] = {}
+        # The timeout frame of each request with a timeout, to be sent at its deadline
+        self.deadlines: dict[int, asyncio.TimerHandle] = {}
+
+    @classmethod
+    async def start(cls) -> "FeedbackUIProcess":
         # NOTE: There appears to be a bug in uv, so we need
         # to pass a bunch of special flags to make this work
-        args = [
-            sys.executable,
-            "-u",
-            feedback_ui_path,
-            "--project-directory", project_directory,
-            "--prompt", summary,
-            "--output-file", output_file
-        ]
-        result = subprocess.run(
-            args,
-            check=False,
-            shell=False,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            stdin=subprocess.DEVNULL,
-            close_fds=True
+        with tracer.span("ui_process_start") as span:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-u", get_feedback_ui_path(), "--host",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                close_fds=True,
+                env={**os.environ, TRACE_PARENT_ENV: json.dumps({**span.context, "spawned": span.start})},
+            )
+        ui = cls(process)
+        asyncio.create_task(ui._read_messages())
+        return ui
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    async def _read_messages(self):
+        while (message := await read_message_async(self.process.stdout)) is not None:
+            future, on_event = self.requests.get(message["id"], (None, None))
+            if future is None or future.done():
+                continue
+            if message["type"] == "result":
+                future.set_result(message["result"])
+            elif message["type"] == "event" and on_event:
+                on_event(message)
+            elif message["type"] == "stop_command" and message["id"] in self.commands:
+                # The user pressed Stop on an early command; its exit follows
+                self.commands[message["id"]].stop()
+        await self.process.wait()
+
+        # Nothing is sent to a process that is gone
+        for deadline in self.deadlines.values():
+            deadline.cancel()
+        self.deadlines.clear()
+        # Fail everything still waiting on this process so the callers can retry
+        for future, _ in self.requests.values():
+            if not future.done():
+                future.set_exception(HostExited())
+
+    def _send(self, message: dict):
+        self.process.stdin.write(encode_message(message))
+
+    def _send_if_alive(self, message: dict):
+        if self.alive and not self.process.stdin.is_closing():
+            self._send(message)
+
+    async def request(
+        self,
+        project_directory: str,
+        summary: str,
+        on_event: Optional[Callable[[dict], None]] = None,
+        timeout: Optional[float] = None,
+        command: Optional[EarlyCommand] = None,
+        diff: Optional[str] = None,
+    ) -> dict[str, Any]:
+        request_id = next(request_ids)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.requests[request_id] = (future, on_event)
+        try:
+            self._send({
+                "type": "request",
+                "id": request_id,
+                "project_directory": project_directory,
+                "prompt": summary,
+                "diff": diff,
+                "timeout": timeout,
+                "command": command.describe() if command else None,
+                # The UI's spans for the request go below the current one
+                "trace": tracing.current_context(),
+            })
+            if command:
+                # Frames for the command follow the request that introduces it
+                self.commands[request_id] = command
+                command.attach(lambda message: self._send_if_alive({**message, "id": request_id}))
+            await self.process.stdin.drain()
+            if timeout:
+                # The UI answers a timeout with what has been typed so far
+                self.deadlines[request_id] = loop.call_later(timeout, self._send_if_alive, {"type": "timeout", "id": request_id})
+            return await future
+        except ConnectionError:
+            raise HostExited()
+        except asyncio.CancelledError:
+            # Ask the UI to drop the request (or close its window if it is showing)
+            self._send_if_alive({"type": "cancel", "id": request_id})
+            raise
+        finally:
+            deadline = self.deadlines.pop(request_id, None)
+            if deadline:
+                deadline.cancel()
+            self.requests.pop(request_id, None)
+            if self.commands.pop(request_id, None):
+                command.send = None
+
+    def stop(self):
+        # The UI answers what is still open and exits once its stdin closes;
+        # make sure the process and anything it started are gone even if the
+        # UI does not respond
+        if not self.process.stdin.is_closing():
+            self.process.stdin.close()
+        asyncio.get_running_loop().call_later(
+            UI_EXIT_GRACE_PERIOD,
+            lambda: self.alive and kill_process_tree(self.process.pid)
         )
-        if result.returncode != 0:
-            raise Exception(f"Failed to launch feedback UI: {result.returncode}")
-
-        # Read the result from the temporary file
-        with open(output_file, 'r') as f:
-            result = json.load(f)
-        os.unlink(output_file)
-        return result
-    except Exception as e:
-        if os.path.exists(output_file):
-            os.unlink(output_file)
-        raise e
+
+class UIHostClient:
+    # The server's end of the pipe to `feedback_ui.py --host` (FeedbackUIHost
+    # there). Routes all calls to a single UI process, which shows concurrent
+    # requests as tabs in one window. The process is started lazily on the
+    # first request and restarted if it has died in the meantime. Unless
+    # persistent, it is stopped as soon as no request is pending, so no UI
+    # process is left running between calls.
+    #
+    # A project's automatic command is started here when the call arrives
+    # (EarlyCommand), while the UI process and window start, unless another
+    # call for the project is pending: the UI queues that request and runs the
+    # command itself once it is shown, as two runs of the same command in one
+    # project could get in each other's way.
+    def __init__(self, persistent: bool):
+        self.persistent = persistent
+        self.ui: Optional[FeedbackUIProcess] = None
+        self.active_requests = 0
+        self.active_projects: dict[str, int] = {}
+        # The task starting the early command of each project's first pending call
+        self.early_commands: dict[str, asyncio.Task] = {}
+        self.start_lock = asyncio.Lock()
+        self.settings: Optional[SettingsStore] = None
+        self.settings_lock = asyncio.Lock()
+        self.command_cache = CommandCache()
+
+    async def _start_early_command(self, project_directory: str, config: Optional[FeedbackConfig]) -> Optional[EarlyCommand]:
+        # An early command is only a head start: whatever goes wrong here, the
+        # call goes on without one and the window runs the command itself
+        try:
+            return await self._create_early_command(project_directory, config)
+        except Exception as e:
+            print(f"Could not start the automatic command for {project_directory}: {e!r}", file=sys.stderr, flush=True)
+            return None
+
+    async def _create_early_command(self, project_directory: str, config: Optional[FeedbackConfig]) -> Optional[EarlyCommand]:
+        if config is None:
+            async with self.settings_lock:
+                if self.settings is None:
+                    self.settings = await asyncio.to_thread(SettingsStore)
+            config = await asyncio.to_thread(load_project_config, self.settings, project_directory)
+        if not config["execute_automatically"] or not config["run_command"]:
+            return None
+        if config["commands"].strip():
+            # Pipelines are started by the window, which has a pane per step
+            return None
+        command = EarlyCommand(project_directory, config, self.command_cache)
+        command.start()
+        if not command.running and not command.exited:
+            # Could not be started: the window runs it again and shows the error
+            command.close()
+            return None
+        return command
+
+    async def request(
+        self,
+        project_directory: str,
+        summary: str,
+        on_event: Optional[Callable[[dict], None]] = None,
+        timeout: Optional[float] = None,
+        diff: Optional[str] = None,
+        config: Optional[FeedbackConfig] = None,
+    ) -> dict[str, Any]:
+        # config: the project's, if the caller has already loaded it
+        self.active_projects[project_directory] = self.active_projects.get(project_directory, 0) + 1
+        early_command = None
+        if self.active_projects[project_directory] == 1:
+            # Runs alongside starting the UI process
+            early_command = asyncio.create_task(self._start_early_command(project_directory, config))
+            self.early_commands[project_directory] = early_command
+        # Later calls for the project are sent after the first one, as before
+        first_call = self.early_commands.get(project_directory)
+        try:
+            # A host that crashed is restarted once and the request is resent
+            for _ in range(2):
+                async with self.start_lock:
+                    if self.ui is None or not self.ui.alive:
+                        self.ui = await FeedbackUIProcess.start()
+                    ui = self.ui
+                    self.active_requests += 1
+                try:
+                    command = await early_command if early_command else None
+                    if first_call and not early_command:
+                        await asyncio.wait([first_call])
+                    return await ui.request(project_directory, summary, on_event, timeout, command, diff)
+                except HostExited:
+                    continue
+                finally:
+                    self.active_requests -= 1
+                    if not self.persistent and self.active_requests == 0 and ui is self.ui:
+                        # The next call starts a new process
+                        self.ui = None
+                        ui.stop()
+            raise Exception("Failed to launch feedback UI: host process exited")
+        finally:
+            self.active_projects[project_directory] -= 1
+            if not self.active_projects[project_directory]:
+                del self.active_projects[project_directory]
+            if early_command:
+                if self.early_commands.get(project_directory) is early_command:
+                    del self.early_commands[project_directory]
+                # Also stops a command that is still being started
+                early_command.cancel()
+                early_command.add_done_callback(close_early_command)
+
+# Serves every call: the Qt UI process (UIHostClient), or the browser frontend with --frontend web,
+# unless the call is answered without a window (headless.py)
+frontend: Any = HeadlessFrontend(UIHostClient(persistent=False), grace_period=UI_EXIT_GRACE_PERIOD)
+
+# Seconds a call waits for feedback when it doesn't pass a timeout (--timeout)
+default_timeout: Optional[float] = None
+
+async def launch_feedback_ui(
+    project_directory: str,
+    summary: str,
+    on_event: Optional[Callable[[dict], None]] = None,
+    timeout: Optional[float] = None,
+    diff: Optional[str] = None,
+) -> dict[str, Any]:
+    with tracer.span("launch_feedback_ui"):
+        return await frontend.request(project_directory, summary, on_event, timeout if timeout and timeout > 0 else None, diff)
 
 def first_line(text: str) -> str:
     return text.split("\n")[0].strip()
 
+def format_event(event: dict) -> str:
+    if event["event"] == "page_ready":
+        return f"Feedback page ready: {event['url']}"
+    if event["event"] == "command_started":
+        return f"Command started: {event['command']}"
+    if event["event"] == "command_exited":
+        return f"Command exited with code {event['exit_code']}"
+    return event["event"].replace("_", " ").capitalize()
+
+class EventForwarder:
+    # Sends the UI events of one call to the client as log notifications, in
+    # order, while the call is pending. Command start and exit are sent at
+    # info level; output is coalesced and rate-limited (logger
+    # "command_output"), with a progress notification counting output lines
+    # so clients that reset their timeout on progress keep waiting.
+    def __init__(self, ctx: Context):
+        self.ctx = ctx
+        self.loop = asyncio.get_running_loop()
+        self.output = TailBuffer(OUTPUT_NOTIFY_MAX_CHARS)
+        self.output_lines = 0
+        self.output_flush: Optional[asyncio.TimerHandle] = None
+        self.notifications: asyncio.Queue = asyncio.Queue()
+        self.sender = asyncio.create_task(self._send_notifications())
+
+    def on_event(self, event: dict):
+        if event["event"] == "output":
+            self.output.append(event["text"], event.get("skipped", 0))
+            self.output_lines += event["text"].count("\n")
+            if self.output_flush is None:
+                self.output_flush = self.loop.call_later(OUTPUT_NOTIFY_INTERVAL, self._flush_output)
+            return
+        if event["event"] == "command_exited":
+            self._flush_output()
+        level = "info" if event["event"].startswith("command_") else "debug"
+        self.notifications.put_nowait((level, format_event(event)))
+
+    def _flush_output(self):
+        if self.output_flush is not None:
+            self.output_flush.cancel()
+            self.output_flush = None
+        if not self.output:
+            return
+        text, skipped = self.output.take()
+        if skipped:
+            text = f"[... {skipped} characters skipped ...]\n{text}"
+        self.notifications.put_nowait(("output", text))
+
+    async def _send_notifications(self):
+        while True:
+            level, message = await self.notifications.get()
+            try:
+                if level == "output":
+                    await self.ctx.log(message, "info", logger_name="command_output")
+                    await self.ctx.report_progress(self.output_lines)
+                else:
+                    await self.ctx.log(message, level)
+            except Exception:
+                # A client that went away doesn't affect the call itself
+                pass
+            finally:
+                self.notifications.task_done()
+
+    async def close(self):
+        # The last output and the command's exit are usually still queued
+        # when the call ends; they are sent before the result, unless the
+        # client is too slow to take them
+        self._flush_output()
+        try:
+            await asyncio.wait_for(self.notifications.join(), NOTIFY_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.sender.cancel()
+
 @mcp.tool()
-def interactive_feedback(
+async def interactive_feedback(
     project_directory: Annotated[str, Field(description="Full path to the project directory")],
-    summary: Annotated[str, Field(description="Short, one-line summary of the changes")],
-) -> Dict[str, str]:
+    summary: Annotated[str, Field(description="Summary of the changes in Markdown; the first line is a short title, more detail can follow")],
+    ctx: Context,
+    timeout: Annotated[Optional[float], Field(description="Seconds to wait for feedback; when they run out, whatever the user has typed so far is returned with timed_out set. Defaults to the server's setting, 0 waits indefinitely")] = None,
+    diff: Annotated[Optional[str], Field(description="Unified diff of the changes (such as the output of git diff), shown to the user below the summary")] = None,
+) -> Dict[str, Any]:
     """Request interactive feedback for a given project directory and summary"""
-    return launch_feedback_ui(first_line(project_directory), first_line(summary))
+    # Forward UI events to the client while the user is busy
+    forwarder = EventForwarder(ctx)
+    if timeout is None:
+        timeout = default_timeout
+    try:
+        with tracer.span("interactive_feedback", frontend=type(frontend.fallback).__name__, diff_lines=diff.count("\n") if diff else 0) as span:
+            result = await launch_feedback_ui(first_line(project_directory), summary.strip(), forwarder.on_event, timeout, diff or None)
+            span.set(
+                timed_out=result["timed_out"],
+                has_feedback=bool(result["interactive_feedback"]),
+                command_exit_code=result["command_exit_code"],
+            )
+            return result
+    finally:
+        await forwarder.close()
+
+# Read by get_command_logs; written by the UI when it answers a call
+command_logs = CommandLogs()
+
+@mcp.tool()
+async def get_command_logs(
+    run_id: Annotated[str, Field(description="run_id returned by interactive_feedback")],
+    offset: Annotated[int, Field(description="Number of lines to skip; the next page starts at next_offset", ge=0)] = 0,
+    limit: Annotated[int, Field(description="Most lines to return", ge=1, le=PAGE_MAX_LINES)] = PAGE_LINES,
+    pattern: Annotated[Optional[str], Field(description="Regular expression; only lines that match it are returned")] = None,
+) -> Dict[str, Any]:
+    """Read the command output of an interactive_feedback call a page at a time, each line prefixed with its number"""
+    return await asyncio.to_thread(command_logs.page, run_id, offset, limit, pattern)
+
+@mcp.tool()
+async def feedback_stats(
+    traces: Annotated[int, Field(description="Number of most recent interactive_feedback calls to summarize", ge=1)] = STATS_TRACES,
+) -> Dict[str, Any]:
+    """Latency percentiles of the recent interactive_feedback calls, per step (span), and of each call split into the time spent waiting for the user and the rest"""
+    return await asyncio.to_thread(tracing.feedback_stats, None, traces)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Interactive Feedback MCP server")
+    parser.add_argument("--persistent-ui", action="store_true", help="Keep the feedback UI process running between calls to avoid its startup cost")
+    parser.add_argument("--frontend", choices=["qt", "web"], default="qt", help="Show the feedback UI in a Qt window or in the browser")
+    parser.add_argument("--web-port", type=int, default=0, help="Port of the web frontend on localhost (default: any free port)")
+    parser.add_argument("--no-browser", action="store_true", help="Do not open the web frontend in the browser; its URL is logged instead")
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds a call waits for feedback unless it passes its own timeout (default: no limit)")
+    parser.add_argument("--headless", choices=HEADLESS_POLICIES, default=None, help="Answer calls without a window: run the project's command and approve, answer with its canned feedback, or fail (default: only fail when there is no display)")
+    args = parser.parse_args()
+
+    default_timeout = args.timeout
+
+    if args.frontend == "web":
+        from web_ui import WebFeedbackServer
+        fallback = WebFeedbackServer(port=args.web_port, open_browser=not args.no_browser)
+    else:
+        fallback = UIHostClient(persistent=args.persistent_ui)
+    frontend = HeadlessFrontend(fallback, args.headless, needs_display=args.frontend == "qt", grace_period=UI_EXIT_GRACE_PERIOD)
     mcp.run(transport="stdio")
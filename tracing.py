@@ -0,0 +1,216 @@
+# Interactive Feedback MCP tracing
+# Developed by Fábio Ferreira (https://x.com/fabiomlferreira)
+# Inspired by/related to dotcursorrules.com (https://dotcursorrules.com/)
+#
+# Every interactive_feedback call is a trace of timed spans, written by the
+# server and the UI process to traces.jsonl next to the settings database, one
+# JSON object per span:
+#
+#   {"trace_id", "span_id", "parent_id", "name", "process", "pid",
+#    "start" (time.time()), "duration" (seconds), "attributes"}
+#
+# The span tree of a call (Qt frontend):
+#
+#   interactive_feedback                        server
+#     launch_feedback_ui                        server
+#       run_command                             server, the automatic command when the
+#                                               server starts it (EarlyCommand)
+#       ui_process_start                        server, when a UI process is started
+#         ui_startup                            UI: interpreter, imports, create_app,
+#                                               FeedbackUI.__init__
+#       ui_request                              UI, from receiving the request to sending the result
+#         show_window
+#         wait_for_user                         the time the user took to answer
+#         run_command                           each command run from the window
+#         submit_feedback
+#
+# Within a process the current span is kept in a context variable, so spans
+# started in the same task nest without passing it around; the UI process gets
+# it with each request ("trace" in the request frame), and the parent of its
+# startup spans in TRACE_PARENT_ENV. Spans only record names, timings, exit
+# codes and counts, never prompts, feedback or commands.
+# feedback_stats() summarizes the file into latency percentiles per span, and
+# splits each call into the time spent waiting for the user and the rest.
+import os
+import sys
+import json
+import time
+import secrets
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, TypedDict
+
+from project_settings import get_settings_path
+
+# traces.jsonl is moved to traces.jsonl.1 (replacing it) once it is this large
+TRACE_MAX_BYTES = 8 * 1024 * 1024
+# Calls summarized by feedback_stats unless it is asked for another number
+STATS_TRACES = 100
+STATS_PERCENTILES = (50, 90, 99)
+
+# Passed to a UI process started by the server: the TraceContext of
+# ui_process_start and "spawned", the time.time() it was started at
+TRACE_PARENT_ENV = "INTERACTIVE_FEEDBACK_TRACE_PARENT"
+
+class TraceContext(TypedDict):
+    trace_id: str
+    span_id: str
+
+class SpanStats(TypedDict):
+    count: int
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    max_ms: float
+
+class TraceStats(TypedDict):
+    traces: int
+    # Per span name
+    spans: dict[str, SpanStats]
+    # Per call: "total" (interactive_feedback), "user_wait" (wait_for_user)
+    # and "overhead" (total - user_wait)
+    calls: dict[str, SpanStats]
+
+current_span: contextvars.ContextVar[Optional[TraceContext]] = contextvars.ContextVar("current_span", default=None)
+
+def current_context() -> Optional[TraceContext]:
+    return current_span.get()
+
+class Span:
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional[TraceContext], start: Optional[float], attributes: dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.context = TraceContext(
+            trace_id=parent["trace_id"] if parent else secrets.token_hex(8),
+            span_id=secrets.token_hex(8),
+        )
+        self.parent_id = parent["span_id"] if parent else None
+        self.start = start if start is not None else time.time()
+        self.attributes = attributes
+        self.ended = False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, end: Optional[float] = None, **attributes):
+        # Only the first call records the span
+        if self.ended:
+            return
+        self.ended = True
+        self.attributes.update(attributes)
+        self.tracer.write(self, (end if end is not None else time.time()) - self.start)
+
+class Tracer:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(os.path.dirname(get_settings_path()), "traces.jsonl")
+        self.process = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python"
+        self.lock = threading.Lock()
+
+    def start_span(self, name: str, parent: Optional[TraceContext] = None, start: Optional[float] = None, **attributes) -> Span:
+        # parent defaults to the current span; without either, a new trace starts
+        return Span(self, name, parent or current_context(), start, attributes)
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[TraceContext] = None, **attributes) -> Iterator[Span]:
+        # The span is the current one inside the block
+        span = self.start_span(name, parent, **attributes)
+        token = current_span.set(span.context)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            current_span.reset(token)
+            span.end()
+
+    def record(self, name: str, parent: Optional[TraceContext], start: float, end: float, **attributes) -> TraceContext:
+        # A span measured after the fact
+        span = Span(self, name, parent, start, attributes)
+        span.end(end)
+        return span.context
+
+    def write(self, span: Span, duration: float):
+        line = json.dumps({
+            "trace_id": span.context["trace_id"],
+            "span_id": span.context["span_id"],
+            "parent_id": span.parent_id,
+            "name": span.name,
+            "process": self.process,
+            "pid": os.getpid(),
+            "start": round(span.start, 6),
+            "duration": round(max(duration, 0.0), 6),
+            "attributes": span.attributes,
+        }) + "\n"
+        # Opened per span: both processes append, and either may rotate the file
+        try:
+            with self.lock:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+                    size = f.tell()
+                if size > TRACE_MAX_BYTES:
+                    os.replace(self.path, self.path + ".1")
+        except OSError:
+            # Tracing never gets in the way of a call
+            pass
+
+# Used by the server and the UI process alike
+tracer = Tracer()
+
+def read_spans(path: str) -> list[dict]:
+    spans = []
+    for name in (path + ".1", path):
+        try:
+            with open(name, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        spans.append(json.loads(line))
+                    except ValueError:
+                        # A line cut short by a crash
+                        continue
+        except OSError:
+            continue
+    return spans
+
+def percentile(values: list[float], p: int) -> float:
+    # Nearest rank; values sorted
+    return values[max(0, min(len(values) - 1, -(-len(values) * p // 100) - 1))]
+
+def span_stats(durations: list[float]) -> SpanStats:
+    values = sorted(durations)
+    stats = {"count": len(values)}
+    for p in STATS_PERCENTILES:
+        stats[f"p{p}_ms"] = round(percentile(values, p) * 1000, 2)
+    stats["max_ms"] = round(values[-1] * 1000, 2)
+    return SpanStats(**stats)
+
+def feedback_stats(path: Optional[str] = None, traces: int = STATS_TRACES) -> TraceStats:
+    # The last `traces` calls in the trace file
+    spans = read_spans(path or tracer.path)
+    roots = sorted(
+        (span for span in spans if span["name"] == "interactive_feedback" and span["parent_id"] is None),
+        key=lambda span: span["start"],
+    )[-traces:] if traces > 0 else []
+    trace_ids = {root["trace_id"] for root in roots}
+
+    durations: dict[str, list[float]] = {}
+    user_wait: dict[str, float] = {}
+    for span in spans:
+        if span["trace_id"] not in trace_ids:
+            continue
+        durations.setdefault(span["name"], []).append(span["duration"])
+        if span["name"] == "wait_for_user":
+            user_wait[span["trace_id"]] = user_wait.get(span["trace_id"], 0.0) + span["duration"]
+
+    calls: dict[str, SpanStats] = {}
+    if roots:
+        calls["total"] = span_stats([root["duration"] for root in roots])
+        calls["user_wait"] = span_stats([user_wait.get(root["trace_id"], 0.0) for root in roots])
+        calls["overhead"] = span_stats([root["duration"] - user_wait.get(root["trace_id"], 0.0) for root in roots])
+    return TraceStats(
+        traces=len(roots),
+        spans={name: span_stats(values) for name, values in sorted(durations.items())},
+        calls=calls,
+    )
@@ -0,0 +1,729 @@
+# Interactive Feedback MCP browser frontend
+# Developed by Fábio Ferreira (https://x.com/fabiomlferreira)
+# Inspired by/related to dotcursorrules.com (https://dotcursorrules.com/)
+#
+# Serves the prompt / command / feedback workflow of feedback_ui.py on a local
+# HTTP port from inside the server process, so nothing has to be started or
+# imported per request and no display server is needed. Command output is
+# streamed to the page with Server-Sent Events.
+#
+# Every request gets a page at /s/<token>/ where the token is random, so other
+# pages and users on the machine cannot drive it:
+#   GET  /s/<token>/        the page
+#   GET  /s/<token>/events  event stream: "state", "output", "exit", "closed",
+#                           and "steps", "step", "step_output" for pipelines
+#   POST /s/<token>/run     {"command", "commands"}: start the command (the
+#                           pipeline if "commands" is not empty), or stop it if running
+#   POST /s/<token>/config  {"run_command", "commands", "execute_automatically", "cache_results", "log_budget"}
+#   GET  /s/<token>/diff    the diff of the changes, fetched once the page is up
+#   GET  /s/<token>/suggest?q=<text>  earlier feedback for the text typed so far
+#   POST /s/<token>/draft   {"feedback"}: what has been typed, returned on timeout
+#   POST /s/<token>/submit  {"feedback"}
+import sys
+import json
+import asyncio
+import secrets
+import threading
+import webbrowser
+from collections import deque
+from typing import Callable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from command_pipeline import StepResult
+from command_cache import CommandCache
+from command_session import CommandSession, FeedbackResult, empty_result
+import command_logs
+from command_logs import CommandLogs
+import feedback_history
+from feedback_history import FeedbackHistory
+import tracing
+from tracing import tracer
+from log_store import LogStore
+from log_reducer import LOG_BUDGET
+from project_settings import FeedbackConfig, SettingsStore, load_project_config, save_project_config
+
+# Same batching as the Qt console: output is sent every CONSOLE_FLUSH_INTERVAL
+# seconds, and only the last CONSOLE_MAX_LINES entries are replayed to a page
+# that connects late
+CONSOLE_FLUSH_INTERVAL = 0.05
+CONSOLE_MAX_LINES = 10000
+
+class WebSession:
+    def __init__(
+        self,
+        settings: SettingsStore,
+        command_cache: CommandCache,
+        command_logs: CommandLogs,
+        feedback_history: FeedbackHistory,
+        project_directory: str,
+        prompt: str,
+        on_event: Optional[Callable[[dict], None]],
+        diff: Optional[str] = None,
+    ):
+        self.settings = settings
+        self.command_cache = command_cache
+        self.command_logs = command_logs
+        self.feedback_history = feedback_history
+        self.token = secrets.token_urlsafe(16)
+        self.project_directory = project_directory
+        self.prompt = prompt
+        self.diff = diff or ""
+        self.on_event = on_event
+        self.loop = asyncio.get_running_loop()
+        self.result: asyncio.Future = self.loop.create_future()
+        self.submitted = False
+        # Spans of the session go below the request's launch_feedback_ui
+        self.trace = tracing.current_context()
+        self.wait_span = tracer.start_span("wait_for_user", self.trace)
+        self.config = None
+        # Set up by start() with the project's config
+        self.command_session: Optional[CommandSession] = None
+        self.console = deque(maxlen=CONSOLE_MAX_LINES)
+        # The steps of the last pipeline and their own output, by name
+        self.steps: dict[str, StepResult] = {}
+        self.step_consoles: dict[str, deque[str]] = {}
+        self.subscribers: set[asyncio.Queue] = set()
+        self.output_lock = threading.Lock()
+        self.pending_output: list[str] = []
+        self.pending_step_output: list[tuple[str, str]] = []
+        self.flush_scheduled = False
+        self.window_shown = False
+        # Kept up to date by the page so a timed out request can return it
+        self.draft = ""
+        self.deadline: Optional[float] = None
+
+    def _send_event(self, event: str, **fields):
+        if self.on_event:
+            self.on_event({"type": "event", "event": event, **fields})
+
+    def publish(self, event: str, data):
+        for queue in self.subscribers:
+            queue.put_nowait((event, data))
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self.subscribers.add(queue)
+        if not self.window_shown:
+            self.window_shown = True
+            self._send_event("window_shown")
+        return queue
+
+    def state(self) -> dict:
+        return {
+            "project_directory": self.project_directory,
+            "prompt": self.prompt,
+            "has_diff": bool(self.diff),
+            "config": self.config,
+            # Used when the log budget box is left empty
+            "default_log_budget": LOG_BUDGET,
+            "running": self.command_session is not None and self.command_session.running,
+            "console": "".join(self.console),
+            "steps": list(self.steps.values()),
+            "step_consoles": {name: "".join(console) for name, console in self.step_consoles.items()},
+            "closed": self.submitted,
+            "time_left": max(0, self.deadline - self.loop.time()) if self.deadline else None,
+        }
+
+    async def start(self, config: Optional[FeedbackConfig] = None):
+        # The settings database is only touched off the event loop
+        self.config = config or await asyncio.to_thread(load_project_config, self.settings, self.project_directory)
+        self.command_session = CommandSession(
+            self.project_directory,
+            self.config,
+            self.command_cache,
+            post=self.loop.call_soon_threadsafe,
+            on_output=self._queue_output,
+            on_exit=self._on_command_exit,
+            on_run=self._on_run,
+            on_started=lambda command: self._send_event("command_started", command=command),
+            on_step=self._on_step_changed,
+            on_step_output=self._append_step_output,
+            trace=self.trace,
+        )
+        if self.config["execute_automatically"]:
+            self.run_command(self.config["run_command"], self.config["commands"], replay_cached=True)
+
+    def _queue_output(self, text: str):
+        # Called from the output reader threads as well (CommandSession.on_output):
+        # the text is sent to the page by _flush_output on the event loop in batches
+        with self.output_lock:
+            self.pending_output.append(text)
+            if self.flush_scheduled:
+                return
+            self.flush_scheduled = True
+        self.loop.call_soon_threadsafe(self.loop.call_later, CONSOLE_FLUSH_INTERVAL, self._flush_output)
+
+    def _append_step_output(self, name: str, text: str):
+        # Like _queue_output, for the pane of one step of a pipeline
+        with self.output_lock:
+            self.pending_step_output.append((name, text))
+            if self.flush_scheduled:
+                return
+            self.flush_scheduled = True
+        self.loop.call_soon_threadsafe(self.loop.call_later, CONSOLE_FLUSH_INTERVAL, self._flush_output)
+
+    def _flush_output(self):
+        with self.output_lock:
+            text = "".join(self.pending_output)
+            self.pending_output.clear()
+            step_output, self.pending_step_output = self.pending_step_output, []
+            self.flush_scheduled = False
+        if step_output:
+            for name, step_text in step_output:
+                if name in self.step_consoles:
+                    self.step_consoles[name].append(step_text)
+            self.publish("step_output", step_output)
+        if not text:
+            # Already sent by _on_command_exit
+            return
+        self.console.append(text)
+        self.publish("output", text)
+        self._send_event("output", text=text, skipped=0)
+
+    def _on_run(self, command: str, steps: list[StepResult]):
+        with self.output_lock:
+            self.pending_step_output.clear()
+        self.steps = {step["name"]: step for step in steps}
+        self.step_consoles = {step["name"]: deque(maxlen=CONSOLE_MAX_LINES) for step in steps}
+        self.publish("steps", steps)
+        self.publish("started", {"command": command})
+
+    def _on_step_changed(self, result: StepResult):
+        # Output queued before the change goes out first
+        self._flush_output()
+        self.steps[result["name"]] = result
+        self.publish("step", result)
+
+    def _on_command_exit(self, exit_code: Optional[int]):
+        # The exit goes out after all output that preceded it
+        self._flush_output()
+        self.publish("exit", {"exit_code": exit_code})
+        if exit_code is not None:
+            self._send_event("command_exited", exit_code=exit_code)
+
+    def run_command(self, command: str, commands: str = "", replay_cached: bool = False):
+        # commands: the steps of a pipeline to run instead of command. Stops
+        # the command if it is running
+        self.command_session.run(command, commands, replay_cached)
+
+    async def save_config(self, config: dict):
+        self.config["run_command"] = str(config.get("run_command", self.config["run_command"]))
+        self.config["commands"] = str(config.get("commands", self.config["commands"]))
+        self.config["execute_automatically"] = bool(config.get("execute_automatically", self.config["execute_automatically"]))
+        self.config["cache_results"] = bool(config.get("cache_results", self.config["cache_results"]))
+        self.config["log_budget"] = max(1024, int(config.get("log_budget", self.config["log_budget"])))
+        await asyncio.to_thread(save_project_config, self.settings, self.project_directory, self.config)
+        self.command_session.append_log("Configuration saved for this project.\n")
+
+    def submit(self, feedback: str, timed_out: bool = False):
+        if not self.submitted:
+            self.submitted = True
+            self.wait_span.end(outcome="timed_out" if timed_out else "submitted")
+            if self.command_session is None:
+                result = empty_result(timed_out)
+                result["interactive_feedback"] = feedback.strip()
+                self.result.set_result(result)
+            else:
+                result = self.command_session.result(feedback.strip(), timed_out)
+                # The logs are archived off the event loop; close() doesn't clear them
+                log_store = self.command_session.take_log_store()
+                self.loop.create_task(self._archive_logs(log_store, result))
+        self.close()
+
+    async def suggest(self, text: str) -> list[str]:
+        return await asyncio.to_thread(feedback_history.suggest, self.feedback_history, self.project_directory, text)
+
+    async def _archive_logs(self, log_store: LogStore, result: FeedbackResult):
+        try:
+            with tracer.span("submit_feedback", self.trace):
+                await asyncio.to_thread(
+                    feedback_history.record, self.feedback_history, self.project_directory, self.prompt,
+                    result["interactive_feedback"], result["command_exit_code"], result["timed_out"],
+                )
+                result["run_id"] = await asyncio.to_thread(
+                    command_logs.archive, self.command_logs, self.project_directory, log_store, result["command_exit_code"]
+                )
+        finally:
+            log_store.clear()
+            if not self.result.done():
+                # Not cancelled in the meantime
+                self.result.set_result(result)
+
+    def time_out(self):
+        self.submit(self.draft, timed_out=True)
+
+    def close(self):
+        if self.command_session is not None:
+            self.command_session.close()
+            self.command_session.log_store.clear()
+        # Already ended if the request was answered
+        self.wait_span.end(outcome="closed")
+        self.publish("closed", None)
+        for queue in self.subscribers:
+            queue.put_nowait(None)
+
+class WebFeedbackServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, open_browser: bool = True):
+        self.host = host
+        self.port = port
+        self.open_browser = open_browser
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.settings: Optional[SettingsStore] = None
+        self.command_cache = CommandCache()
+        self.command_logs = CommandLogs()
+        self.feedback_history = FeedbackHistory()
+        self.start_lock = asyncio.Lock()
+        self.sessions: dict[str, WebSession] = {}
+
+    async def _ensure_started(self):
+        async with self.start_lock:
+            if self.settings is None:
+                self.settings = await asyncio.to_thread(SettingsStore)
+            if self.server is None:
+                self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+                self.port = self.server.sockets[0].getsockname()[1]
+
+    def session_url(self, session: WebSession) -> str:
+        return f"http://{self.host}:{self.port}/s/{session.token}/"
+
+    async def request(
+        self,
+        project_directory: str,
+        summary: str,
+        on_event: Optional[Callable[[dict], None]] = None,
+        timeout: Optional[float] = None,
+        diff: Optional[str] = None,
+        config: Optional[FeedbackConfig] = None,
+    ) -> dict:
+        # config: the project's, if the caller has already loaded it
+        await self._ensure_started()
+        session = WebSession(self.settings, self.command_cache, self.command_logs, self.feedback_history, project_directory, summary, on_event, diff)
+        deadline = None
+        if timeout:
+            session.deadline = session.loop.time() + timeout
+            deadline = session.loop.call_at(session.deadline, session.time_out)
+        try:
+            # The page is only reachable once the session has its config
+            await session.start(config)
+            self.sessions[session.token] = session
+            url = self.session_url(session)
+            # stderr ends up in the MCP client's server log, so the link can be found there too
+            print(f"Interactive feedback requested: {url}", file=sys.stderr, flush=True)
+            session._send_event("page_ready", url=url)
+            if self.open_browser:
+                threading.Thread(target=webbrowser.open, args=(url,), daemon=True).start()
+            return await session.result
+        finally:
+            if deadline:
+                deadline.cancel()
+            session.close()
+            self.sessions.pop(session.token, None)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode("latin-1")
+            method, target, _ = request_line.split(" ", 2)
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", "0")))
+
+            url = urlsplit(target)
+            parts = url.path.strip("/").split("/")
+            session = self.sessions.get(parts[1]) if len(parts) >= 2 and parts[0] == "s" else None
+            action = parts[2] if len(parts) >= 3 else ""
+            if session is None:
+                await self._respond(writer, 404, "text/plain", b"Unknown or finished feedback request")
+            elif method == "GET" and action == "":
+                await self._respond(writer, 200, "text/html; charset=utf-8", PAGE.encode("utf-8"))
+            elif method == "GET" and action == "events":
+                await self._stream_events(writer, session)
+            elif method == "GET" and action == "diff":
+                await self._respond(writer, 200, "text/plain; charset=utf-8", session.diff.encode("utf-8"))
+            elif method == "GET" and action == "suggest":
+                text = parse_qs(url.query).get("q", [""])[0]
+                await self._respond(writer, 200, "application/json", json.dumps(await session.suggest(text)).encode("utf-8"))
+            elif method == "POST" and headers.get("content-type", "").startswith("application/json"):
+                # Requiring JSON keeps plain cross-site form posts out
+                try:
+                    data = json.loads(body or b"{}")
+                except ValueError:
+                    data = None
+                if not isinstance(data, dict):
+                    await self._respond(writer, 400, "text/plain", b"Expected a JSON object")
+                    return
+                if action == "run":
+                    session.run_command(str(data.get("command", "")), str(data.get("commands", "")))
+                elif action == "config":
+                    await session.save_config(data)
+                elif action == "draft":
+                    session.draft = str(data.get("feedback", ""))
+                elif action == "submit":
+                    session.submit(str(data.get("feedback", "")))
+                else:
+                    await self._respond(writer, 404, "text/plain", b"Unknown action")
+                    return
+                await self._respond(writer, 204, "text/plain", b"")
+            else:
+                await self._respond(writer, 405, "text/plain", b"Method not allowed")
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, content_type: str, body: bytes):
+        reason = {200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}[status]
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Cache-Control: no-store\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+    async def _stream_events(self, writer: asyncio.StreamWriter, session: WebSession):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-store\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        queue = session.subscribe()
+        try:
+            event = ("state", session.state())
+            while event is not None:
+                name, data = event
+                writer.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+                await writer.drain()
+                event = await queue.get()
+        finally:
+            session.subscribers.discard(queue)
+
+PAGE = """<!doctype html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Interactive Feedback MCP</title>
+<style>
+  body { background: #0f0f0f; color: #fff; font: 13px 'SF Pro Display', 'Helvetica Neue', 'Segoe UI', Arial, sans-serif; margin: 0; padding: 16px; }
+  fieldset { background: #1a1a1a; border: 1px solid #333; border-radius: 16px; margin: 0 0 12px; padding: 16px; }
+  legend { font-weight: 600; padding: 0 8px; }
+  .row { display: flex; gap: 8px; align-items: center; margin-bottom: 12px; }
+  .grow { flex: 1; }
+  input[type=text], input[type=number], textarea { background: #111; color: #fff; border: 1px solid #333; border-radius: 12px; padding: 10px 14px; font: inherit; }
+  input:focus, textarea:focus { outline: none; border-color: #007AFF; }
+  button { background: #007AFF; color: #fff; border: none; border-radius: 12px; padding: 10px 20px; font-weight: 600; cursor: pointer; }
+  button:disabled { background: #404040; color: #808080; }
+  #workdir, pre { font-family: 'SF Mono', Monaco, Consolas, 'Courier New', monospace; }
+  #workdir { color: #ccc; background: #111; border: 1px solid #333; border-radius: 8px; padding: 8px 12px; margin-bottom: 12px; }
+  pre { background: #111; border: 1px solid #333; border-radius: 12px; padding: 12px; height: 300px; overflow: auto; white-space: pre-wrap; margin: 0; font-size: 12px; }
+  #prompt { color: #ccc; font-size: 14px; white-space: pre-wrap; margin: 0 0 12px; }
+  #diff { display: none; height: 300px; overflow: auto; background: #111; border: 1px solid #333; border-radius: 12px; margin: 0 0 12px; font: 12px/16px 'SF Mono', Monaco, Consolas, 'Courier New', monospace; }
+  #diff-lines { position: relative; }
+  .diff-line { position: absolute; left: 0; min-width: 100%; box-sizing: border-box; padding: 0 12px; white-space: pre; }
+  .diff-line.file { color: #d2a8ff; }
+  .diff-line.hunk { color: #79c0ff; }
+  .diff-line.added { color: #aff5b4; background: #1b3a24; }
+  .diff-line.removed { color: #ffdcd7; background: #3f1d20; }
+  .diff-line.note { color: #888; }
+  textarea { width: 100%; box-sizing: border-box; min-height: 96px; margin-bottom: 12px; }
+  #closed { display: none; color: #ccc; text-align: center; padding: 32px; }
+  #countdown { display: none; color: #FF9F0A; font-size: 12px; margin: 0 0 12px; }
+  #commands { min-height: 0; height: 5.5em; font-family: 'SF Mono', Monaco, Consolas, 'Courier New', monospace; font-size: 12px; }
+  #tabs { display: none; gap: 4px; flex-wrap: wrap; margin-bottom: 8px; }
+  .tab { background: #2a2a2a; color: #ccc; border-radius: 8px; padding: 6px 14px; font-weight: normal; }
+  .tab.active { background: #007AFF; color: #fff; }
+  #suggestions { display: none; background: #1a1a1a; border: 1px solid #333; border-radius: 12px; margin: -8px 0 12px; padding: 4px 0; }
+  .suggestion { padding: 6px 14px; cursor: pointer; white-space: nowrap; overflow: hidden; text-overflow: ellipsis; }
+  .suggestion.active { background: #007AFF; }
+</style>
+</head>
+<body>
+<div id="main">
+  <fieldset>
+    <legend>Command</legend>
+    <div id="workdir"></div>
+    <div class="row">
+      <input id="command" class="grow" type="text">
+      <button id="run">Run</button>
+    </div>
+    <textarea id="commands" placeholder="Or several commands that run in parallel, one per line: &quot;name: command&quot;,&#10;or &quot;name [other, ...]: command&quot; to start once the other steps have passed"></textarea>
+    <div class="row">
+      <label><input id="auto" type="checkbox"> Execute automatically on next run</label>
+      <label class="grow" title="When the command runs automatically and no project files changed since it last ran, show that run's output instead of running it again"><input id="cache" type="checkbox"> Reuse the last result if nothing changed</label>
+      <label>Log budget: <input id="budget" type="number" min="1" max="1024" style="width: 5em"> KB</label>
+      <button id="save">Save Configuration</button>
+    </div>
+    <div id="tabs"><button id="all" class="tab active">All</button></div>
+    <div id="consoles"><pre id="console"></pre></div>
+  </fieldset>
+  <fieldset>
+    <legend>Feedback</legend>
+    <div id="prompt"></div>
+    <div id="diff"><div id="diff-lines"></div></div>
+    <div id="countdown"></div>
+    <textarea id="feedback" placeholder="Enter your feedback here (Ctrl+Enter to submit)"></textarea>
+    <div id="suggestions"></div>
+    <button id="submit" style="width: 100%">Send Feedback (Ctrl+Enter)</button>
+  </fieldset>
+</div>
+<div id="closed">This feedback request is finished. You can close this tab.</div>
+<script>
+const $ = (id) => document.getElementById(id);
+const post = (action, data) => fetch(action, {method: "POST", headers: {"Content-Type": "application/json"}, body: JSON.stringify(data)});
+const MAX_CONSOLE_CHARS = 500000;
+
+function appendConsole(text, console_ = $("console")) {
+  const atBottom = console_.scrollTop + console_.clientHeight >= console_.scrollHeight - 4;
+  let content = console_.textContent + text;
+  if (content.length > MAX_CONSOLE_CHARS) content = content.slice(-MAX_CONSOLE_CHARS);
+  console_.textContent = content;
+  // Only follow the output if the user has not scrolled up to read something
+  if (atBottom) console_.scrollTop = console_.scrollHeight;
+}
+
+// The pane of each step of the running pipeline, by name
+let panes = {};
+const MARKS = {running: " \u2026", passed: " \u2713", failed: " \u2717", stopped: " \u25a0", skipped: " \u2013"};
+
+function showPane(name) {
+  $("console").style.display = name === null ? "block" : "none";
+  $("all").classList.toggle("active", name === null);
+  for (const [paneName, pane] of Object.entries(panes)) {
+    pane.pre.style.display = paneName === name ? "block" : "none";
+    pane.tab.classList.toggle("active", paneName === name);
+  }
+}
+
+function updateStep(step) {
+  const pane = panes[step.name];
+  if (pane) pane.tab.textContent = step.name + (MARKS[step.status] || "");
+}
+
+function setSteps(steps, consoles) {
+  for (const pane of Object.values(panes)) {
+    pane.tab.remove();
+    pane.pre.remove();
+  }
+  panes = {};
+  for (const step of steps) {
+    const tab = document.createElement("button");
+    tab.className = "tab";
+    tab.onclick = () => showPane(step.name);
+    const pre = document.createElement("pre");
+    $("tabs").appendChild(tab);
+    $("consoles").appendChild(pre);
+    panes[step.name] = {tab, pre};
+    updateStep(step);
+    if (consoles && consoles[step.name]) appendConsole(consoles[step.name], pre);
+  }
+  $("tabs").style.display = steps.length ? "flex" : "none";
+  showPane(null);
+}
+
+function updateCommandInput() {
+  $("command").disabled = $("commands").value.trim() !== "";
+}
+
+let deadline = null;
+function updateCountdown() {
+  const left = Math.max(0, Math.floor((deadline - Date.now()) / 1000));
+  $("countdown").textContent = `Time left to answer: ${Math.floor(left / 60)}:${String(left % 60).padStart(2, "0")} (what you have typed is sent when it runs out)`;
+}
+
+// The diff is only fetched once the page is up. Rows are only created for the
+// lines in view; the lines are classified (as in diff_highlight.py, without
+// the changed characters) DIFF_CHUNK_LINES at a time between other events.
+const DIFF_LINE_HEIGHT = 16;
+const DIFF_CHUNK_LINES = 5000;
+const DIFF_HUNK = /^@@ -\\d+(?:,(\\d+))? \\+\\d+(?:,(\\d+))? @@/;
+const DIFF_FILE = /^(diff |index |--- |\\+\\+\\+ |new file|deleted file|old mode|new mode|similarity|rename |copy |Binary files)/;
+let diffLines = null;
+let diffKinds = [];
+// Lines classified so far, and lines left in the current hunk on either side
+let diffClassified = 0;
+let oldLeft = 0, newLeft = 0;
+
+async function loadDiff() {
+  diffLines = [];
+  const text = await (await fetch("diff")).text();
+  diffLines = text.replace(/\\r?\\n$/, "").split("\\n").map((line) => line.replace(/\\r$/, ""));
+  $("diff").style.display = "block";
+  $("diff-lines").style.height = diffLines.length * DIFF_LINE_HEIGHT + "px";
+  renderDiff();
+  setTimeout(classifyDiff, 0);
+}
+
+function classifyDiff() {
+  const end = Math.min(diffClassified + DIFF_CHUNK_LINES, diffLines.length);
+  for (let i = diffClassified; i < end; i++) {
+    const line = diffLines[i];
+    const inHunk = oldLeft > 0 || newLeft > 0;
+    let kind = "";
+    let match;
+    if (inHunk && line[0] === "-") {
+      kind = "removed";
+      oldLeft--;
+    } else if (inHunk && line[0] === "+") {
+      kind = "added";
+      newLeft--;
+    } else if (line[0] === "\\\\") {
+      kind = "note";
+    } else if (inHunk && (line[0] === " " || line === "")) {
+      oldLeft--;
+      newLeft--;
+    } else if ((match = DIFF_HUNK.exec(line)) !== null) {
+      kind = "hunk";
+      oldLeft = match[1] === undefined ? 1 : parseInt(match[1], 10);
+      newLeft = match[2] === undefined ? 1 : parseInt(match[2], 10);
+    } else {
+      oldLeft = newLeft = 0;
+      if (DIFF_FILE.test(line)) kind = "file";
+    }
+    diffKinds[i] = kind;
+  }
+  diffClassified = end;
+  renderDiff();
+  if (end < diffLines.length) setTimeout(classifyDiff, 0);
+}
+
+function renderDiff() {
+  // The lines in view and a screenful around them
+  const view = $("diff");
+  const margin = Math.ceil(view.clientHeight / DIFF_LINE_HEIGHT);
+  const first = Math.max(0, Math.floor(view.scrollTop / DIFF_LINE_HEIGHT) - margin);
+  const last = Math.min(diffLines.length, Math.ceil((view.scrollTop + view.clientHeight) / DIFF_LINE_HEIGHT) + margin);
+  const rows = [];
+  for (let i = first; i < last; i++) {
+    const row = document.createElement("div");
+    row.className = "diff-line " + (diffKinds[i] || "");
+    row.style.top = i * DIFF_LINE_HEIGHT + "px";
+    row.textContent = diffLines[i];
+    rows.push(row);
+  }
+  $("diff-lines").replaceChildren(...rows);
+}
+
+function close() {
+  $("main").style.display = "none";
+  $("closed").style.display = "block";
+  events.close();
+}
+
+const events = new EventSource("events");
+events.addEventListener("state", (e) => {
+  const state = JSON.parse(e.data);
+  if (state.closed) return close();
+  $("workdir").textContent = "Working directory: " + state.project_directory;
+  $("prompt").textContent = state.prompt;
+  if (state.has_diff && diffLines === null) loadDiff();
+  if (state.config) {
+    $("command").value = state.config.run_command;
+    $("commands").value = state.config.commands;
+    updateCommandInput();
+    $("auto").checked = state.config.execute_automatically;
+    $("cache").checked = state.config.cache_results;
+    $("budget").value = Math.round(state.config.log_budget / 1024);
+  }
+  $("budget").placeholder = Math.round(state.default_log_budget / 1024);
+  $("console").textContent = "";
+  appendConsole(state.console);
+  setSteps(state.steps, state.step_consoles);
+  $("run").textContent = state.running ? "Stop" : "Run";
+  if (state.time_left !== null && deadline === null) {
+    deadline = Date.now() + state.time_left * 1000;
+    $("countdown").style.display = "block";
+    updateCountdown();
+    setInterval(updateCountdown, 1000);
+  }
+});
+events.addEventListener("output", (e) => appendConsole(JSON.parse(e.data)));
+events.addEventListener("started", () => { $("run").textContent = "Stop"; });
+events.addEventListener("exit", () => { $("run").textContent = "Run"; $("feedback").focus(); });
+events.addEventListener("closed", close);
+events.addEventListener("steps", (e) => setSteps(JSON.parse(e.data), null));
+events.addEventListener("step", (e) => updateStep(JSON.parse(e.data)));
+events.addEventListener("step_output", (e) => {
+  for (const [name, text] of JSON.parse(e.data)) {
+    if (panes[name]) appendConsole(text, panes[name].pre);
+  }
+});
+
+$("diff").addEventListener("scroll", renderDiff);
+$("all").onclick = () => showPane(null);
+$("commands").addEventListener("input", updateCommandInput);
+$("run").onclick = () => post("run", {command: $("command").value, commands: $("commands").value});
+$("command").addEventListener("keydown", (e) => { if (e.key === "Enter") $("run").click(); });
+$("save").onclick = () => post("config", {
+  run_command: $("command").value,
+  commands: $("commands").value,
+  execute_automatically: $("auto").checked,
+  cache_results: $("cache").checked,
+  log_budget: parseInt($("budget").value || $("budget").placeholder, 10) * 1024,
+});
+$("submit").onclick = () => post("submit", {feedback: $("feedback").value});
+$("feedback").addEventListener("keydown", (e) => {
+  if (e.key === "Enter" && e.ctrlKey) {
+    showSuggestions([]);
+    $("submit").click();
+  } else if (suggestions.length && (e.key === "ArrowDown" || e.key === "ArrowUp")) {
+    e.preventDefault();
+    selectSuggestion((selected + (e.key === "ArrowDown" ? 1 : suggestions.length - 1) + 1) % (suggestions.length + 1) - 1);
+  } else if (selected >= 0 && (e.key === "Enter" || e.key === "Tab")) {
+    e.preventDefault();
+    pickSuggestion(selected);
+  } else if (suggestions.length && e.key === "Escape") {
+    showSuggestions([]);
+  }
+});
+$("feedback").addEventListener("blur", () => showSuggestions([]));
+// Keep the server's copy of the text current in case the request times out
+let draftTimer = null;
+$("feedback").addEventListener("input", () => {
+  clearTimeout(draftTimer);
+  draftTimer = setTimeout(() => post("draft", {feedback: $("feedback").value}), 300);
+  requestSuggestions();
+});
+
+// Earlier feedback of the project for what has been typed so far
+let suggestions = [];
+let selected = -1;
+let suggestTimer = null;
+function requestSuggestions() {
+  clearTimeout(suggestTimer);
+  suggestTimer = setTimeout(async () => {
+    const text = $("feedback").value;
+    const list = await (await fetch("suggest?q=" + encodeURIComponent(text))).json();
+    // Dropped if the text changed in the meantime
+    if ($("feedback").value === text && document.activeElement === $("feedback")) showSuggestions(list);
+  }, 50);
+}
+function showSuggestions(list) {
+  suggestions = list;
+  selected = -1;
+  $("suggestions").replaceChildren(...list.map((text, index) => {
+    const item = document.createElement("div");
+    item.className = "suggestion";
+    item.textContent = text.split("\\n").join(" ⏎ ");
+    // mousedown, before the textarea loses the focus
+    item.onmousedown = (e) => { e.preventDefault(); pickSuggestion(index); };
+    return item;
+  }));
+  $("suggestions").style.display = list.length ? "block" : "none";
+}
+function selectSuggestion(index) {
+  selected = index;
+  $("suggestions").querySelectorAll(".suggestion").forEach((item, i) => item.classList.toggle("active", i === index));
+}
+function pickSuggestion(index) {
+  $("feedback").value = suggestions[index];
+  showSuggestions([]);
+  post("draft", {feedback: $("feedback").value});
+}
+$("feedback").focus();
+</script>
+</body>
+</html>
+"""